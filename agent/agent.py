@@ -1,17 +1,36 @@
+import hashlib
 import json
 import logging
 
-from typing import Any, List, Union
-from uuid import uuid4
+from typing import Any, List, Sequence, Union
 
-from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.llms import ChatMessage, ChatResponse, MessageRole
 from llama_index.llms.openai import OpenAI
 from llama_index.core.workflow import Context, StartEvent, StopEvent, Workflow, step
 
 from agent.tools import search_knowledge_base, product_search, get_orders_by_user, get_order_details, create_support_ticket
 from agent.schemas import ToolName, AgentIntent, UserIntent
-from agent.const import JTCG_SYSTEM_PROMPT, ASK_FOR_INFO_PROMPT, INTENT_ROUTER_PROMPT, REJECT_AND_REDIRECT_PROMPT
+from agent.const import (
+    JTCG_SYSTEM_PROMPT,
+    ASK_FOR_INFO_PROMPT,
+    INTENT_ROUTER_PROMPT,
+    REJECT_AND_REDIRECT_PROMPT,
+    DEGRADED_ASK_FOR_INFO,
+    DEGRADED_ASK_FOR_INFO_DEFAULT,
+    DEGRADED_GENERAL,
+    DEGRADED_REJECT,
+    DEGRADED_TOOL_HEADER,
+)
+from agent.degraded import assistant_reply, canned, fallback_plan, language_key
+from agent.render import render_tool_output
 from agent.event import OrderEvent, ProductEvent, HandoverEvent, AskForInfoEvent, GeneralResponseEvent, FAQEvent, RouterEvent, RejectEvent
+from config.env import TURN_BUDGET_S
+from llm.cache import RecordReplayLLM
+from llm.hedging import DeadlineExceeded, begin_turn_budget, end_turn_budget, hedged_call
+from llm.traced import TracedLLM
+from resilience.breaker import breaker
+from session.history import HistoryLog, HistorySnapshot
+from telemetry.tracing import attach_breakdown, current_turn, get_tracer, span, traced
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -19,12 +38,15 @@ logger.setLevel(logging.INFO)
 class CRMAgent(Workflow):
     def __init__(
         self,
-        llm: OpenAI,
+        llm: Union[OpenAI, RecordReplayLLM],
         *args: Any,
+        turn_budget_s: float = TURN_BUDGET_S,
         **kwargs: Any
     ) -> None:
         super().__init__(*args, **kwargs)
-        self.llm = llm
+        self.llm = TracedLLM(llm)
+        # 0 disables the per-turn deadline (offline evaluation grades real answers, not fallbacks)
+        self.turn_budget_s = turn_budget_s
 
         self.tools = {
             ToolName.SEARCH_KNOWLEDGE_BASE: search_knowledge_base,
@@ -36,17 +58,49 @@ class CRMAgent(Workflow):
         self.tools_called: List[ToolName] = []
         self.intent = ""
 
-    async def _get_chat_history(self, ctx: Context) -> List[ChatMessage]:
-        history:list = await ctx.store.get("history", default=[])
-        if not history:
-            history.append(ChatMessage(role=MessageRole.SYSTEM, content=JTCG_SYSTEM_PROMPT))
-        return history
+    def run(self, *args: Any, **kwargs: Any):
+        # Bind a fresh turn before the workflow task is created so every step inherits it
+        tracer = get_tracer()
+        token = tracer.begin_turn(workflow="intent")
+        budget = begin_turn_budget(self.turn_budget_s)
+        try:
+            handler = super().run(*args, **kwargs)
+            attach_breakdown(handler, current_turn())
+            return handler
+        finally:
+            end_turn_budget(budget)
+            tracer.end_turn(token)
+
+    async def _get_history_log(self, ctx: Context) -> HistoryLog:
+        # Stored once per conversation and appended to in place afterwards
+        log = await ctx.store.get("history", default=None)
+        if not isinstance(log, HistoryLog):
+            log = HistoryLog(messages=log or [])
+            await ctx.store.set("history", log)
+        if not len(log):
+            log.append(ChatMessage(role=MessageRole.SYSTEM, content=JTCG_SYSTEM_PROMPT))
+        return log
+
+    async def _get_chat_history(self, ctx: Context) -> HistorySnapshot:
+        return (await self._get_history_log(ctx)).snapshot()
     
     async def _update_chat_history(self, ctx: Context, message: ChatMessage):
-        history = await self._get_chat_history(ctx)
-        history.append(message)
-        await ctx.store.set("history", history)
+        (await self._get_history_log(ctx)).append(message)
     
+    async def _achat(self, messages: Sequence[ChatMessage], step: str, fallback: str) -> ChatResponse:
+        """
+        Hedged LLM call bounded by the step's share of the turn budget and the
+        "llm" breaker; answers with `fallback` when the LLM is unavailable or too slow.
+        """
+        return await breaker("llm").acall(
+            hedged_call,
+            lambda: self.llm.achat(messages=messages),
+            self.llm.name,
+            step,
+            fallback=lambda: assistant_reply(fallback),
+            ignore=(DeadlineExceeded,),  # a spent turn budget says nothing about the LLM's health
+        )
+
     async def _synthesize_response(
         self, 
         ctx: Context, 
@@ -59,7 +113,11 @@ class CRMAgent(Workflow):
         This version "fakes" the assistant tool call message for better context.
         """
         
-        tool_call_id = f"call_{str(uuid4())}"[:30]
+        # Deterministic, so the request (and its LLM cache key) is the same on every run of the turn
+        arguments = json.dumps(tool_input or {}, sort_keys=True, ensure_ascii=False)
+        position = len(await self._get_history_log(ctx))
+        digest = hashlib.sha1(f"{tool_name}:{arguments}".encode("utf-8")).hexdigest()[:12]
+        tool_call_id = f"call_{position}_{digest}"
         self.tools_called.append(tool_name)
         assistant_tool_call_msg = ChatMessage(
             role=MessageRole.ASSISTANT,
@@ -91,13 +149,16 @@ class CRMAgent(Workflow):
         await self._update_chat_history(ctx, tool_output_msg)
         
         full_history = await self._get_chat_history(ctx)
-        
-        response = await self.llm.achat(messages=full_history)
+        language = await ctx.store.get("language", default="en")
+
+        # Without the LLM, the rendered tool output itself is the answer
+        response = await self._achat(full_history, "synthesize", fallback=f"{canned(DEGRADED_TOOL_HEADER, language)}\n\n{tool_output}")
         
         await self._update_chat_history(ctx, response.message)
         return response.message.content
     
     @step
+    @traced("get_intent", kind="step")
     async def get_intent_step(self, ctx: Context, ev: StartEvent) -> RouterEvent:
         """
         Step 1: "Thinking." (The 'get_intent' step)
@@ -118,14 +179,26 @@ class CRMAgent(Workflow):
             AgentIntent,
         )
         messages= [ChatMessage(role=MessageRole.SYSTEM, content=prompt)] + chat_history
-        response = strucured_llm.chat(messages=messages)
-        
-        await ctx.store.set("intent_plan", response)
+        try:
+            response = await breaker("llm").acall(
+                hedged_call,
+                lambda: strucured_llm.achat(messages=messages),
+                self.llm.name,
+                "get_intent",
+                fallback=lambda: None,
+                ignore=(DeadlineExceeded,),
+            )
+        except ValueError as e:
+            # The LLM answered, but not in the AgentIntent schema; the breaker re-raises that as a caller error
+            logger.warning(f"Intent output did not parse, routing with the fallback plan: {e!r}")
+            response = None
+        plan = response.raw if response is not None else fallback_plan(user_message_str, waiting_for)
 
-        response_raw = response.raw
-        return RouterEvent(input=response_raw)
+        await ctx.store.set("intent_plan", plan)
+        return RouterEvent(input=plan)
 
     @step
+    @traced("router", kind="step")
     async def router_step(self, ctx: Context, ev: RouterEvent) -> Union[AskForInfoEvent, OrderEvent, FAQEvent, AskForInfoEvent, ProductEvent, HandoverEvent, GeneralResponseEvent, RejectEvent]:
         """
         Step 2: "Python Logic Router."
@@ -173,6 +246,7 @@ class CRMAgent(Workflow):
         return GeneralResponseEvent(input=plan)
     
     @step
+    @traced("reject_request_worker", kind="step")
     async def reject_request_worker_step(self, ctx: Context, ev: RejectEvent) -> StopEvent:
         """
         Handles out-of-scope requests by politely declining and
@@ -187,8 +261,10 @@ class CRMAgent(Workflow):
         
         chat_history = await self._get_chat_history(ctx)
         
-        response = await self.llm.achat(
-            messages=[ChatMessage(role=MessageRole.SYSTEM, content=prompt)] + chat_history[1:]
+        response = await self._achat(
+            [ChatMessage(role=MessageRole.SYSTEM, content=prompt)] + chat_history[1:],
+            "reject",
+            fallback=canned(DEGRADED_REJECT, language),
         )
         
         await self._update_chat_history(ctx, response.message)
@@ -202,6 +278,7 @@ class CRMAgent(Workflow):
         })
     
     @step
+    @traced("ask_for_info_worker", kind="step")
     async def ask_for_info_worker_step(self, ctx: Context, ev: AskForInfoEvent) -> StopEvent:
         """
         Worker step that ONLY generates human-like questions.
@@ -215,11 +292,13 @@ class CRMAgent(Workflow):
             context_message=""
         )
         
-        response = await self.llm.achat(messages=[ChatMessage(role=MessageRole.SYSTEM, content=prompt)])
+        fallback = DEGRADED_ASK_FOR_INFO[language_key(language)].get(info_needed) or canned(DEGRADED_ASK_FOR_INFO_DEFAULT, language, info_needed=info_needed)
+        response = await self._achat([ChatMessage(role=MessageRole.SYSTEM, content=prompt)], "ask_for_info", fallback=fallback)
         await self._update_chat_history(ctx, response.message)
         return self.return_event(response.message.content)
     
     @step
+    @traced("product_worker", kind="step")
     async def product_worker_step(self, ctx: Context, ev: ProductEvent) -> StopEvent:
         """
         Worker step that handles product search using a "Permissive" strategy.
@@ -245,8 +324,9 @@ class CRMAgent(Workflow):
         
         logger.info(f"Product worker: Entities found. Running search with {tool_input_cleaned}")
 
-        tool_output_dict = tool(**tool_input_cleaned)
-        tool_output_str = json.dumps(tool_output_dict)
+        with span(ToolName.PRODUCT_SEARCH.value, kind="tool"):
+            tool_output_dict = tool(**tool_input_cleaned)
+        tool_output_str = render_tool_output(ToolName.PRODUCT_SEARCH, tool_output_dict)
 
         response_str = await self._synthesize_response(
             ctx,
@@ -262,6 +342,7 @@ class CRMAgent(Workflow):
             "tools": tools_called
         })
     @step
+    @traced("faq_worker", kind="step")
     async def faq_worker_step(self, ctx: Context, ev: FAQEvent) -> StopEvent:
         """Worker step that ONLY handles FAQs."""
         plan: AgentIntent = ev.input
@@ -271,17 +352,19 @@ class CRMAgent(Workflow):
         tool_input = {"query": plan.summary_for_next_step}
         
         logger.info(f"Running FAQ Worker for: {plan.summary_for_next_step}")
-        tool_output = tool(**tool_input)
+        with span(ToolName.SEARCH_KNOWLEDGE_BASE.value, kind="tool"):
+            tool_output = tool(**tool_input)
         
         response_str = await self._synthesize_response(
             ctx,
             tool_name=ToolName.SEARCH_KNOWLEDGE_BASE,
             tool_input=tool_input,
-            tool_output=str(tool_output)
+            tool_output=render_tool_output(ToolName.SEARCH_KNOWLEDGE_BASE, tool_output)
         )
         return self.return_event(response_str)
 
     @step
+    @traced("order_worker", kind="step")
     async def order_worker_step(self, ctx: Context, ev: OrderEvent) -> StopEvent:
         """Worker step that handles both order tool calls."""
         run_tool = ev.run_tool
@@ -291,13 +374,14 @@ class CRMAgent(Workflow):
             logger.info("Running Order Worker: get_orders_by_user")
             user_id = await ctx.store.get("user_id")
             tool_input = {"user_id": user_id}
-            tool_output = self.tools[ToolName.GET_ORDER_BY_USER](**tool_input)
+            with span(ToolName.GET_ORDER_BY_USER.value, kind="tool"):
+                tool_output = self.tools[ToolName.GET_ORDER_BY_USER](**tool_input)
             
             response_str = await self._synthesize_response(
                 ctx,
                 tool_name=ToolName.GET_ORDER_BY_USER,
                 tool_input=tool_input,
-                tool_output=str(tool_output)
+                tool_output=render_tool_output(ToolName.GET_ORDER_BY_USER, tool_output)
             )
             return self.return_event(response_str)
         elif run_tool == ToolName.GET_ORDER_DETAILS:
@@ -305,19 +389,21 @@ class CRMAgent(Workflow):
             order_id = await ctx.store.get("order_id")
             
             tool_input = {"order_id": order_id, "user_id": user_id}
-            tool_output = self.tools[ToolName.GET_ORDER_DETAILS](**tool_input)
+            with span(ToolName.GET_ORDER_DETAILS.value, kind="tool"):
+                tool_output = self.tools[ToolName.GET_ORDER_DETAILS](**tool_input)
             
             response_str = await self._synthesize_response(
                 ctx,
                 tool_name=ToolName.GET_ORDER_DETAILS,
                 tool_input=tool_input,
-                tool_output=str(tool_output)
+                tool_output=render_tool_output(ToolName.GET_ORDER_DETAILS, tool_output)
             )
             return self.return_event(response_str)
             
         return self.return_event("Error in order workflow.")
 
     @step
+    @traced("handover_worker", kind="step")
     async def handover_worker_step(self, ctx: Context, ev: HandoverEvent) -> StopEvent:
         """
         Worker step that performs the human handover.
@@ -331,17 +417,22 @@ class CRMAgent(Workflow):
         chat_history = await self._get_chat_history(ctx)
         
         summary_prompt = "Summarize this chat history for a human support agent. Be concise."
-        summary_response = await self.llm.achat(
-            messages=chat_history + [ChatMessage(role=MessageRole.SYSTEM, content=summary_prompt)]
+        # Without the LLM, hand over the user's recent messages instead of a summary
+        recent = " / ".join(m.content for m in chat_history if m.role == MessageRole.USER and m.content)[-500:]
+        summary_response = await self._achat(
+            chat_history + [ChatMessage(role=MessageRole.SYSTEM, content=summary_prompt)],
+            "handover_summary",
+            fallback=recent,
         )
         summary = summary_response.message.content
         
         logger.info(f"Calling handover_simple for conv_id {conversation_id}")
-        result_string = create_support_ticket(
-            conversation_id=conversation_id,
-            email=email,
-            summary=summary
-        )
+        with span(ToolName.CREATE_SUPPORT_TICKET.value, kind="tool"):
+            result_string = create_support_ticket(
+                conversation_id=conversation_id,
+                email=email,
+                summary=summary
+            )
         self.tools_called.append(ToolName.CREATE_SUPPORT_TICKET)
         
         await self._update_chat_history(ctx, ChatMessage(role=MessageRole.ASSISTANT, content=result_string))
@@ -352,17 +443,20 @@ class CRMAgent(Workflow):
         return self.return_event(result_string)
 
     @step
+    @traced("general_response_worker", kind="step")
     async def general_response_worker_step(self, ctx: Context, ev: GeneralResponseEvent) -> StopEvent:
         """Handles greetings, off-topic, etc. No tools."""
         logger.info("Running General Response Worker...")
         chat_history = await self._get_chat_history(ctx)
-        chat_history.append(ChatMessage(role=MessageRole.SYSTEM, content="Politely respond to the user's last message."))
-        
-        response = await self.llm.achat(messages=chat_history)
+        chat_history = chat_history + [ChatMessage(role=MessageRole.SYSTEM, content="Politely respond to the user's last message.")]
+        language = await ctx.store.get("language", default="en")
+
+        response = await self._achat(chat_history, "general_response", fallback=canned(DEGRADED_GENERAL, language))
         await self._update_chat_history(ctx, response.message)
         return self.return_event(response.message.content)
     
     def return_event(self, result: str) -> None:
+        # "trace" and "degraded" are added once the workflow has finished (see CRMAgent.run)
         return StopEvent(result={
             "message": result,
             "intent": self.intent,
@@ -1,5 +1,5 @@
 import logging
-from typing import Any, List
+from typing import Any, List, Union
 from pydantic import UUID4
 
 from llama_index.core.tools.types import BaseTool
@@ -9,10 +9,16 @@ from llama_index.core.workflow import Context, StartEvent, StopEvent, Workflow,
 from llama_index.core.tools import FunctionTool
 from llama_index.core.memory import ChatMemoryBuffer
 
-from agent.const import PRODUCT_SEARCH_DESC, GET_ORDER_DETAIL_DESC, GET_ORDER_BY_USER_DESC, CREATE_SUPPORT_TICKET_DESC, SEARCH_KNOWLEDGE_BASE_DESC
-from agent.tools import search_knowledge_base, product_search, get_orders_by_user, get_order_details, create_support_ticket
+from agent.const import DEGRADED_UNAVAILABLE, PRODUCT_SEARCH_DESC, GET_ORDER_DETAIL_DESC, GET_ORDER_BY_USER_DESC, CREATE_SUPPORT_TICKET_DESC, SEARCH_KNOWLEDGE_BASE_DESC, SEARCH_KNOWLEDGE_AND_PRODUCTS_DESC
+from agent.tools import search_knowledge_base, product_search, search_knowledge_and_products, get_orders_by_user, get_order_details, create_support_ticket
 from agent.schemas import ToolName
+from agent.render import render_tool_output
 from agent.event import InputEvent, ToolCallEvent, StreamEvent
+from agent.degraded import canned
+from llm.cache import RecordReplayLLM
+from llm.traced import TracedLLM
+from resilience.breaker import breaker
+from telemetry.tracing import attach_breakdown, current_turn, get_tracer, span, traced
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -20,16 +26,27 @@ logger.setLevel(logging.INFO)
 class CRMAutoAgent(Workflow):
     def __init__(
         self,
-        llm: OpenAI,
+        llm: Union[OpenAI, RecordReplayLLM],
         conversation_id: UUID4,
         *args: Any,
         **kwargs: Any
     ) -> None:
         super().__init__(*args, **kwargs)
-        self.llm = llm
+        self.llm = TracedLLM(llm)
         self.conversation_id = conversation_id
         self.tools_called: List[ToolName] = []
 
+    def run(self, *args: Any, **kwargs: Any):
+        # Bind a fresh turn before the workflow task is created so every step inherits it
+        tracer = get_tracer()
+        token = tracer.begin_turn(workflow="auto")
+        try:
+            handler = super().run(*args, **kwargs)
+            attach_breakdown(handler, current_turn())
+            return handler
+        finally:
+            tracer.end_turn(token)
+
     def create_support_ticket(self, email: str, summary: str):
         return create_support_ticket(
             conversation_id=self.conversation_id,
@@ -49,6 +66,11 @@ class CRMAutoAgent(Workflow):
             name=ToolName.PRODUCT_SEARCH,
             description=PRODUCT_SEARCH_DESC
         )
+        search_knowledge_and_products_tool = FunctionTool.from_defaults(
+            fn=search_knowledge_and_products,
+            name=ToolName.SEARCH_KNOWLEDGE_AND_PRODUCTS,
+            description=SEARCH_KNOWLEDGE_AND_PRODUCTS_DESC
+        )
         get_orders_by_user_tool = FunctionTool.from_defaults(
             fn=get_orders_by_user,
             name=ToolName.GET_ORDER_BY_USER,
@@ -68,12 +90,14 @@ class CRMAutoAgent(Workflow):
         return [
             search_knowledge_base_tool,
             product_search_tool,
+            search_knowledge_and_products_tool,
             get_orders_by_user_tool,
             get_order_detail_tool,
             create_support_ticket_tool
         ]
     
     @step
+    @traced("prepare_chat_history", kind="step")
     async def prepare_chat_history(
         self, ctx: Context, ev: StartEvent
     ) -> InputEvent:
@@ -99,14 +123,21 @@ class CRMAutoAgent(Workflow):
         return InputEvent(input=chat_history)
 
     @step
+    @traced("handle_llm_input", kind="step")
     async def handle_llm_input(
         self, ctx: Context, ev: InputEvent
     ) -> ToolCallEvent | StopEvent:
         chat_history = ev.input
 
-        response_stream = await self.llm.astream_chat_with_tools(
-            self.tools, chat_history=chat_history
+        # The breaker bounds the wait for the stream to start; the stream itself is not cut off
+        response_stream = await breaker("llm").acall(
+            self.llm.astream_chat_with_tools, self.tools, chat_history=chat_history, fallback=lambda: None
         )
+        if response_stream is None:
+            sources = await ctx.store.get("sources", default=[])
+            return StopEvent(
+                result={"response": canned(DEGRADED_UNAVAILABLE, chat_history[-1].content), "sources": [*sources]}
+            )
         async for response in response_stream:
             ctx.write_event_to_stream(StreamEvent(delta=response.delta or ""))
 
@@ -127,6 +158,7 @@ class CRMAutoAgent(Workflow):
             return ToolCallEvent(tool_calls=tool_calls)
 
     @step
+    @traced("handle_tool_calls", kind="step")
     async def handle_tool_calls(
         self, ctx: Context, ev: ToolCallEvent
     ) -> InputEvent:
@@ -153,12 +185,13 @@ class CRMAutoAgent(Workflow):
                 continue
 
             try:
-                tool_output = tool(**tool_call.tool_kwargs)
+                with span(tool_call.tool_name, kind="tool"):
+                    tool_output = tool(**tool_call.tool_kwargs)
                 sources.append(tool_output)
                 tool_msgs.append(
                     ChatMessage(
                         role="tool",
-                        content=tool_output.content,
+                        content=render_tool_output(tool_call.tool_name, tool_output.raw_output),
                         additional_kwargs=additional_kwargs,
                     )
                 )
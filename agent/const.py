@@ -148,4 +148,41 @@ SEARCH_KNOWLEDGE_BASE_DESC="This function searches the knowledge base using a ve
 PRODUCT_SEARCH_DESC="This function searches the product catalog for monitor arms and accessories. It filters products based on text query, size, weight, VESA standard, and desk thickness to find compatible items."
 GET_ORDER_BY_USER_DESC="This function retrieves a summary list of all orders associated with a specific user_id. It returns basic information like the order ID and date for easy selection by the user."
 GET_ORDER_DETAIL_DESC="This function fetches the complete, detailed information for a single order_id. It also requires the user_id to verify ownership before returning the full order details, such as tracking and item lists."
-CREATE_SUPPORT_TICKET_DESC="This function simulates handing off a conversation to a human support agent. It validates the provided email and passes a conversation summary to a mock API to create a support ticket."
\ No newline at end of file
+SEARCH_KNOWLEDGE_AND_PRODUCTS_DESC="This function searches the knowledge base and the product catalog at the same time. Use it when a question needs both product facts and policy/FAQ information (e.g. whether an arm fits a desk and what its warranty is), instead of calling the two searches one after the other."
+
+CREATE_SUPPORT_TICKET_DESC="This function simulates handing off a conversation to a human support agent. It validates the provided email and passes a conversation summary to a mock API to create a support ticket."
+
+# --- Degraded mode: replies used when the LLM is unavailable (see resilience/breaker.py) ---
+
+DEGRADED_ASK_FOR_INFO = {
+    "zh": {
+        "user_id": "好的，我可以協助查詢訂單。請提供您的會員編號（user_id），例如 u_123456。",
+        "order_id": "請問您想查詢哪一筆訂單？請提供訂單編號（order_id），例如 JTCG-202508-10001。",
+        "email": "我可以為您轉接真人客服，請提供您的 Email。",
+    },
+    "en": {
+        "user_id": "I can help with your order. What is your user_id (e.g. u_123456)?",
+        "order_id": "Which order would you like to check? Please reply with the order_id (e.g. JTCG-202508-10001).",
+        "email": "I can transfer you to a human agent. What is your email address?",
+    },
+}
+DEGRADED_ASK_FOR_INFO_DEFAULT = {
+    "zh": "請提供更多資訊（{info_needed}），以便我協助您。",
+    "en": "Could you share your {info_needed} so I can help?",
+}
+DEGRADED_TOOL_HEADER = {
+    "zh": "抱歉，目前系統較忙碌，以下是為您找到的資料：",
+    "en": "Sorry, our assistant is running in a limited mode right now. Here is what I found:",
+}
+DEGRADED_REJECT = {
+    "zh": "抱歉，我無法提供這方面的協助。我可以協助您進行產品推薦、查詢訂單狀態、回答常見問題，或為您轉接真人客服。",
+    "en": "I'm sorry, I can't help with that. I can assist with product recommendations, order status, FAQs, or connecting you to human support.",
+}
+DEGRADED_GENERAL = {
+    "zh": "您好！我是 JTCG Shop 客服，可以協助您進行產品推薦、查詢訂單或回答常見問題。",
+    "en": "Hello! I'm JTCG Shop support. I can help with product recommendations, order status or FAQs.",
+}
+DEGRADED_UNAVAILABLE = {
+    "zh": "抱歉，系統目前暫時無法回覆，請稍後再試，或留下 Email 由真人客服協助。",
+    "en": "Sorry, I can't answer right now. Please try again shortly, or leave your email and a human agent will follow up.",
+}
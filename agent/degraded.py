@@ -0,0 +1,61 @@
+"""
+Rule-based stand-ins for the LLM calls of the agents, used while the "llm"
+circuit breaker is open or a call times out (see resilience/breaker.py).
+"""
+import re
+from typing import Dict, Optional
+
+from llama_index.core.llms import ChatMessage, ChatResponse, MessageRole
+
+from agent.schemas import AgentIntent, ExtractedEntities, UserIntent
+
+USER_ID_RE = re.compile(r"\bu_\d+\b")
+ORDER_ID_RE = re.compile(r"\bJTCG-\d{6}-\d+\b", re.IGNORECASE)
+EMAIL_IN_TEXT_RE = re.compile(r"[^\s@]+@[^\s@]+\.[^\s@]+")
+_CJK = re.compile(r"[\u3400-\u9fff]")
+
+
+def language_key(language_or_text: Optional[str]) -> str:
+    """Picks the canned-reply language ("zh" / "en") from a language name such as "Traditional Chinese" or from the text itself."""
+    value = language_or_text or ""
+    if "chinese" in value.lower() or value.lower().startswith("zh") or _CJK.search(value):
+        return "zh"
+    return "en"
+
+
+def canned(table: Dict[str, str], language: Optional[str], **values: str) -> str:
+    return table[language_key(language)].format(**values)
+
+
+def assistant_reply(content: str) -> ChatResponse:
+    return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=content))
+
+
+def fallback_plan(message: str, waiting_for: Optional[str]) -> AgentIntent:
+    """
+    Routes a turn without the intent LLM. Ids and emails are picked up with
+    regexes. Messages that carry an order identifier, or answer a pending
+    user_id question, go to the order worker. An email answering a pending
+    handover goes to the handover worker. Everything else is treated as an
+    FAQ and searched for.
+    """
+    user_id = USER_ID_RE.search(message)
+    order_id = ORDER_ID_RE.search(message)
+    email = EMAIL_IN_TEXT_RE.search(message)
+    entities = ExtractedEntities(
+        user_id=user_id.group(0) if user_id else None,
+        order_id=order_id.group(0).upper() if order_id else None,
+        email=email.group(0) if email else None,
+    )
+    if email and waiting_for == "email":
+        intent = UserIntent.HUMAN_HANDOVER
+    elif user_id or order_id or waiting_for == "user_id":
+        intent = UserIntent.ORDER_INFO
+    else:
+        intent = UserIntent.FAQ
+    return AgentIntent(
+        intent=intent,
+        language="Traditional Chinese" if language_key(message) == "zh" else "English",
+        entities=entities,
+        summary_for_next_step=message,
+    )
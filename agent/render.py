@@ -0,0 +1,160 @@
+"""
+Compact renderers for tool outputs that go into synthesis prompts.
+
+Each tool gets a renderer that keeps only the fields an answer needs, drops
+duplicates, caps long text and stops adding items once the tool's token
+budget is spent. Every render is traced as a "render" span carrying the
+token counts of the raw `str(output)` it replaces.
+"""
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from llama_index.core.utils import get_tokenizer
+
+from agent.schemas import ToolName
+from telemetry.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Max tokens per rendered tool output
+TOKEN_BUDGETS: Dict[str, int] = {
+    ToolName.SEARCH_KNOWLEDGE_BASE.value: 600,
+    ToolName.PRODUCT_SEARCH.value: 500,
+    ToolName.SEARCH_KNOWLEDGE_AND_PRODUCTS.value: 900,
+    ToolName.GET_ORDER_BY_USER.value: 300,
+    ToolName.GET_ORDER_DETAILS.value: 300,
+}
+DEFAULT_TOKEN_BUDGET = 500
+SNIPPET_CHARS = 240
+NOTE_CHARS = 120
+
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer()(text or ""))
+
+
+def _cap(text: Any, limit: int) -> str:
+    text = " ".join(str(text or "").split())
+    return text if len(text) <= limit else text[: limit - 1] + "…"
+
+
+def _dedup(items: Iterable[Dict[str, Any]], key: Callable[[Dict[str, Any]], Any]) -> List[Dict[str, Any]]:
+    seen, unique = set(), []
+    for item in items:
+        k = key(item)
+        if k in seen:
+            continue
+        seen.add(k)
+        unique.append(item)
+    return unique
+
+
+def _within_budget(header: str, blocks: List[str], budget: int) -> str:
+    """Joins as many blocks as fit in `budget` tokens and says how many were left out."""
+    lines, used = [header] if header else [], count_tokens(header)
+    for i, block in enumerate(blocks):
+        cost = count_tokens(block)
+        if used + cost > budget and lines:
+            lines.append(f"(+{len(blocks) - i} more omitted)")
+            break
+        lines.append(block)
+        used += cost
+    return "\n".join(lines)
+
+
+def _status_line(output: Dict[str, Any]) -> Optional[str]:
+    status = output.get("status")
+    if status and status != "success":
+        return f"status: {status}" + (f" - {output['message']}" if output.get("message") else "")
+    return None
+
+
+# --- Per-tool renderers ---
+
+def render_articles(articles: List[Any], budget: int) -> str:
+    records = [a if isinstance(a, dict) else {"content": str(a)} for a in articles]
+    records = _dedup(records, key=lambda a: a.get("doc_id") or a.get("url") or a.get("title") or a.get("content"))
+    blocks = []
+    for i, a in enumerate(records, start=1):
+        head = " | ".join(filter(None, [f"[{i}] {a.get('title') or ''}".strip(), a.get("url")]))
+        blocks.append(f"{head}\n{_cap(a.get('content'), SNIPPET_CHARS)}")
+    return _within_budget("" if blocks else "No matching articles.", blocks, budget)
+
+
+def render_products(products: List[Dict[str, Any]], budget: int) -> str:
+    products = _dedup(products, key=lambda p: p.get("sku") or p.get("name"))
+    blocks = []
+    for p in products:
+        fields = [p.get("sku"), p.get("name"), p.get("url")]
+        note = p.get("compatibility") or p.get("compatibility_notes")
+        line = " | ".join(str(f) for f in fields if f)
+        blocks.append(f"- {line}" + (f"\n  {_cap(note, NOTE_CHARS)}" if note else ""))
+    return _within_budget("" if blocks else "No matching products.", blocks, budget)
+
+
+def _render_knowledge_base(output: Dict[str, Any], budget: int) -> str:
+    return _status_line(output) or render_articles(output.get("results", []), budget)
+
+
+def _render_product_search(output: Dict[str, Any], budget: int) -> str:
+    return _status_line(output) or render_products(output.get("products", []), budget)
+
+
+def _render_knowledge_and_products(output: Dict[str, Any], budget: int) -> str:
+    if _status_line(output):
+        return _status_line(output)
+    articles = render_articles(output.get("results", []), budget // 2)
+    products = render_products(output.get("products", []), budget - count_tokens(articles))
+    return f"Articles:\n{articles}\nProducts:\n{products}"
+
+
+def _render_orders(output: Dict[str, Any], budget: int) -> str:
+    blocks = [
+        f"- {o.get('order_id')} | {str(o.get('placed_at') or '')[:10]} | {_cap(o.get('summary'), NOTE_CHARS)}"
+        for o in output.get("orders", [])
+    ]
+    return _status_line(output) or _within_budget("", blocks, budget)
+
+
+def _render_order_details(output: Dict[str, Any], budget: int) -> str:
+    if _status_line(output):
+        return _status_line(output)
+    d = output.get("details", {})
+    fields = ["order_id", "status", "placed_at", "carrier", "tracking", "eta", "shipping_address", "order_url"]
+    lines = [f"{f}: {d[f]}" for f in fields if d.get(f)]
+    lines += [f"- {item.get('name')} x{item.get('qty', 1)}" for item in d.get("items", [])]
+    return _within_budget("", lines, budget)
+
+
+RENDERERS: Dict[str, Callable[[Dict[str, Any], int], str]] = {
+    ToolName.SEARCH_KNOWLEDGE_BASE.value: _render_knowledge_base,
+    ToolName.PRODUCT_SEARCH.value: _render_product_search,
+    ToolName.SEARCH_KNOWLEDGE_AND_PRODUCTS.value: _render_knowledge_and_products,
+    ToolName.GET_ORDER_BY_USER.value: _render_orders,
+    ToolName.GET_ORDER_DETAILS.value: _render_order_details,
+}
+
+
+def _render_generic(output: Any, budget: int) -> str:
+    text = output if isinstance(output, str) else json.dumps(output, ensure_ascii=False, separators=(",", ":"), default=str)
+    tokens = get_tokenizer()(text)
+    return text if len(tokens) <= budget else _cap(text, max(1, len(text) * budget // len(tokens)))
+
+
+def render_tool_output(tool_name: Any, output: Any) -> str:
+    """Compact prompt text for one tool result; falls back to capped JSON for unknown tools or shapes."""
+    name = getattr(tool_name, "value", str(tool_name))
+    budget = TOKEN_BUDGETS.get(name, DEFAULT_TOKEN_BUDGET)
+    with span("render", kind="render", tool=name) as current:
+        renderer = RENDERERS.get(name)
+        if renderer is not None and isinstance(output, dict):
+            text = renderer(output, budget)
+        else:
+            text = _render_generic(output, budget)
+
+        if current is not None:
+            raw_tokens = count_tokens(str(output))
+            tokens = count_tokens(text)
+            current.attributes.update(raw_tokens=raw_tokens, tokens=tokens, tokens_saved=raw_tokens - tokens)
+    return text
@@ -8,6 +8,7 @@ class ToolName(str, Enum):
     GET_ORDER_BY_USER="get_order_by_user"
     GET_ORDER_DETAILS="get_order_details"
     CREATE_SUPPORT_TICKET="create_support_ticket"
+    SEARCH_KNOWLEDGE_AND_PRODUCTS="search_knowledge_and_products"
 
 class UserIntent(str, Enum):
     ORDER_INFO="order_info"
@@ -1,31 +1,75 @@
 import re
 from pydantic import UUID4
 from typing import List, Union, Dict, Optional, Any
-from retriever.utils import retreive_from_vector_store, retrieve_from_product
-from document.data import product_df, order_db
+from llama_index.core.schema import NodeWithScore
+
+from retriever.utils import retreive_from_vector_store, retrieve_from_product, select_knowledge
+from retriever.federated import SOURCE_KEY, normalize_scores, retrieve_federated
+from retriever.product_filter import ProductFilter
+from retriever.const import PRODUCT_CANDIDATES
+from retriever.degraded import filter_products, keyword_search
+from resilience.breaker import breaker
+from config.env import PRODUCT_RESULT_LIMIT
+from document.data import product_catalog, order_db
+from document.chunking import chunk_body
 
 EMAIL_RE = re.compile(r"^[^\s@]+@[^\s@]+\.[^\s@]+$")
 
-def search_knowledge_base(query: str) -> Dict[str, Union[str, List[str]]]:
-    """Searches the knowledge base using a hybrid approach."""
-    vector_results = retreive_from_vector_store(query)
-    return {"status": "success", "results": [node.get_text() for node in vector_results]}
+def _article(node: NodeWithScore) -> Dict[str, Any]:
+    metadata = node.metadata or {}
+    return {
+        "doc_id": metadata.get("doc_id"),
+        "title": metadata.get("title"),
+        "content": metadata.get("content") or chunk_body(node.node),
+        "url": metadata.get("url"),
+    }
 
-def product_search(query: Optional[str] = None, size_inch: Optional[int] = None, weight_kg: Optional[float] = None) -> Dict[str, Any]:
-    """Searches the product catalog based on specifications."""
-    filtered_df = product_df.copy()
-    if query:
-        filtered_df = filtered_df[filtered_df['name'].str.contains(query, case=False)]
-    if size_inch:
-        filtered_df = filtered_df[filtered_df['specs/size_max_inch'] >= size_inch]
-    if weight_kg:
-        filtered_df = filtered_df[
-            (filtered_df['weight_min_kg'] <= weight_kg) &
-            (filtered_df['weight_max_kg'] >= weight_kg)
-        ]
-    results = filtered_df.to_dict('records')
-    product_list = [{ "sku": r["sku"], "name": r["name"], "url": r["url"], "image": r["images/0"], "compatibility": r["compatibility_notes"]} for r in results]
-    return {"status": "success", "products": product_list}
+def search_knowledge_base(query: str) -> Dict[str, Union[str, List[Dict[str, Any]]]]:
+    """Searches the knowledge base using a hybrid approach (keyword-only while retrieval is degraded)."""
+    degraded = False
+
+    def fallback() -> List[NodeWithScore]:
+        nonlocal degraded
+        degraded = True
+        return keyword_search(query)
+
+    vector_results = breaker("retrieval").call(retreive_from_vector_store, query, fallback=fallback)
+    result = {"status": "success", "results": [_article(node) for node in vector_results]}
+    if degraded:
+        result["degraded"] = True
+    return result
+
+def _merge_products(
+    semantic: List[NodeWithScore],
+    filtered: List[Dict[str, Any]],
+    has_filter: bool,
+    limit: int,
+) -> List[Dict[str, Any]]:
+    """
+    Dedups by SKU and ranks by one combined score: 1 for matching the
+    structured filter plus the min-max normalized semantic score.
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for hit in normalize_scores(semantic):
+        record = hit.metadata
+        sku = record.get("sku") or record.get("name")
+        if sku in merged:
+            continue
+        # semantic hits were retrieved with the filter pushed down, so they match it
+        merged[sku] = {**record, "_score": (1.0 if has_filter else 0.0) + (hit.score or 0.0)}
+    for record in filtered:
+        sku = record.get("sku") or record.get("name")
+        merged.setdefault(sku, {**record, "_score": 1.0})
+
+    ranked = sorted(merged.values(), key=lambda r: r["_score"], reverse=True)[:limit]
+    return [{
+        "sku": r.get("sku"),
+        "name": r.get("name"),
+        "url": r.get("url"),
+        "image": r.get("image"),
+        "compatibility": r.get("compatibility_notes"),
+        "score": round(r["_score"], 3),
+    } for r in ranked]
 
 def product_search(
     query: Optional[str] = None,
@@ -44,55 +88,56 @@ def product_search(
     - vesa: Checks if the arm supports a VESA standard (e.g., '75x75', '100x100').
     - desk_thickness_mm: Checks if the desk thickness is within the supported range.
     """
-    filtered_df = product_df.copy()
-
-    result_query = []
+    product_filter = ProductFilter(
+        size_inch=size_inch,
+        weight_kg=weight_kg,
+        arm_type=arm_type,
+        vesa=vesa,
+        desk_thickness_mm=desk_thickness_mm,
+    )
+
+    semantic, degraded = [], False
     if query:
-        result = retrieve_from_product(query)
-        result_query = [n.metadata for n in result]
-
-    if arm_type:
-        filtered_df = filtered_df[filtered_df['specs/arm_type'] == arm_type]
-
-    if size_inch:
-        filtered_df = filtered_df[
-            (filtered_df['specs/size_max_inch'] >= size_inch) | 
-            (filtered_df['specs/arm_type'] == 'accessory')
-        ]
-
-    if weight_kg:
-        filtered_df = filtered_df[
-            (filtered_df['weight_min_kg'] <= weight_kg) &
-            (filtered_df['weight_max_kg'] >= weight_kg)
-        ]
-
-    if vesa:
-        filtered_df = filtered_df[
-            (filtered_df['specs/vesa/0'] == vesa) |
-            (filtered_df['specs/vesa/1'] == vesa)
-        ]
-        
-    if desk_thickness_mm:
-        filtered_df = filtered_df[
-            (filtered_df['desk_min_mm'] <= desk_thickness_mm) &
-            (filtered_df['desk_max_mm'] >= desk_thickness_mm)
-        ]
-
-    results = filtered_df.to_dict('records')
-    if not query and not arm_type and not size_inch and not weight_kg and not vesa and not desk_thickness_mm:
-        results = product_df.to_dict("records")
-
-    product_list = [{
-        "sku": r["sku"],
-        "name": r["name"],
-        "url": r["url"],
-        "image": r["images/0"],
-        "compatibility": r["compatibility_notes"]
-    } for r in results]
-
-    product_list.extend(result_query)
-
-    return {"status": "success", "products": product_list}
+        semantic = breaker("retrieval").call(
+            retrieve_from_product, query, product_filter=product_filter, top_k=PRODUCT_CANDIDATES, fallback=lambda: None
+        )
+        degraded = semantic is None
+        semantic = semantic or []
+
+    filtered = []
+    if degraded:
+        # Vector search unavailable: rank the filtered catalog by keyword overlap instead
+        filtered = filter_products(query, product_filter, PRODUCT_RESULT_LIMIT)
+    elif product_filter and len(semantic) < PRODUCT_RESULT_LIMIT:
+        # Backfill from the catalog only when the filtered semantic search came up short
+        filtered = [record for record in product_catalog if product_filter.matches(record)]
+    elif not query and not product_filter:
+        filtered = product_catalog
+
+    products = _merge_products(semantic, filtered, bool(product_filter), PRODUCT_RESULT_LIMIT)
+    result = {"status": "success", "products": products}
+    if degraded:
+        result["degraded"] = True
+    return result
+
+def search_knowledge_and_products(query: str) -> Dict[str, Any]:
+    """Searches the knowledge base and the product catalog concurrently with one query."""
+    results = breaker("retrieval").call(retrieve_federated, query, fallback=lambda: None)
+    if results is None:
+        return {
+            "status": "success",
+            "results": [_article(node) for node in keyword_search(query)],
+            "products": _merge_products([], filter_products(query, ProductFilter(), PRODUCT_RESULT_LIMIT), False, PRODUCT_RESULT_LIMIT),
+            "degraded": True,
+        }
+    # Each half gets the same post-processing as its own tool: rerank and collapse, and SKU dedup
+    knowledge = select_knowledge(query, [n for n in results if n.metadata.get(SOURCE_KEY) == "knowledge_base"])
+    products = [n for n in results if n.metadata.get(SOURCE_KEY) == "product"]
+    return {
+        "status": "success",
+        "results": [_article(node) for node in knowledge],
+        "products": _merge_products(products, [], False, PRODUCT_RESULT_LIMIT),
+    }
 
 def get_orders_by_user(user_id: str) -> Dict[str, Any]:
     """Gets a summary list of orders for a user_id."""
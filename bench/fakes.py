@@ -0,0 +1,269 @@
+import asyncio
+import json
+import random
+import re
+import time
+from collections import Counter
+from typing import Any, AsyncGenerator, Dict, List, Optional, Sequence, Type
+
+import jieba
+from pydantic import BaseModel, PrivateAttr
+from llama_index.core.llms import ChatMessage, ChatResponse, LLMMetadata, MessageRole
+from llama_index.core.schema import BaseNode, TextNode
+from llama_index.core.tools import ToolSelection
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQuery, VectorStoreQueryResult
+
+from agent.schemas import AgentIntent, ExtractedEntities, ToolName, UserIntent
+from retriever.local import passes_filters
+
+USER_ID_RE = re.compile(r"u_\d+")
+ORDER_ID_RE = re.compile(r"JTCG-\d{6}-\d+")
+EMAIL_RE = re.compile(r"[^\s@]+@[^\s@]+\.[^\s@]+")
+SIZE_RE = re.compile(r"(\d{2})\s*(?:吋|inch|\")", re.IGNORECASE)
+
+# Checked in order, first match wins (mirrors the priority in INTENT_ROUTER_PROMPT)
+INTENT_KEYWORDS = [
+    (UserIntent.REJECT_REQUEST, ["天氣", "weather", "poem", "president", "股票"]),
+    (UserIntent.HUMAN_HANDOVER, ["真人", "客服", "human", "agent", "轉接"]),
+    (UserIntent.ORDER_INFO, ["訂單", "order", "物流", "出貨", "track", "u_"]),
+    (UserIntent.PRODUCT_SEARCH, ["推薦", "支架", "臂", "吋", "recommend", "arm", "mount", "現貨"]),
+    (UserIntent.GENERAL_RESPONSE, ["謝謝", "thanks", "hello", "hi", "你好", "再見"]),
+]
+
+
+def _tokens(text: str) -> Counter:
+    return Counter(t for t in jieba.cut_for_search((text or "").lower()) if t.strip())
+
+
+def _count_tokens(text: str) -> int:
+    # roughly what tiktoken gives for mixed zh/en text
+    return max(1, len(text or "") // 2)
+
+
+def classify(text: str) -> AgentIntent:
+    """Deterministic keyword stand-in for the get_intent LLM call."""
+    lowered = (text or "").lower()
+    intent = UserIntent.FAQ
+    for candidate, keywords in INTENT_KEYWORDS:
+        if any(k in lowered for k in keywords):
+            intent = candidate
+            break
+    size = SIZE_RE.search(text or "")
+    entities = ExtractedEntities(
+        user_id=(USER_ID_RE.search(text or "") or [None])[0],
+        order_id=(ORDER_ID_RE.search(text or "") or [None])[0],
+        email=(EMAIL_RE.search(text or "") or [None])[0],
+        product_query=text if intent == UserIntent.PRODUCT_SEARCH else None,
+        size_inch=int(size.group(1)) if size else None,
+    )
+    return AgentIntent(
+        intent=intent,
+        language="Traditional Chinese" if re.search(r"[一-鿿]", text or "") else "English",
+        entities=entities,
+        summary_for_next_step=text or "",
+    )
+
+
+def _last_user_text(messages: Sequence[ChatMessage]) -> str:
+    for message in reversed(messages):
+        if message.role == MessageRole.USER:
+            return message.content or ""
+    return ""
+
+
+class FakeLLM:
+    """
+    Deterministic, network-free LLM with a configurable per-call latency.
+
+    Implements the subset of the llama_index LLM surface the agents use:
+    `achat`/`chat`, `as_structured_llm(AgentIntent)`, `astream_chat_with_tools`
+    and `get_tool_calls_from_response`. Token counts are estimated from text
+    length so traces carry realistic-looking usage.
+    """
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        seed: int = 0,
+        slow_rate: float = 0.0,
+        slow_ms: float = 0.0,
+    ) -> None:
+        self.model = "fake-llm"
+        self.temperature = 0.0
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        # Stragglers: a `slow_rate` fraction of calls takes `slow_ms` longer (the tail hedging targets)
+        self.slow_rate = slow_rate
+        self.slow_ms = slow_ms
+        self._rng = random.Random(seed)
+
+    @property
+    def metadata(self) -> LLMMetadata:
+        return LLMMetadata(
+            context_window=128000,
+            num_output=1024,
+            is_chat_model=True,
+            is_function_calling_model=True,
+            model_name=self.model,
+        )
+
+    def _delay(self) -> float:
+        ms = self.latency_ms + self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+        if self.slow_rate and self._rng.random() < self.slow_rate:
+            ms += self.slow_ms
+        return max(0.0, ms) / 1000
+
+    def _respond(self, messages: Sequence[ChatMessage], content: str, **additional_kwargs: Any) -> ChatResponse:
+        prompt = "".join(m.content or "" for m in messages)
+        return ChatResponse(
+            message=ChatMessage(role=MessageRole.ASSISTANT, content=content, additional_kwargs=additional_kwargs),
+            delta=content,
+            additional_kwargs={"prompt_tokens": _count_tokens(prompt), "completion_tokens": _count_tokens(content)},
+        )
+
+    def _answer(self, messages: Sequence[ChatMessage]) -> str:
+        last = messages[-1] if messages else None
+        if last is not None and last.role == MessageRole.TOOL:
+            return f"根據查詢結果：{(last.content or '')[:120]}"
+        return f"收到您的問題：{_last_user_text(messages)[:60]}"
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        time.sleep(self._delay())
+        return self._respond(messages, self._answer(messages))
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        await asyncio.sleep(self._delay())
+        return self._respond(messages, self._answer(messages))
+
+    def as_structured_llm(self, output_cls: Type[BaseModel], **kwargs: Any) -> "FakeStructuredLLM":
+        return FakeStructuredLLM(self, output_cls)
+
+    async def astream_chat_with_tools(
+        self,
+        tools: List[Any],
+        user_msg: Optional[Any] = None,
+        chat_history: Optional[List[ChatMessage]] = None,
+        **kwargs: Any,
+    ) -> AsyncGenerator[ChatResponse, None]:
+        messages = list(chat_history or [])
+        await asyncio.sleep(self._delay())
+
+        if messages and messages[-1].role != MessageRole.TOOL:
+            plan = classify(_last_user_text(messages))
+            tool_name = {
+                UserIntent.FAQ: ToolName.SEARCH_KNOWLEDGE_BASE,
+                UserIntent.PRODUCT_SEARCH: ToolName.PRODUCT_SEARCH,
+            }.get(plan.intent)
+            if tool_name is not None:
+                call = {
+                    "id": f"call_{self._rng.randrange(1 << 30)}",
+                    "type": "function",
+                    "function": {"name": tool_name.value, "arguments": json.dumps({"query": plan.summary_for_next_step}, ensure_ascii=False)},
+                }
+                return self._stream(self._respond(messages, "", tool_calls=[call]))
+        return self._stream(self._respond(messages, self._answer(messages)))
+
+    async def _stream(self, response: ChatResponse) -> AsyncGenerator[ChatResponse, None]:
+        content = response.message.content or ""
+        step = max(1, len(content) // 4)
+        for i in range(0, len(content), step):
+            yield ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=content[: i + step]), delta=content[i : i + step])
+        yield response
+
+    def get_tool_calls_from_response(
+        self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs: Any
+    ) -> List[ToolSelection]:
+        tool_calls = response.message.additional_kwargs.get("tool_calls") or []
+        if not tool_calls and error_on_no_tool_call:
+            raise ValueError("Expected at least one tool call.")
+        return [
+            ToolSelection(
+                tool_id=call["id"],
+                tool_name=call["function"]["name"],
+                tool_kwargs=json.loads(call["function"]["arguments"] or "{}"),
+            )
+            for call in tool_calls
+        ]
+
+
+class FakeStructuredLLM:
+    def __init__(self, parent: FakeLLM, output_cls: Type[BaseModel]) -> None:
+        if output_cls is not AgentIntent:
+            raise TypeError(f"FakeLLM only produces AgentIntent, not {output_cls.__name__}")
+        self.parent = parent
+        self.output_cls = output_cls
+
+    def _respond(self, messages: Sequence[ChatMessage]) -> ChatResponse:
+        plan = classify(_last_user_text(messages))
+        response = self.parent._respond(messages, plan.model_dump_json())
+        response.raw = plan
+        return response
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        time.sleep(self.parent._delay())
+        return self._respond(messages)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        await asyncio.sleep(self.parent._delay())
+        return self._respond(messages)
+
+
+class InMemoryVectorStore(BasePydanticVectorStore):
+    """
+    In-process stand-in for CustomMilvusVector: keeps nodes in a dict and
+    ranks them by jieba token overlap. It never asks for query embeddings, so
+    retrieval runs without Milvus or the embedding API. doc_ids, node_ids and
+    metadata filters restrict the candidates as in LocalHybridVector, so the
+    product pre-filter path is exercised too.
+    """
+
+    stores_text: bool = True
+    is_embedding_query: bool = False
+
+    _nodes: Dict[str, BaseNode] = PrivateAttr(default_factory=dict)
+    _tokens: Dict[str, Counter] = PrivateAttr(default_factory=dict)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "InMemoryVectorStore"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        for node in nodes:
+            self._nodes[node.node_id] = node
+            self._tokens[node.node_id] = _tokens(node.get_content())
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        for node_id in [i for i, n in self._nodes.items() if n.ref_doc_id == ref_doc_id]:
+            self._nodes.pop(node_id)
+            self._tokens.pop(node_id)
+
+    def _allowed(self, node: BaseNode, query: VectorStoreQuery) -> bool:
+        if query.doc_ids and str(node.metadata.get("doc_id", node.ref_doc_id)) not in set(map(str, query.doc_ids)):
+            return False
+        if query.node_ids and node.node_id not in query.node_ids:
+            return False
+        return not query.filters or passes_filters(node.metadata, query.filters)
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        wanted = _tokens(query.query_str or "")
+        scored = []
+        for node_id, tokens in self._tokens.items():
+            if not self._allowed(self._nodes[node_id], query):
+                continue
+            overlap = sum(min(count, tokens[t]) for t, count in wanted.items())
+            if overlap:
+                scored.append((overlap / (1 + sum(tokens.values()) ** 0.5), node_id))
+        scored.sort(reverse=True)
+        top = scored[: query.similarity_top_k]
+        nodes = [self._nodes[node_id] for _, node_id in top]
+        return VectorStoreQueryResult(
+            nodes=[n if isinstance(n, TextNode) else TextNode(text=n.get_content(), id_=n.node_id) for n in nodes],
+            similarities=[score for score, _ in top],
+            ids=[node_id for _, node_id in top],
+        )
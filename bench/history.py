@@ -0,0 +1,166 @@
+"""
+Per-turn cost of the intent agent's history bookkeeping as a conversation grows.
+
+Each simulated turn does the history work of one tool turn in CRMAgent: it
+appends the user message, the tool call, the tool output and the answer,
+takes the three history snapshots the steps read, and saves the session
+(session/store.py). The LLM and the tools are left out, so what is timed is
+the bookkeeping alone. Two modes are compared:
+
+- "log": the HistoryLog that CRMAgent now uses. Appends are in place,
+  snapshots are O(1), and the save writes only the new messages.
+- "rewrite": the previous get / append / set of a plain list, on a context
+  store that re-encodes the history on every set (as durable state stores
+  do), with the whole history rewritten on every save.
+
+    python -m bench.history                          # 500 turns, SQLite session store
+    python -m bench.history --turns 1000 --bucket 100 --backend memory
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+# Must be set before config.env is imported; nothing here talks to OpenAI or Milvus.
+os.environ.setdefault("EMBED_DIM", "1536")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("COLLECTION_NAME", "bench_knowledge_base")
+os.environ.setdefault("PRODUCT_COLLECTION_NAME", "bench_products")
+os.environ["TRACE_SINK"] = "none"
+
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.workflow import Context, JsonSerializer
+
+from agent.agent import CRMAgent
+from agent.const import JTCG_SYSTEM_PROMPT
+from bench.fakes import FakeLLM
+from session.store import MemorySessionStore, SessionStore, SQLiteSessionStore, pack_message, save_context
+
+SESSION_ID = "BENCH-HISTORY"
+
+
+def turn_messages(turn: int) -> List[ChatMessage]:
+    """The messages one tool turn adds, about the size of a real FAQ turn."""
+    return [
+        ChatMessage(role=MessageRole.USER, content=f"第 {turn} 個問題：螢幕支架可以承重多少公斤？"),
+        ChatMessage(
+            role=MessageRole.ASSISTANT,
+            content=None,
+            additional_kwargs={"tool_calls": [{"id": f"call_{turn}", "type": "function", "function": {"name": "search_knowledge_base", "arguments": "{}"}}]},
+        ),
+        ChatMessage(role=MessageRole.TOOL, content="支架承重 2-9 公斤，適用 17-32 吋螢幕。" * 8, additional_kwargs={"tool_call_id": f"call_{turn}", "name": "search_knowledge_base"}),
+        ChatMessage(role=MessageRole.ASSISTANT, content="根據查詢結果，這款支架可承重 2 到 9 公斤。"),
+    ]
+
+
+async def log_turn(agent: CRMAgent, ctx: Context, store: SessionStore, messages: List[ChatMessage]) -> None:
+    user, tool_call, tool_output, answer = messages
+    await agent._update_chat_history(ctx, user)
+    await agent._get_chat_history(ctx)  # intent routing
+    await agent._update_chat_history(ctx, tool_call)
+    await agent._update_chat_history(ctx, tool_output)
+    await agent._get_chat_history(ctx)  # synthesis
+    await agent._update_chat_history(ctx, answer)
+    await agent._get_chat_history(ctx)  # next step's read
+    await save_context(ctx, store, SESSION_ID)
+
+
+async def rewrite_turn(ctx: Context, store: SessionStore, serializer: JsonSerializer, messages: List[ChatMessage]) -> None:
+    async def get() -> List[ChatMessage]:
+        history = await ctx.store.get("history", default=[])
+        if not history:
+            history.append(ChatMessage(role=MessageRole.SYSTEM, content=JTCG_SYSTEM_PROMPT))
+        return history
+
+    async def append(message: ChatMessage) -> None:
+        history = await get()
+        history.append(message)
+        await ctx.store.set("history", history)
+        serializer.serialize(history)
+
+    user, tool_call, tool_output, answer = messages
+    await append(user)
+    await get()
+    await append(tool_call)
+    await append(tool_output)
+    await get()
+    await append(answer)
+    history = await get()
+    state = {"conversation_id": SESSION_ID}
+    await asyncio.to_thread(store.save, SESSION_ID, state, [pack_message(m) for m in history], 0)
+
+
+def make_store(backend: str, directory: str) -> SessionStore:
+    if backend == "memory":
+        return MemorySessionStore()
+    return SQLiteSessionStore(path=os.path.join(directory, "sessions.sqlite"))
+
+
+async def bench_mode(mode: str, turns: int, backend: str) -> List[float]:
+    """Milliseconds of bookkeeping per turn, in turn order."""
+    agent = CRMAgent(llm=FakeLLM())
+    serializer = JsonSerializer()
+    with tempfile.TemporaryDirectory() as directory:
+        store = make_store(backend, directory)
+        ctx = Context(agent)
+        elapsed = []
+        for turn in range(turns):
+            messages = turn_messages(turn)
+            started = time.perf_counter()
+            if mode == "log":
+                await log_turn(agent, ctx, store, messages)
+            else:
+                await rewrite_turn(ctx, store, serializer, messages)
+            elapsed.append((time.perf_counter() - started) * 1000)
+    return elapsed
+
+
+def buckets(elapsed: List[float], size: int) -> List[Dict[str, float]]:
+    return [
+        {
+            "turns": f"{start + 1}-{start + len(elapsed[start:start + size])}",
+            "mean_ms": round(statistics.fmean(elapsed[start:start + size]), 3),
+            "median_ms": round(statistics.median(elapsed[start:start + size]), 3),
+        }
+        for start in range(0, len(elapsed), size)
+    ]
+
+
+async def main(args: argparse.Namespace) -> int:
+    logging.disable(logging.WARNING)
+    report = {"config": {"turns": args.turns, "bucket": args.bucket, "backend": args.backend}, "modes": {}}
+    for mode in args.modes:
+        rows = buckets(await bench_mode(mode, args.turns, args.backend), args.bucket)
+        growth = rows[-1]["median_ms"] / rows[0]["median_ms"] if rows[0]["median_ms"] else 0.0
+        report["modes"][mode] = {"buckets": rows, "growth": round(growth, 2)}
+
+        print(f"\n=== {mode} ({args.backend} session store) ===")
+        for row in rows:
+            print(f"  turns {row['turns']:<10} mean={row['mean_ms']:<9.3f} median={row['median_ms']:.3f} ms")
+        print(f"  last / first bucket (median): {growth:.2f}x")
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark per-turn history bookkeeping as conversations grow.")
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--bucket", type=int, default=50, help="Report the per-turn cost per this many turns")
+    parser.add_argument("--backend", choices=["sqlite", "memory"], default="sqlite", help="Session store the turns are saved to")
+    parser.add_argument("--modes", nargs="+", choices=["log", "rewrite"], default=["log", "rewrite"])
+    parser.add_argument("--output", default=None, help="Also write the report as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
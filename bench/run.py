@@ -0,0 +1,278 @@
+"""
+Framework-overhead benchmark for CRMAgent (intent) and CRMAutoAgent (auto).
+
+Replays document/evaluation.json through both workflows with a deterministic
+FakeLLM (fixed latency, optional jitter) and in-memory vector stores, so the
+numbers only move when our own code does. Reports per-intent throughput,
+p50/p95/p99 per span and per turn, framework overhead (turn time minus time
+spent inside the LLM) and peak allocations per turn, and compares them with a
+stored baseline.
+
+    python -m bench.run                       # compare against bench/baseline.json
+    python -m bench.run --update-baseline     # record a new baseline
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+from uuid import uuid4
+
+# Must be set before config.env is imported; nothing here talks to OpenAI or Milvus.
+os.environ.setdefault("EMBED_DIM", "1536")
+os.environ.setdefault("OPENAI_API_KEY", "sk-bench")
+os.environ.setdefault("COLLECTION_NAME", "bench_knowledge_base")
+os.environ.setdefault("PRODUCT_COLLECTION_NAME", "bench_products")
+os.environ["TRACE_SINK"] = "none"
+
+from config.env import COLLECTION_NAME, PRODUCT_COLLECTION_NAME
+from retriever.vector_store import set_vector_store
+from bench.fakes import FakeLLM, InMemoryVectorStore, classify
+
+TEST_FILE = "document/evaluation.json"
+BASELINE_FILE = "bench/baseline.json"
+# Lower-is-better metrics checked against the baseline
+GATED_METRICS = ["turn_p50_ms", "turn_p95_ms", "overhead_p50_ms", "overhead_p95_ms", "alloc_peak_p95_kib"]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    return {
+        "n": len(values),
+        "p50": round(percentile(values, 0.50), 3),
+        "p95": round(percentile(values, 0.95), 3),
+        "p99": round(percentile(values, 0.99), 3),
+    }
+
+
+def setup_stores() -> None:
+    set_vector_store(COLLECTION_NAME, InMemoryVectorStore())
+    set_vector_store(PRODUCT_COLLECTION_NAME, InMemoryVectorStore())
+
+    from seed_data import load_data_and_build_retrievers, seed_products_db
+    load_data_and_build_retrievers(resume=False)
+    seed_products_db(resume=False)
+
+
+def load_cases(path: str, limit: Optional[int]) -> List[Tuple[List[Dict[str, Any]], str]]:
+    with open(path, "r", encoding="utf-8") as f:
+        conversations = json.load(f)
+
+    cases = []
+    for conversation in conversations:
+        last = conversation[-1]
+        if last.get("role") != "user":
+            continue
+        cases.append((conversation[:-1], last.get("content", [{}])[0].get("text", "")))
+    return cases[:limit] if limit else cases
+
+
+async def run_turn(agent_name: str, llm: FakeLLM, history: List[Dict[str, Any]], question: str) -> Dict[str, Any]:
+    if agent_name == "intent":
+        from agent.agent import CRMAgent
+        from evaluation.evaluation import _prepare_context
+
+        agent = CRMAgent(llm=llm)
+        ctx = await _prepare_context(agent=agent, conversation_history=history, conversation_id=f"BENCH-{uuid4()}")
+    else:
+        from agent.agent_auto import CRMAutoAgent
+        from evaluation.evaluation_auto import _prepare_context
+
+        agent = CRMAutoAgent(llm=llm, conversation_id=uuid4())
+        ctx = await _prepare_context(agent=agent, llm=llm, conversation_history=history)
+
+    result = await agent.run(input=question, ctx=ctx)
+    return result if isinstance(result, dict) else {}
+
+
+async def bench_agent(agent_name: str, cases, llm: FakeLLM, measure_alloc: bool) -> Dict[str, Any]:
+    turn_ms: List[float] = []
+    overhead_ms: List[float] = []
+    alloc_kib: List[float] = []
+    span_ms: Dict[str, List[float]] = defaultdict(list)
+    by_intent: Dict[str, List[float]] = defaultdict(list)
+    errors = 0
+
+    # Warm-up: first turn pays for imports, jieba's dictionary and pydantic schema builds
+    await run_turn(agent_name, llm, *cases[0])
+
+    for history, question in cases:
+        label = classify(question).intent.value
+        if measure_alloc:
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            result = await run_turn(agent_name, llm, history, question)
+        except Exception as e:
+            errors += 1
+            print(f"  [{agent_name}] error on '{question[:30]}': {e}", file=sys.stderr)
+            continue
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            if measure_alloc:
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                alloc_kib.append(peak / 1024)
+
+        trace = result.get("trace") or {}
+        llm_ms = sum(s["duration_ms"] for s in trace.get("spans", []) if s["kind"] == "llm")
+        turn_ms.append(elapsed)
+        overhead_ms.append(elapsed - llm_ms)
+        by_intent[result.get("intent", label) if agent_name == "intent" else label].append(elapsed)
+        for s in trace.get("spans", []):
+            span_ms[s["name"]].append(s["duration_ms"])
+
+    turns = summarize(turn_ms)
+    overhead = summarize(overhead_ms)
+    alloc = summarize(alloc_kib)
+    return {
+        "turns": len(turn_ms),
+        "errors": errors,
+        "turn_ms": turns,
+        "overhead_ms": overhead,
+        "alloc_peak_kib": alloc if measure_alloc else None,
+        "spans_ms": {name: summarize(values) for name, values in sorted(span_ms.items())},
+        "throughput_per_intent": {
+            str(getattr(intent, "value", intent)): {
+                "turns": len(values),
+                "turns_per_s": round(len(values) / (sum(values) / 1000), 3) if sum(values) else 0.0,
+            }
+            for intent, values in sorted(by_intent.items(), key=lambda kv: str(kv[0]))
+        },
+        "gated": {
+            "turn_p50_ms": turns["p50"],
+            "turn_p95_ms": turns["p95"],
+            "overhead_p50_ms": overhead["p50"],
+            "overhead_p95_ms": overhead["p95"],
+            "alloc_peak_p95_kib": alloc["p95"] if measure_alloc else None,
+        },
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float) -> List[str]:
+    regressions = []
+    if baseline.get("config") != report["config"]:
+        print(f"WARNING: baseline was recorded with {baseline.get('config')}, this run uses {report['config']}")
+    for agent_name, current in report["agents"].items():
+        reference = baseline.get("agents", {}).get(agent_name)
+        if reference is None:
+            print(f"WARNING: no baseline for agent '{agent_name}'")
+            continue
+        for metric in GATED_METRICS:
+            now, then = current["gated"].get(metric), reference["gated"].get(metric)
+            if now is None or not then:
+                continue
+            if now > then * (1 + tolerance):
+                regressions.append(f"{agent_name}.{metric}: {then:.2f} -> {now:.2f} (+{(now / then - 1) * 100:.0f}%)")
+    return regressions
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    for agent_name, result in report["agents"].items():
+        print(f"\n=== {agent_name} ({result['turns']} turns, {result['errors']} errors) ===")
+        print(f"  turn      p50/p95/p99: {result['turn_ms']['p50']:.2f} / {result['turn_ms']['p95']:.2f} / {result['turn_ms']['p99']:.2f} ms")
+        print(f"  overhead  p50/p95/p99: {result['overhead_ms']['p50']:.2f} / {result['overhead_ms']['p95']:.2f} / {result['overhead_ms']['p99']:.2f} ms")
+        if result["alloc_peak_kib"]:
+            print(f"  alloc peak p50/p95: {result['alloc_peak_kib']['p50']:.0f} / {result['alloc_peak_kib']['p95']:.0f} KiB")
+        print("  throughput per intent:")
+        for intent, stats in result["throughput_per_intent"].items():
+            print(f"    {intent:<18} {stats['turns']:>4} turns  {stats['turns_per_s']:>8.2f} turns/s")
+        print("  spans (ms):")
+        for name, stats in result["spans_ms"].items():
+            print(f"    {name:<36} n={stats['n']:<4} p50={stats['p50']:<9.3f} p95={stats['p95']:<9.3f} p99={stats['p99']:.3f}")
+
+
+async def main(args: argparse.Namespace) -> int:
+    logging.disable(logging.WARNING)
+    setup_stores()
+    cases = load_cases(args.test_file, args.limit)
+    agents = ["intent", "auto"] if args.agent == "both" else [args.agent]
+
+    report = {
+        "config": {
+            "llm_latency_ms": args.llm_latency_ms,
+            "jitter_ms": args.jitter_ms,
+            "slow_rate": args.slow_rate,
+            "slow_ms": args.slow_ms,
+            "cases": len(cases),
+            "alloc": not args.no_alloc,
+        },
+        "host": {"python": platform.python_version(), "machine": platform.machine()},
+        "agents": {},
+    }
+    for agent_name in agents:
+        llm = FakeLLM(
+            latency_ms=args.llm_latency_ms,
+            jitter_ms=args.jitter_ms,
+            seed=args.seed,
+            slow_rate=args.slow_rate,
+            slow_ms=args.slow_ms,
+        )
+        report["agents"][agent_name] = await bench_agent(agent_name, cases, llm, measure_alloc=not args.no_alloc)
+
+    print_report(report)
+
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+    if args.update_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nBaseline written to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to create one.")
+        return 0
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    regressions = compare(report, baseline, args.tolerance)
+    if regressions:
+        print("\n" + "!" * 72)
+        print(f"PERFORMANCE REGRESSION (tolerance {args.tolerance:.0%}):")
+        for line in regressions:
+            print(f"  {line}")
+        print("!" * 72)
+        return 1
+    print(f"\nNo regressions against {args.baseline} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark agent framework overhead with a fake LLM.")
+    parser.add_argument("--agent", choices=["intent", "auto", "both"], default="both")
+    parser.add_argument("--test-file", default=TEST_FILE)
+    parser.add_argument("--limit", type=int, default=None, help="Only replay the first N conversations")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated latency per LLM call")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Uniform +/- jitter on the simulated latency")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="Fraction of LLM calls that straggle")
+    parser.add_argument("--slow-ms", type=float, default=0.0, help="Extra latency of a straggling call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-alloc", action="store_true", help="Skip tracemalloc (it slows every turn down)")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown before failing")
+    parser.add_argument("--output", default=None, help="Also write the full report as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
@@ -0,0 +1,166 @@
+"""
+Recall vs. memory vs. latency of the dense vector storage modes (see retriever/storage.py).
+
+Copies the float32 vectors of each live collection into scratch collections,
+one per storage spec, and replays the labelled queries of retriever.tune_fusion
+against them. Recall@k is measured against exact float32 search over the same
+vectors. Memory is the estimated size of the dense field plus its index on the
+query node.
+
+    python -m bench.storage
+    python -m bench.storage --specs float32:flat float32:hnsw float16:hnsw float32@512:hnsw binary:flat --k 10
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+from llama_index.vector_stores.milvus.base import MILVUS_ID_FIELD
+
+from config.env import EMBED_DIM, MILVUS_URL
+from retriever.connections import milvus_pool
+from retriever.embedding import embedding_model
+from retriever.milvus import CustomMilvusVector
+from retriever.storage import StorageConfig
+from retriever.tune_fusion import PROFILES, load_labels
+from retriever.vector_store import vector_store_for
+
+DEFAULT_SPECS = ["float32:flat", "float32:hnsw", "float16:hnsw", "bfloat16:hnsw", "float32@512:hnsw", "float32:ivf_sq8", "binary:flat"]
+
+
+def load_rows(collection: str) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+    """All rows of a float32 collection, with their vectors as one matrix."""
+    source = vector_store_for(collection)
+    if not isinstance(source, CustomMilvusVector):
+        raise ValueError("The storage benchmark runs against Milvus (VECTOR_BACKEND=milvus)")
+    if source.storage.vector_type != "float32" or source.storage.dim:
+        raise ValueError(f"'{collection}' is stored as {source.storage.spec}; the benchmark needs full float32 vectors")
+
+    fields = [MILVUS_ID_FIELD, source.embedding_field, source.text_field, source.doc_id_field]
+    iterator = source.client.query_iterator(collection, batch_size=1000, filter=f'{MILVUS_ID_FIELD} != ""', output_fields=fields)
+    rows = []
+    while True:
+        batch = iterator.next()
+        if not batch:
+            break
+        rows.extend(batch)
+    iterator.close()
+    vectors = np.asarray([row[source.embedding_field] for row in rows], dtype=np.float32)
+    return rows, vectors
+
+
+def exact_top_k(vectors: np.ndarray, ids: List[str], queries: np.ndarray, k: int) -> List[List[str]]:
+    scores = queries @ vectors.T
+    order = np.argsort(-scores, axis=1)[:, :k]
+    return [[ids[i] for i in row] for row in order]
+
+
+def build_scratch(collection: str, spec: str, rows: List[Dict[str, Any]], vectors: np.ndarray) -> CustomMilvusVector:
+    name = f"{collection}_bench_{spec.replace('@', '_').replace(':', '_')}"
+    milvus_pool().sync.drop_collection(name)
+    store = CustomMilvusVector(uri=MILVUS_URL, collection_name=name, dim=EMBED_DIM, storage=StorageConfig.parse(spec))
+    entries = [
+        {
+            MILVUS_ID_FIELD: row[MILVUS_ID_FIELD],
+            store.doc_id_field: row.get(store.doc_id_field) or "",
+            store.embedding_field: store.storage.encode(vector),
+            store.text_field: row[store.text_field],
+        }
+        for row, vector in zip(rows, vectors)
+    ]
+    for start in range(0, len(entries), store.batch_size):
+        store.client.insert(name, entries[start:start + store.batch_size])
+    store.client.flush(name)
+    return store
+
+
+def bench_spec(
+    store: CustomMilvusVector,
+    queries: List[Dict[str, Any]],
+    embeddings: List[List[float]],
+    truth: List[List[str]],
+    count: int,
+    k: int,
+) -> Dict[str, Any]:
+    store.dense_search_many(embeddings[:1], k)  # warm up
+    recalls, dense_ms, hybrid_ms = [], [], []
+    for q, embedding, expected in zip(queries, embeddings, truth):
+        started = time.perf_counter()
+        hits = store.dense_search_many([embedding], k)[0]
+        dense_ms.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(set(expected).intersection(hit_id for hit_id, _ in hits)) / len(expected))
+
+        started = time.perf_counter()
+        store.hybrid_search_many([q["query"]], [embedding], k)
+        hybrid_ms.append((time.perf_counter() - started) * 1000)
+
+    return {
+        "spec": store.storage.spec,
+        f"recall@{k}": round(statistics.mean(recalls), 4),
+        "memory_mib": round(store.storage.estimated_memory(count, EMBED_DIM) / 2**20, 3),
+        "dense_p50_ms": round(float(np.percentile(dense_ms, 50)), 3),
+        "dense_p95_ms": round(float(np.percentile(dense_ms, 95)), 3),
+        "hybrid_p50_ms": round(float(np.percentile(hybrid_ms, 50)), 3),
+    }
+
+
+def print_rows(rows: List[Dict[str, Any]], k: int) -> None:
+    print(f"{'spec':<20} {f'recall@{k}':>10} {'memory':>10} {'dense p50':>10} {'dense p95':>10} {'hybrid p50':>11}")
+    for row in rows:
+        print(
+            f"{row['spec']:<20} {row[f'recall@{k}']:>10.3f} {row['memory_mib']:>7.2f}MiB "
+            f"{row['dense_p50_ms']:>8.2f}ms {row['dense_p95_ms']:>8.2f}ms {row['hybrid_p50_ms']:>9.2f}ms"
+        )
+
+
+def main(args: argparse.Namespace) -> int:
+    logging.disable(logging.WARNING)
+    labels = load_labels()
+    report: Dict[str, List[Dict[str, Any]]] = {}
+
+    for name, (collection, _) in PROFILES.items():
+        if args.profile and name not in args.profile:
+            continue
+        queries = labels.get(name, {}).get("queries", [])[: args.limit]
+        if not queries:
+            print(f"No labelled queries for '{name}', skipping.")
+            continue
+
+        rows, vectors = load_rows(collection)
+        embeddings = embedding_model.get_text_embedding_batch([q["query"] for q in queries])
+        truth = exact_top_k(vectors, [row[MILVUS_ID_FIELD] for row in rows], np.asarray(embeddings, dtype=np.float32), args.k)
+        print(f"\n=== {name} ({collection}, {len(rows)} vectors, {len(queries)} queries) ===")
+
+        report[name] = []
+        for spec in args.specs:
+            store = build_scratch(collection, spec, rows, vectors)
+            try:
+                report[name].append(bench_spec(store, queries, embeddings, truth, len(rows), args.k))
+            finally:
+                if not args.keep:
+                    store.client.drop_collection(store.collection_name)
+        print_rows(report[name], args.k)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark dense vector storage modes against the live collections.")
+    parser.add_argument("--specs", nargs="+", default=DEFAULT_SPECS, help="Storage specs, e.g. float16:hnsw binary:flat")
+    parser.add_argument("--profile", nargs="*", choices=list(PROFILES), help="Only these retrieval profiles")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--limit", type=int, default=None, help="Only the first N labelled queries per profile")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch collections")
+    parser.add_argument("--output", default=None, help="Also write the report as JSON")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -4,10 +4,49 @@ from dotenv import load_dotenv
 load_dotenv()
 
 MILVUS_URL=os.getenv("MILVUS_URL")
+VECTOR_BACKEND=os.getenv("VECTOR_BACKEND", "milvus")
+LOCAL_VECTOR_DIR=os.getenv("LOCAL_VECTOR_DIR", "output/vector_store")
+VECTOR_STORAGE=os.getenv("VECTOR_STORAGE", "float32:flat")
+VECTOR_RESCORE_FACTOR=int(os.getenv("VECTOR_RESCORE_FACTOR", "4"))
+MILVUS_CONSISTENCY_LEVEL=os.getenv("MILVUS_CONSISTENCY_LEVEL", "Session")
+MILVUS_POOL_SIZE=int(os.getenv("MILVUS_POOL_SIZE", "2"))
+MILVUS_HEALTH_INTERVAL_S=float(os.getenv("MILVUS_HEALTH_INTERVAL_S", "30"))
+MILVUS_RECONNECT_ATTEMPTS=int(os.getenv("MILVUS_RECONNECT_ATTEMPTS", "3"))
+MILVUS_RECONNECT_BACKOFF_S=float(os.getenv("MILVUS_RECONNECT_BACKOFF_S", "0.5"))
+KB_FLUSH_INTERVAL_S=float(os.getenv("KB_FLUSH_INTERVAL_S", "2.0"))
+KB_FLUSH_MAX_DOCS=int(os.getenv("KB_FLUSH_MAX_DOCS", "100"))
+FUSION_PROFILES_PATH=os.getenv("FUSION_PROFILES_PATH", "output/fusion_profiles.json")
+PRODUCT_RESULT_LIMIT=int(os.getenv("PRODUCT_RESULT_LIMIT", "5"))
+RERANKER=os.getenv("RERANKER", "none")
+RERANK_MODEL=os.getenv("RERANK_MODEL", "BAAI/bge-reranker-base")
+RERANK_CANDIDATES=int(os.getenv("RERANK_CANDIDATES", "20"))
+RERANK_TOP_N=int(os.getenv("RERANK_TOP_N", "3"))
+RERANK_CACHE_SIZE=int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+CHUNK_TOKENS=int(os.getenv("CHUNK_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS=int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+EMBEDDING_STORE_PATH=os.getenv("EMBEDDING_STORE_PATH", "output/embeddings.sqlite")
+EMBED_CONCURRENCY=int(os.getenv("EMBED_CONCURRENCY", "4"))
+RETRIEVAL_TIMEOUT_S=float(os.getenv("RETRIEVAL_TIMEOUT_S", "3.0"))
+LLM_TIMEOUT_S=float(os.getenv("LLM_TIMEOUT_S", "20.0"))
+BREAKER_FAILURE_THRESHOLD=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+BREAKER_RESET_S=float(os.getenv("BREAKER_RESET_S", "30"))
+TURN_BUDGET_S=float(os.getenv("TURN_BUDGET_S", "15"))
+HEDGE_PERCENTILE=float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_SAMPLES=int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW=int(os.getenv("HEDGE_WINDOW", "200"))
 EMBED_DIM=int(os.getenv("EMBED_DIM"))
 OPENAI_API_KEY=os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL=os.getenv("OPENAI_MODEL")
 OPENAI_MODEL_SMALL=os.getenv("OPENAI_MODEL_SMALL")
 OPENAI_EMBEDDING_MODEL=os.getenv("OPENAI_EMBEDDING_MODEL")
 COLLECTION_NAME=os.getenv("COLLECTION_NAME")
-PRODUCT_COLLECTION_NAME=os.getenv("PRODUCT_COLLECTION_NAME")
\ No newline at end of file
+PRODUCT_COLLECTION_NAME=os.getenv("PRODUCT_COLLECTION_NAME")
+SESSION_BACKEND=os.getenv("SESSION_BACKEND", "sqlite")
+SESSION_PATH=os.getenv("SESSION_PATH", "output/sessions.sqlite")
+SESSION_IDLE_TTL_S=float(os.getenv("SESSION_IDLE_TTL_S", "86400"))
+SESSION_MAX_ACTIVE=int(os.getenv("SESSION_MAX_ACTIVE", "10000"))
+LLM_CACHE_MODE=os.getenv("LLM_CACHE_MODE", "auto")
+LLM_CASSETTE_DIR=os.getenv("LLM_CASSETTE_DIR", "output/cassettes")
+
+TRACE_SINK=os.getenv("TRACE_SINK", "jsonl")
+TRACE_PATH=os.getenv("TRACE_PATH", "output/traces/spans.jsonl")
@@ -0,0 +1,178 @@
+"""
+Splits knowledge-base articles into token-bounded chunks for indexing.
+
+Sentences end at Chinese (。！？；) terminators, at Western (. ! ? ;) ones
+followed by whitespace, and at line breaks. Whole sentences are packed into chunks of at most `max_tokens`.
+Each chunk repeats the trailing sentences of the previous one, up to
+`overlap_tokens` of them. Every chunk node carries its parent `doc_id`,
+its `chunk_index`, and the number of leading characters it shares with the
+previous chunk (`overlap`). `collapse_chunks` uses these to stitch retrieved
+chunks back into one article.
+"""
+import re
+import uuid
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from llama_index.core.schema import NodeWithScore, TextNode
+from llama_index.core.utils import get_tokenizer
+
+from config.env import CHUNK_TOKENS, CHUNK_OVERLAP_TOKENS
+
+# Western terminators only end a sentence before whitespace, so "v1.2", "a.com/?id=1" and "a;b" stay whole
+_SENTENCE_END = re.compile(r"(?<=[。！？；])|(?<=[.!?;])\s+|\n+")
+_CJK = re.compile(r"[\u3000-\u9fff\uff00-\uffef]")
+# Metadata that only serves chunk bookkeeping; kept out of embeddings and prompts
+CHUNK_KEYS = ["chunk_index", "chunk_count", "overlap"]
+
+
+def count_tokens(text: str) -> int:
+    return len(get_tokenizer()(text))
+
+
+def split_sentences(text: str) -> List[str]:
+    return [s.strip() for s in _SENTENCE_END.split(text or "") if s and s.strip()]
+
+
+def _hard_split(sentence: str, max_tokens: int, tokens: Callable[[str], int]) -> List[str]:
+    """Cuts a sentence longer than max_tokens into roughly equal character slices."""
+    pieces = -(-tokens(sentence) // max_tokens)
+    size = -(-len(sentence) // pieces)
+    return [sentence[i:i + size] for i in range(0, len(sentence), size)]
+
+
+def _is_cjk(char: str) -> bool:
+    return bool(_CJK.match(char))
+
+
+def join_sentences(parts: List[str]) -> str:
+    """Concatenates sentences; a space only between two non-CJK ends."""
+    text = ""
+    for part in parts:
+        if text and part and not (_is_cjk(text[-1]) or _is_cjk(part[0])):
+            text += " "
+        text += part
+    return text
+
+
+def chunk_text(
+    text: str,
+    max_tokens: int = CHUNK_TOKENS,
+    overlap_tokens: int = CHUNK_OVERLAP_TOKENS,
+) -> List[Tuple[str, int]]:
+    """(chunk, overlap_chars) pairs; overlap_chars is how much of the chunk's head repeats the previous chunk."""
+    sentences: List[str] = []
+    for sentence in split_sentences(text):
+        sentences.extend(_hard_split(sentence, max_tokens, count_tokens) if count_tokens(sentence) > max_tokens else [sentence])
+
+    chunks: List[Tuple[str, int]] = []
+    current: List[str] = []
+    carried = 0  # sentences at the head of `current` repeated from the previous chunk
+    used = 0
+
+    def emit() -> None:
+        full = join_sentences(current)
+        chunks.append((full, len(full) - len(join_sentences(current[carried:]))))
+
+    for sentence in sentences:
+        cost = count_tokens(sentence)
+        if current and used + cost > max_tokens and len(current) > carried:
+            emit()
+            tail: List[str] = []
+            tail_tokens = 0
+            for previous in reversed(current):
+                previous_tokens = count_tokens(previous)
+                if tail_tokens + previous_tokens > overlap_tokens or tail_tokens + previous_tokens + cost > max_tokens:
+                    break
+                tail.insert(0, previous)
+                tail_tokens += previous_tokens
+            current, carried, used = tail, len(tail), tail_tokens
+        current.append(sentence)
+        used += cost
+    if len(current) > carried:
+        emit()
+    return chunks
+
+
+def knowledge_nodes(row: Dict[str, Any]) -> List[TextNode]:
+    """Chunk nodes for one knowledge_base.csv row. The node text is the title line followed by the chunk."""
+    doc_id = str(row["id"])
+    title = str(row["title"])
+    # An empty body still gets a title-only node so the article stays indexed (an upsert must not become a delete)
+    chunks = chunk_text(str(row["content"])) or [("", 0)]
+    nodes = []
+    for index, (chunk, overlap) in enumerate(chunks):
+        node = TextNode(
+            id_=str(uuid.uuid5(uuid.NAMESPACE_URL, f"kb:{doc_id}#{index}")),
+            text=f"{title}\n{chunk}" if chunk else title,
+            metadata={
+                "doc_id": doc_id,
+                "title": title,
+                "url": row.get("urls/0/href"),
+                "image": row.get("images/0"),
+                "tag": [t for t in (row.get("tags/0"), row.get("tags/1"), row.get("tags/2")) if isinstance(t, str) and t],
+                "chunk_index": index,
+                "chunk_count": len(chunks),
+                "overlap": overlap,
+            },
+            excluded_embed_metadata_keys=list(CHUNK_KEYS),
+            excluded_llm_metadata_keys=list(CHUNK_KEYS),
+        )
+        nodes.append(node)
+    return nodes
+
+
+def chunk_body(node: Any) -> str:
+    """The article text of a chunk node, without the title line."""
+    text = node.get_content()
+    title = (node.metadata or {}).get("title")
+    if title and text.startswith(f"{title}\n"):
+        return text[len(title) + 1:]
+    return text
+
+
+def collapse_chunks(results: List[NodeWithScore], limit: Optional[int] = None) -> List[NodeWithScore]:
+    """
+    One result per doc_id: the doc's retrieved chunks in reading order (overlaps
+    removed) under its best chunk score. Results without a doc_id pass through.
+    """
+    groups: Dict[str, List[NodeWithScore]] = defaultdict(list)
+    order: List[Any] = []
+    for result in results:
+        doc_id = result.node.metadata.get("doc_id")
+        if doc_id is None or "chunk_index" not in result.node.metadata:
+            order.append(result)
+            continue
+        if doc_id not in groups:
+            order.append(doc_id)
+        groups[doc_id].append(result)
+
+    collapsed = []
+    for item in order:
+        if isinstance(item, NodeWithScore):
+            collapsed.append(item)
+            continue
+        chunks = sorted(groups[item], key=lambda r: r.node.metadata["chunk_index"])
+        if len(chunks) == 1:
+            collapsed.append(chunks[0])
+            continue
+        parts, previous = [], None
+        for chunk in chunks:
+            body = chunk_body(chunk.node)
+            index = chunk.node.metadata["chunk_index"]
+            if previous is not None:
+                body = body[chunk.node.metadata.get("overlap", 0):] if index == previous + 1 else f"… {body}"
+            parts.append(body)
+            previous = index
+        first = chunks[0].node
+        node = TextNode(
+            id_=first.node_id,
+            text=f"{first.metadata.get('title')}\n{join_sentences(parts)}",
+            metadata=dict(first.metadata),
+            excluded_embed_metadata_keys=list(first.excluded_embed_metadata_keys),
+            excluded_llm_metadata_keys=list(first.excluded_llm_metadata_keys),
+        )
+        collapsed.append(NodeWithScore(node=node, score=max(c.score or 0.0 for c in chunks)))
+
+    collapsed.sort(key=lambda r: r.score or 0.0, reverse=True)
+    return collapsed[:limit] if limit else collapsed
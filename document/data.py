@@ -1,4 +1,6 @@
 import json
+from typing import Optional, Tuple
+
 import pandas as pd
 from pandas.core.frame import DataFrame
 
@@ -7,6 +9,27 @@ def get_order_db() -> dict:
         orders_db = json.load(f)["orders_db"]
     return orders_db
 
+def parse_range(value) -> Tuple[Optional[float], Optional[float]]:
+    """Parses catalog ranges such as "2-9" or "10-85" into (min, max); a single number is both."""
+    text = str(value or "").strip()
+    if not text or text.lower() == "nan":
+        return None, None
+    try:
+        low, _, high = text.partition("-")
+        return float(low), float(high or low)
+    except ValueError:
+        return None, None
+
+def parse_range_column(series: pd.Series) -> Tuple[pd.Series, pd.Series]:
+    """Vectorized `parse_range` over a whole column; unparseable cells become NaN."""
+    parts = series.astype(str).str.extract(r"^\s*(\d+(?:\.\d+)?)\s*(?:-\s*(\d+(?:\.\d+)?))?\s*$")
+    low = pd.to_numeric(parts[0], errors="coerce")
+    high = pd.to_numeric(parts[1], errors="coerce").fillna(low)
+    return low, high
+
+def parse_vesa(row) -> list:
+    return [v for v in (row.get('specs/vesa/0'), row.get('specs/vesa/1')) if isinstance(v, str) and v]
+
 def get_product_df() -> DataFrame:
     products_df = pd.read_csv("document/product.csv")
     try:
@@ -17,7 +40,34 @@ def get_product_df() -> DataFrame:
         products_df['weight_min_kg'] = 0.0
         products_df['weight_max_kg'] = 99.0
 
+    desk_ranges = products_df['specs/desk_thickness_mm'].map(parse_range)
+    products_df['desk_min_mm'] = desk_ranges.map(lambda r: r[0])
+    products_df['desk_max_mm'] = desk_ranges.map(lambda r: r[1])
+    products_df['vesa_patterns'] = products_df.apply(parse_vesa, axis=1)
+
     return products_df
 
+def product_record(row) -> dict:
+    """One catalog row in the shape stored as product node metadata (and filtered on)."""
+    weight_min, weight_max = parse_range(row.get('specs/weight_per_arm_kg'))
+    desk_min, desk_max = parse_range(row.get('specs/desk_thickness_mm'))
+    size = pd.to_numeric(row.get('specs/size_max_inch'), errors='coerce')
+    record = {
+        "sku": row.get('sku', ''),
+        "name": row.get('name', ''),
+        "url": row.get('url', ''),
+        "image": row.get('images/0', ''),
+        "arm_type": row.get('specs/arm_type', ''),
+        "size_max_inch": None if pd.isna(size) else int(size),
+        "weight_min_kg": weight_min,
+        "weight_max_kg": weight_max,
+        "desk_min_mm": desk_min,
+        "desk_max_mm": desk_max,
+        "vesa_patterns": parse_vesa(row),
+        "compatibility_notes": row.get('compatibility_notes', ''),
+    }
+    return {k: (None if isinstance(v, float) and pd.isna(v) else v) for k, v in record.items()}
+
 order_db = get_order_db()
-product_df = get_product_df()
\ No newline at end of file
+product_df = get_product_df()
+product_catalog = [product_record(row) for row in product_df.to_dict("records")]
@@ -1,22 +1,34 @@
+import asyncio
 import pandas as pd
-from openai import OpenAI
+from openai import AsyncOpenAI
 from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
-from config.env import OPENAI_API_KEY
-from tqdm import tqdm
+from typing import Any, Dict, List, Literal, Optional
+from config.env import OPENAI_API_KEY, LLM_CACHE_MODE, LLM_CASSETTE_DIR
+from llm.cache import LLMCache
+from evaluation.grader import Grader, progress_path_for, write_batch_file, submit_batch, download_batch_results, read_batch_results
 
 INPUT_CSV_PATH = 'output/merged_responses.csv'  # Your merged file
 OUTPUT_CSV_PATH = 'output/evaluation_results_agent_both.csv'
 EVALUATOR_MODEL = "gpt-4.1"  # Use gpt-4o or gpt-4-turbo
+CASSETTE_PATH = f"{LLM_CASSETTE_DIR}/ai_evaluation.jsonl.gz"
+
+GRADING_MODE = "online"  # "online" | "batch_write" | "batch_ingest" (see realibility_eval.py)
+CONCURRENCY = 8
+PROGRESS_PATH = progress_path_for("ai_evaluation", INPUT_CSV_PATH)  # per input file; rows are re-graded when their request changes
+BATCH_REQUESTS_PATH = 'output/batch/ai_evaluation_requests.jsonl'
+BATCH_RESULTS_PATH = 'output/batch/ai_evaluation_results.jsonl'
+BATCH_ID = None
 # ---------------------
 
 # Load the API key from environment variables
 try:
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 except KeyError:
     print("Error: OPENAI_API_KEY environment variable not set.")
     exit()
 
+judge_cache = LLMCache(CASSETTE_PATH)
+
 # 1. Define the Structured Output using Pydantic
 # (REPLACE your models with these new ones)
 
@@ -96,10 +108,10 @@ These rules are not "failures" but should be used to give the 0-5 score.
 6.  Respond *only* with the requested structured output.
 """
 
-# 3. The Evaluator Function
-def get_evaluation(history: str, question: str, resp1: str, resp2: str) -> Optional[EvaluationResult]:
+# 3. The Evaluator Request
+def build_evaluation_request(history: str, question: str, resp1: str, resp2: str) -> Dict[str, Any]:
     """
-    Calls the OpenAI API to evaluate the two responses.
+    Builds the chat-completions body that compares the two responses.
     """
     user_prompt = f"""
     #  Inputs for Evaluation
@@ -125,19 +137,25 @@ def get_evaluation(history: str, question: str, resp1: str, resp2: str) -> Optio
     ```
     """
 
+    return {
+        "model": EVALUATOR_MODEL,
+        "messages": [
+            {"role": "system", "content": EVALUATOR_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        "response_format": {
+            "type": "json_schema",
+            "json_schema": {"name": "EvaluationResult", "schema": EvaluationResult.model_json_schema()},
+        },
+    }
+
+def parse_evaluation_result(content: Optional[str]) -> Optional[EvaluationResult]:
+    if content is None:
+        return None
     try:
-        response = client.responses.parse(
-            model=EVALUATOR_MODEL,
-            input=[
-                {"role": "system", "content": EVALUATOR_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            text_format=EvaluationResult,
-        )
-        return response.output_parsed
-    
+        return EvaluationResult.model_validate_json(content)
     except Exception as e:
-        print(f"  Error during API call: {e}")
+        print(f"  Error during JSON parsing: {e}")
         return None
 
 # 4. Main Script Execution
@@ -157,25 +175,39 @@ def main():
         return
 
     print(f"Found {len(df)} rows to evaluate.")
-    
-    evaluation_results = []
 
-    for index, row in tqdm(df.iterrows(), desc="AI Evaluation"):
-        print(f"--- Evaluating row {index + 1}/{len(df)} ---")
-        
-        # Handle potential 'NaN' or 'None' values from CSV
-        history = str(row.get('input_history', ''))
-        question = str(row.get('input_question', ''))
-        resp1 = str(row.get('agent_response_1', ''))
-        resp2 = str(row.get('agent_response_2', ''))
-
-        result = get_evaluation(history, question, resp1, resp2)
-        
+    # Handle potential 'NaN' or 'None' values from CSV
+    requests = {
+        f"row-{index}": build_evaluation_request(
+            history=str(row.get('input_history', '')),
+            question=str(row.get('input_question', '')),
+            resp1=str(row.get('agent_response_1', '')),
+            resp2=str(row.get('agent_response_2', '')),
+        )
+        for index, row in zip(df.index, df.to_dict('records'))
+    }
+
+    if GRADING_MODE == "batch_write":
+        count = write_batch_file(requests, BATCH_REQUESTS_PATH)
+        batch_id = asyncio.run(submit_batch(client, BATCH_REQUESTS_PATH))
+        print(f"Submitted {count} requests as batch {batch_id}. Set BATCH_ID and re-run with GRADING_MODE = 'batch_ingest'.")
+        return
+
+    if GRADING_MODE == "batch_ingest":
+        if BATCH_ID and not asyncio.run(download_batch_results(client, BATCH_ID, BATCH_RESULTS_PATH)):
+            return
+        contents = read_batch_results(BATCH_RESULTS_PATH, requests=requests, cache=judge_cache)
+    else:
+        grader = Grader(client, concurrency=CONCURRENCY, cache=judge_cache, cache_mode=LLM_CACHE_MODE)
+        contents = asyncio.run(grader.grade(requests, progress_path=PROGRESS_PATH, desc="AI Evaluation"))
+
+    evaluation_results = []
+    for custom_id in requests:
+        result = parse_evaluation_result(contents.get(custom_id))
         if result:
-            print(f"  Verdict: {result.best_response}")
             evaluation_results.append(result.model_dump())
         else:
-            print("  Evaluation failed for this row.")
+            print(f"  Evaluation failed for {custom_id}.")
             # Append empty data to keep row count consistent
             evaluation_results.append({
                 "best_response": "ERROR",
@@ -199,4 +231,4 @@ def main():
     print(f"\nSuccessfully saved evaluation results to: {OUTPUT_CSV_PATH}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
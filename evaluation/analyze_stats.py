@@ -1,4 +1,4 @@
-import pandas as pd
+from evaluation.results_store import load_results
 
 # --- Configuration ---
 FILE_PATH = 'output/evaluation_results_agent_both.csv'  # <--- !! IMPORTANT: Change this to your CSV file's path
@@ -10,13 +10,12 @@ def analyze_best_response(file_path, column_name):
     Calculates the total counts and percentages for the 'best_response' column.
     """
     try:
-        # Read the CSV file into a DataFrame
-        df = pd.read_csv(file_path)
+        # Read only the column we count (CSV or Parquet)
+        df = load_results(file_path, columns=[column_name])
 
         # Check if the required column exists
         if column_name not in df.columns:
             print(f"Error: Column '{column_name}' not found in the CSV.")
-            print(f"Available columns are: {list(df.columns)}")
             return
 
         # 1. Calculate the total counts for each unique value
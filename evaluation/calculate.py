@@ -1,4 +1,4 @@
-import pandas as pd
+from evaluation.results_store import load_results
 
 def analyze_csv_column(file_path, column_name):
     """
@@ -10,13 +10,12 @@ def analyze_csv_column(file_path, column_name):
         column_name (str): The name of the column to analyze.
     """
     try:
-        # Read the CSV file into a DataFrame
-        df = pd.read_csv(file_path)
+        # Read only the column we count (CSV or Parquet)
+        df = load_results(file_path, columns=[column_name])
 
         # Check if the specified column exists
         if column_name not in df.columns:
             print(f"Error: Column '{column_name}' not found in the file.")
-            print(f"Available columns are: {list(df.columns)}")
             return
 
         # Get the value counts for the specified column
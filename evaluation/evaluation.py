@@ -1,6 +1,6 @@
 import asyncio
 import json
-import pandas as pd
+import time
 from uuid import uuid4
 from tqdm.asyncio import tqdm 
 from typing import List, Dict, Any
@@ -11,7 +11,10 @@ from llama_index.core.llms import ChatMessage, MessageRole
 
 from agent.agent import CRMAgent
 from agent.const import JTCG_SYSTEM_PROMPT
-from config.env import OPENAI_MODEL
+from config.env import OPENAI_MODEL, LLM_CACHE_MODE, LLM_CASSETTE_DIR
+from llm.cache import LLMCache, RecordReplayLLM
+from evaluation.results_store import flatten_history, write_results
+from session.history import HistoryLog
 
 async def _prepare_context(
     agent,
@@ -50,17 +53,22 @@ async def _prepare_context(
                 ChatMessage(role=MessageRole.ASSISTANT, content=content)
             )
             
-    await context.store.set("history", history_chat_messages)
+    await context.store.set("history", HistoryLog(messages=history_chat_messages))
     return context
 
 # --- The Main Evaluation Function ---
 
-async def run_evaluation(test_file_path: str, results_file_path: str):
+async def run_evaluation(test_file_path: str, results_file_path: str, cassette_path: str):
     
     print("Setting up agent and loading data...")
-    llm = OpenAI(model=OPENAI_MODEL)
+    llm = RecordReplayLLM(
+        OpenAI(model=OPENAI_MODEL),
+        cache=LLMCache(cassette_path),
+        mode=LLM_CACHE_MODE
+    )
     
-    agent = CRMAgent(llm=llm)
+    # No turn budget: grade what the agent answers, not its deadline fallbacks
+    agent = CRMAgent(llm=llm, turn_budget_s=0)
 
     print(f"Loading test cases from {test_file_path}...")
     with open(test_file_path, 'r', encoding='utf-8') as f:
@@ -90,6 +98,8 @@ async def run_evaluation(test_file_path: str, results_file_path: str):
         
         # 4. Run the workflow
         final_result = None
+        trace = None
+        started = time.perf_counter()
         try:
             final_result = await agent.run(input=input_question, ctx=conversation_context)
             
@@ -99,43 +109,48 @@ async def run_evaluation(test_file_path: str, results_file_path: str):
             if isinstance(final_result, dict):
                 response_message = final_result.get("message")
                 detected_intent = final_result.get("intent")
-                tools_called = str(final_result.get("tools", [])) # Convert list to string for CSV
+                tools_called = [getattr(tool, "value", tool) for tool in final_result.get("tools", [])]
+                trace = final_result.get("trace")
             else:
                 response_message = str(final_result)
                 detected_intent = "N/A (String Output)"
-                tools_called = "N/A (String Output)"
+                tools_called = None
 
         except Exception as e:
             print(f"  ERROR on case: {input_question[:30]}... -> {e}")
             response_message = f"WORKFLOW_ERROR: {e}"
             detected_intent = "ERROR"
-            tools_called = "ERROR"
+            tools_called = None
 
         results_log.append({
-            "input_history": json.dumps(history_messages, ensure_ascii=False),
+            "input_history": flatten_history(history_messages),
             "input_question": input_question,
             "agent_response": response_message,
-            "detected_intent": detected_intent,
+            "detected_intent": getattr(detected_intent, "value", detected_intent),
             "tools_called": tools_called,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "prompt_tokens": trace["prompt_tokens"] if trace else None,
+            "completion_tokens": trace["completion_tokens"] if trace else None,
+            "degraded": trace["degraded"] if trace else None,
         })
 
-    print("\nBatch test complete. Saving to CSV...")
-    results_df = pd.DataFrame(results_log)
-    
-    results_df["is_correct"] = "" 
-    
-    results_df.to_csv(results_file_path, index=False, encoding='utf-8-sig')
+    llm.cache.save()
+
+    print("\nBatch test complete. Saving to Parquet...")
+    write_results(results_log, results_file_path, model=OPENAI_MODEL, agent="intent")
     print(f"Evaluation complete. Results saved to {results_file_path}")
 
 if __name__ == "__main__":
     
     TEST_FILE = "document/evaluation.json" 
-    RESULTS_FILE = "output/evaluation_results_final_nano.csv"
+    RESULTS_FILE = "output/evaluation_results_final_nano.parquet"
+    CASSETTE_FILE = f"{LLM_CASSETTE_DIR}/evaluation_intent.jsonl.gz"
     
     try:
         asyncio.run(run_evaluation(
             test_file_path=TEST_FILE, 
-            results_file_path=RESULTS_FILE
+            results_file_path=RESULTS_FILE,
+            cassette_path=CASSETTE_FILE
         ))
             
     except FileNotFoundError:
@@ -1,6 +1,6 @@
 import asyncio
 import json
-import pandas as pd
+import time
 from uuid import uuid4
 from tqdm.asyncio import tqdm
 from typing import List, Dict, Any
@@ -12,7 +12,9 @@ from llama_index.core.memory import ChatMemoryBuffer
 
 # Import your new agent
 from agent.agent_auto import CRMAutoAgent 
-from config.env import OPENAI_MODEL
+from config.env import OPENAI_MODEL, LLM_CACHE_MODE, LLM_CASSETTE_DIR
+from llm.cache import LLMCache, RecordReplayLLM
+from evaluation.results_store import flatten_history, write_results
 
 async def _prepare_context(
     agent,
@@ -48,10 +50,14 @@ async def _prepare_context(
     return context
 
 
-async def run_evaluation(test_file_path: str, results_file_path: str):
+async def run_evaluation(test_file_path: str, results_file_path: str, cassette_path: str):
     
     print("Setting up LLM and loading data...")
-    llm = OpenAI(model=OPENAI_MODEL)
+    llm = RecordReplayLLM(
+        OpenAI(model=OPENAI_MODEL),
+        cache=LLMCache(cassette_path),
+        mode=LLM_CACHE_MODE
+    )
     
 
     print(f"Loading test cases from {test_file_path}...")
@@ -87,6 +93,9 @@ async def run_evaluation(test_file_path: str, results_file_path: str):
         
         # 4. Run the workflow
         final_result = None
+        trace = None
+        tools_called = None
+        started = time.perf_counter()
         try:
             final_result = await agent.run(
                 input=input_question, 
@@ -98,6 +107,8 @@ async def run_evaluation(test_file_path: str, results_file_path: str):
 
             if isinstance(final_result, dict):
                 response_message = final_result.get("response")
+                tools_called = [source.tool_name for source in final_result.get("sources", [])]
+                trace = final_result.get("trace")
             else:
                 response_message = str(final_result)
 
@@ -106,29 +117,33 @@ async def run_evaluation(test_file_path: str, results_file_path: str):
             response_message = f"WORKFLOW_ERROR: {e}"
 
         results_log.append({
-            "input_history": json.dumps(history_messages, ensure_ascii=False),
+            "input_history": flatten_history(history_messages),
             "input_question": input_question,
             "agent_response": response_message,
-            "is_correct": ""
+            "tools_called": tools_called,
+            "latency_ms": (time.perf_counter() - started) * 1000,
+            "prompt_tokens": trace["prompt_tokens"] if trace else None,
+            "completion_tokens": trace["completion_tokens"] if trace else None,
+            "degraded": trace["degraded"] if trace else None,
         })
 
-    print("\nBatch test complete. Saving to CSV...")
-    results_df = pd.DataFrame(results_log)
-    
-    results_df["is_correct"] = "" 
-    
-    results_df.to_csv(results_file_path, index=False, encoding='utf-8-sig')
+    llm.cache.save()
+
+    print("\nBatch test complete. Saving to Parquet...")
+    write_results(results_log, results_file_path, model=OPENAI_MODEL, agent="auto")
     print(f"Evaluation complete. Results saved to {results_file_path}")
 
 if __name__ == "__main__":
     
     TEST_FILE = "document/evaluation.json" 
-    RESULTS_FILE = "output/evaluation_results_final_autoagen_nano.csv" # Changed output file
+    RESULTS_FILE = "output/evaluation_results_final_autoagen_nano.parquet" # Changed output file
+    CASSETTE_FILE = f"{LLM_CASSETTE_DIR}/evaluation_auto.jsonl.gz"
     
     try:
         asyncio.run(run_evaluation(
             test_file_path=TEST_FILE, 
-            results_file_path=RESULTS_FILE
+            results_file_path=RESULTS_FILE,
+            cassette_path=CASSETTE_FILE
         ))
             
     except FileNotFoundError:
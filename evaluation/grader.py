@@ -0,0 +1,254 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import time
+from typing import Any, Dict, Optional
+
+import openai
+from openai import AsyncOpenAI
+from tqdm.asyncio import tqdm
+
+from llm.cache import CacheMode, LLMCache
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+)
+
+
+class AdaptiveLimiter:
+    """
+    Bounded concurrency with AIMD back-off.
+
+    A 429 halves the number of requests allowed in flight and pauses every
+    worker until the server's `retry-after` (or an exponential delay) has
+    passed; each success lets one more request in, up to `max_concurrency`.
+    """
+
+    def __init__(self, max_concurrency: int) -> None:
+        self.max_concurrency = max_concurrency
+        self.limit = max_concurrency
+        self.in_flight = 0
+        self._resume_at = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self, throttled_for: Optional[float] = None) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            if throttled_for is not None:
+                self.limit = max(1, self.limit // 2)
+                self._resume_at = max(self._resume_at, time.monotonic() + throttled_for)
+            elif self.limit < self.max_concurrency:
+                self.limit += 1
+            self._cond.notify_all()
+
+
+def _retry_after(error: Exception, attempt: int, base_delay: float) -> float:
+    response = getattr(error, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        if header is not None:
+            return float(header)
+    except ValueError:
+        pass
+    return min(60.0, base_delay * 2 ** attempt) * (0.5 + random.random())
+
+
+class Grader:
+    """
+    Async LLM-as-judge runner for chat-completions requests.
+
+    `requests` maps a stable custom_id (e.g. "row-12") to a chat-completions
+    body. Completed rows are appended to `progress_path` as they finish, so an
+    interrupted run picks up where it stopped; a row is only reused if its
+    request body is unchanged (by hash), so edited answers are re-graded.
+    Responses also go through the shared `LLMCache`.
+    """
+
+    def __init__(
+        self,
+        client: AsyncOpenAI,
+        concurrency: int = 8,
+        max_retries: int = 6,
+        base_delay: float = 1.0,
+        cache: Optional[LLMCache] = None,
+        cache_mode: CacheMode = CacheMode.AUTO,
+    ) -> None:
+        self.client = client
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.cache = cache
+        self.cache_mode = CacheMode(cache_mode)
+
+    async def _complete(self, body: Dict[str, Any], limiter: AdaptiveLimiter) -> str:
+        for attempt in range(self.max_retries + 1):
+            await limiter.acquire()
+            try:
+                response = await self.client.chat.completions.create(**body)
+            except RETRYABLE_ERRORS as e:
+                delay = _retry_after(e, attempt, self.base_delay)
+                await limiter.release(throttled_for=delay)
+                if attempt == self.max_retries:
+                    raise
+                # the limiter holds every worker back until the delay has passed
+                logger.warning(f"Retrying after {type(e).__name__} in {delay:.1f}s (attempt {attempt + 1})")
+                continue
+            except Exception:
+                await limiter.release()
+                raise
+            await limiter.release()
+            return response.choices[0].message.content
+
+    async def _grade_one(self, body: Dict[str, Any], limiter: AdaptiveLimiter) -> str:
+        if self.cache is None:
+            return await self._complete(body, limiter)
+        key = LLMCache.make_key(**body)
+        return await self.cache.aget_or_call(key, lambda: self._complete(body, limiter), self.cache_mode)
+
+    async def grade(
+        self,
+        requests: Dict[str, Dict[str, Any]],
+        progress_path: Optional[str] = None,
+        desc: str = "Grading",
+    ) -> Dict[str, Optional[str]]:
+        hashes = {cid: LLMCache.make_key(**body) for cid, body in requests.items()}
+        progress = load_progress(progress_path) if progress_path else {}
+        done = {
+            cid: record["content"]
+            for cid, record in progress.items()
+            if cid in hashes and record.get("hash") == hashes[cid]
+        }
+        pending = {cid: body for cid, body in requests.items() if cid not in done}
+        stale = sum(1 for cid in pending if cid in progress)
+        logger.info(f"{len(done)} rows already graded, {len(pending)} to go ({stale} changed since their last grade).")
+
+        limiter = AdaptiveLimiter(self.concurrency)
+        results: Dict[str, Optional[str]] = dict(done)
+        progress_file = None
+        if progress_path:
+            os.makedirs(os.path.dirname(progress_path) or ".", exist_ok=True)
+            progress_file = open(progress_path, "a", encoding="utf-8")
+
+        async def _run(cid: str, body: Dict[str, Any]) -> None:
+            try:
+                content = await self._grade_one(body, limiter)
+            except Exception as e:
+                print(f"  Grading failed for {cid}: {e}")
+                results[cid] = None
+                return
+            results[cid] = content
+            if progress_file:
+                record = {"custom_id": cid, "hash": hashes[cid], "content": content}
+                progress_file.write(json.dumps(record, ensure_ascii=False) + "\n")
+                progress_file.flush()
+
+        try:
+            await tqdm.gather(*(_run(cid, body) for cid, body in pending.items()), desc=desc)
+        finally:
+            if progress_file:
+                progress_file.close()
+            if self.cache is not None:
+                self.cache.save()
+
+        return {cid: results.get(cid) for cid in requests}
+
+
+def progress_path_for(name: str, input_path: str, directory: str = "output/progress") -> str:
+    """One progress file per grading script and input file, so runs over different inputs never share grades."""
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    return os.path.join(directory, f"{name}-{stem}.jsonl")
+
+
+def load_progress(path: str) -> Dict[str, Dict[str, Any]]:
+    """{custom_id: {"hash", "content"}}; the last record of a row wins. Records without a hash are never reused."""
+    if not os.path.exists(path):
+        return {}
+    done = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                done[record["custom_id"]] = record
+    return done
+
+
+# --- Offline batch mode (OpenAI Batch API) ---
+
+def write_batch_file(requests: Dict[str, Dict[str, Any]], path: str) -> int:
+    """Writes the requests as an OpenAI Batch API JSONL file. Returns the number of lines."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for cid, body in requests.items():
+            line = {"custom_id": cid, "method": "POST", "url": "/v1/chat/completions", "body": body}
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    return len(requests)
+
+
+async def submit_batch(client: AsyncOpenAI, path: str) -> str:
+    """Uploads a batch file and starts the job. Returns the batch id."""
+    with open(path, "rb") as f:
+        batch_file = await client.files.create(file=f, purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    return batch.id
+
+
+async def download_batch_results(client: AsyncOpenAI, batch_id: str, path: str) -> bool:
+    """Downloads the output of a finished batch to `path`. Returns False while it is still running."""
+    batch = await client.batches.retrieve(batch_id)
+    if batch.status != "completed" or not batch.output_file_id:
+        print(f"Batch {batch_id} is '{batch.status}'.")
+        return False
+    content = await client.files.content(batch.output_file_id)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content.read())
+    return True
+
+
+def read_batch_results(
+    path: str,
+    requests: Optional[Dict[str, Dict[str, Any]]] = None,
+    cache: Optional[LLMCache] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Parses a Batch API output file into {custom_id: message content}.
+    If the original `requests` and a `cache` are given, the results are also
+    stored in the cache so later online runs hit it.
+    """
+    results: Dict[str, Optional[str]] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                results[record["custom_id"]] = None
+                continue
+            results[record["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+
+    if requests and cache is not None:
+        for cid, content in results.items():
+            if content is not None and cid in requests:
+                cache.put(LLMCache.make_key(**requests[cid]), content)
+        cache.save()
+    return results
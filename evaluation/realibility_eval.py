@@ -1,34 +1,50 @@
+import asyncio
 import pandas as pd
+import pyarrow.parquet as pq
 import json
-from openai import OpenAI
+from openai import AsyncOpenAI
 from pydantic import BaseModel, Field
-from typing import List, Literal, Optional
-from config.env import OPENAI_API_KEY
-from tqdm import tqdm
-import time
+from typing import Any, Dict, List, Literal, Optional
+from config.env import OPENAI_API_KEY, LLM_CACHE_MODE, LLM_CASSETTE_DIR
+from llm.cache import LLMCache
+from evaluation.grader import Grader, progress_path_for, write_batch_file, submit_batch, download_batch_results, read_batch_results
+from evaluation.results_store import load_results, with_grades
 
 # --- Configuration ---
 # ⚠️ RUN THIS SCRIPT TWICE ⚠️
 #
 # Run 1:
-INPUT_CSV_PATH = 'output/evaluation_results_final_nano.csv'  # 👈 Your ORIGINAL Agent 1 CSV
-OUTPUT_CSV_PATH = 'output/reliability_results_agent_intent_nano_1.csv'
+INPUT_PATH = 'output/evaluation_results_final_nano.parquet'  # 👈 Your ORIGINAL Agent 1 results (.parquet or legacy .csv)
+OUTPUT_PATH = 'output/reliability_results_agent_intent_nano.parquet'
 #
 # Run 2:
-# INPUT_CSV_PATH = 'file2.csv' # 👈 Your ORIGINAL Agent 2 CSV
-# OUTPUT_CSV_PATH = 'output/reliability_results_agent2.csv'
+# INPUT_PATH = 'output/evaluation_results_final_autoagen_nano.parquet' # 👈 Your ORIGINAL Agent 2 results
+# OUTPUT_PATH = 'output/reliability_results_agent_intent_auto_nano.parquet'
 # ---------------------
 
 EVALUATOR_MODEL = "gpt-4.1"  # "gpt-4.1" isn't a valid model, using "gpt-4o"
 AGENT_RESPONSE_COLUMN = 'agent_response' # 👈 Make sure this matches your CSV
+CASSETTE_PATH = f"{LLM_CASSETTE_DIR}/reliability_eval.jsonl.gz"
+
+# "online": grade now with bounded concurrency (resumable via PROGRESS_PATH)
+# "batch_write": write + submit an OpenAI Batch job, then re-run with "batch_ingest"
+# "batch_ingest": download (if BATCH_ID is set) and read the batch results
+GRADING_MODE = "online"
+CONCURRENCY = 8
+PROGRESS_PATH = progress_path_for("reliability_eval", INPUT_PATH)  # per input file; rows are re-graded when their request changes
+BATCH_REQUESTS_PATH = 'output/batch/reliability_eval_requests.jsonl'
+BATCH_RESULTS_PATH = 'output/batch/reliability_eval_results.jsonl'
+BATCH_ID = None  # 👈 printed by the "batch_write" run
 
 # Load the API key from environment variables
 try:
-    client = OpenAI(api_key=OPENAI_API_KEY)
+    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 except KeyError:
     print("Error: OPENAI_API_KEY environment variable not set.")
     exit()
 
+judge_cache = LLMCache(CASSETTE_PATH)
+
 # 1. Define the NEW, simple Pydantic model
 class ReliabilityResult(BaseModel):
     is_correct: bool = Field(
@@ -68,10 +84,10 @@ A response is **Incorrect** (is_correct: False) if it violates *any* of these.
     {"is_correct": bool, "violations": ["R-1", ...]}
 """
 
-# 3. The Evaluator Function (Using standard OpenAI JSON mode)
-def get_reliability_evaluation(history: str, question: str, response: str, intention: str) -> Optional[ReliabilityResult]:
+# 3. The Evaluator Request (Using standard OpenAI JSON mode)
+def build_reliability_request(history: str, question: str, response: str, intention: str) -> Dict[str, Any]:
     """
-    Calls the OpenAI API to evaluate a single response.
+    Builds the chat-completions body that evaluates a single response.
     """
     user_prompt = f"""
     #  Inputs for Evaluation
@@ -97,82 +113,108 @@ def get_reliability_evaluation(history: str, question: str, response: str, inten
     ```
     """
 
+    return {
+        "model": EVALUATOR_MODEL,
+        "messages": [
+            {"role": "system", "content": EVALUATOR_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ],
+        "response_format": {"type": "json_object"},
+        "temperature": 0.0,
+    }
+
+def parse_reliability_result(content: Optional[str]) -> Optional[ReliabilityResult]:
+    if content is None:
+        return None
     try:
-        # Using standard OpenAI client with JSON mode
-        response = client.chat.completions.create(
-            model=EVALUATOR_MODEL,
-            messages=[
-                {"role": "system", "content": EVALUATOR_SYSTEM_PROMPT},
-                {"role": "user", "content": user_prompt}
-            ],
-            response_format={"type": "json_object"},
-            temperature=0.0
-        )
-        
-        # Parse the JSON string from the response
-        result_json = json.loads(response.choices[0].message.content)
-        
-        # Validate with Pydantic
-        return ReliabilityResult(**result_json)
-    
+        # Parse the JSON string from the response and validate with Pydantic
+        return ReliabilityResult(**json.loads(content))
     except Exception as e:
-        print(f"  Error during API call or JSON parsing: {e}")
+        print(f"  Error during JSON parsing: {e}")
         return None
 
+def _history_to_json(history) -> str:
+    # Legacy CSVs store the history as a JSON string, Parquet as a list of {role, content}
+    if isinstance(history, str):
+        return history
+    return json.dumps([dict(m) for m in history] if history is not None else [], ensure_ascii=False)
+
 # 4. Main Script Execution
 def main():
-    print(f"Loading input CSV: {INPUT_CSV_PATH}...")
+    print(f"Loading input results: {INPUT_PATH}...")
     try:
-        df = pd.read_csv(INPUT_CSV_PATH)
+        df = load_results(INPUT_PATH)
     except FileNotFoundError:
-        print(f"Error: File not found at {INPUT_CSV_PATH}")
+        print(f"Error: File not found at {INPUT_PATH}")
         return
 
     # Ensure required columns exist
     required_cols = ['input_history', 'input_question', AGENT_RESPONSE_COLUMN]
     if not all(col in df.columns for col in required_cols):
-        print(f"Error: Input CSV must contain all of the following columns: {required_cols}")
+        print(f"Error: Input results must contain all of the following columns: {required_cols}")
         print(f"Please check the '{AGENT_RESPONSE_COLUMN}' variable in the script.")
         return
 
     print(f"Found {len(df)} rows to evaluate.")
-    
-    evaluation_results = []
 
-    # Use tqdm for a progress bar
-    for index, row in tqdm(df.iterrows(), total=df.shape[0], desc="Reliability Evaluation"):
-        
-        # Handle potential 'NaN' or 'None' values from CSV
-        history = str(row.get('input_history', ''))
-        question = str(row.get('input_question', ''))
-        intention = str(row.get('detected_intent'))
-        resp = str(row.get(AGENT_RESPONSE_COLUMN, ''))
+    # Handle potential 'NaN' or 'None' values from CSV
+    requests = {
+        f"row-{index}": build_reliability_request(
+            history=_history_to_json(row.get('input_history')),
+            question=str(row.get('input_question', '')),
+            response=str(row.get(AGENT_RESPONSE_COLUMN, '')),
+            intention=str(row.get('detected_intent')),
+        )
+        for index, row in zip(df.index, df.to_dict('records'))
+    }
 
-        result = get_reliability_evaluation(history, question, resp,intention)
-        
+    if GRADING_MODE == "batch_write":
+        count = write_batch_file(requests, BATCH_REQUESTS_PATH)
+        batch_id = asyncio.run(submit_batch(client, BATCH_REQUESTS_PATH))
+        print(f"Submitted {count} requests as batch {batch_id}. Set BATCH_ID and re-run with GRADING_MODE = 'batch_ingest'.")
+        return
+
+    if GRADING_MODE == "batch_ingest":
+        if BATCH_ID and not asyncio.run(download_batch_results(client, BATCH_ID, BATCH_RESULTS_PATH)):
+            return
+        contents = read_batch_results(BATCH_RESULTS_PATH, requests=requests, cache=judge_cache)
+    else:
+        grader = Grader(client, concurrency=CONCURRENCY, cache=judge_cache, cache_mode=LLM_CACHE_MODE)
+        contents = asyncio.run(grader.grade(requests, progress_path=PROGRESS_PATH, desc="Reliability Evaluation"))
+
+    evaluation_results = []
+    for custom_id in requests:
+        result = parse_reliability_result(contents.get(custom_id))
         if result:
             evaluation_results.append(result.model_dump())
         else:
-            print(f"  Evaluation failed for row {index + 1}.")
+            print(f"  Evaluation failed for {custom_id}.")
             evaluation_results.append({
                 "is_correct": "ERROR",
                 "violations": ["API_CALL_FAILED"]
             })
 
-        time.sleep(1)
-
     print("--- Evaluation complete. ---")
 
-    # Convert the list of Pydantic models (as dicts) into a DataFrame
-    results_df = pd.json_normalize(evaluation_results)
+    if OUTPUT_PATH.endswith(".parquet") and INPUT_PATH.endswith(".parquet"):
+        # Typed columns: is_correct is a nullable bool (ERROR -> null), violations a list of codes
+        table = with_grades(
+            pq.read_table(INPUT_PATH),
+            is_correct=[r["is_correct"] if isinstance(r["is_correct"], bool) else None for r in evaluation_results],
+            violations=[r["violations"] for r in evaluation_results],
+        )
+        pq.write_table(table, OUTPUT_PATH, compression="zstd")
+    else:
+        # Convert the list of Pydantic models (as dicts) into a DataFrame
+        results_df = pd.json_normalize(evaluation_results)
 
-    # Combine the original data with the new evaluation data
-    final_df = pd.concat([df, results_df], axis=1)
-    
-    # Save the final, comprehensive report
-    final_df.to_csv(OUTPUT_CSV_PATH, index=False, encoding='utf-8-sig')
+        # Combine the original data with the new evaluation data
+        final_df = pd.concat([df, results_df], axis=1)
+        
+        # Save the final, comprehensive report
+        final_df.to_csv(OUTPUT_PATH, index=False, encoding='utf-8-sig')
     
-    print(f"\nSuccessfully saved reliability results to: {OUTPUT_CSV_PATH}")
+    print(f"\nSuccessfully saved reliability results to: {OUTPUT_PATH}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,94 @@
+import os
+from typing import List
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from evaluation.results_store import legacy_csv_to_table, read_runs
+
+OUTPUT_DIR = "output"
+
+
+def _graded(table: pa.Table) -> pa.Table:
+    table = table.filter(pc.is_valid(table["is_correct"]))
+    if "detected_intent" in table.column_names:
+        idx = table.column_names.index("detected_intent")
+        table = table.set_column(idx, "detected_intent", table["detected_intent"].cast(pa.string()))
+    return table.append_column("correct", pc.cast(table["is_correct"], pa.int64()))
+
+
+def accuracy_by(table: pa.Table, keys: List[str]) -> pd.DataFrame:
+    """Accuracy (mean of is_correct over graded rows) grouped by `keys`."""
+    graded = _graded(table)
+    grouped = graded.group_by(keys).aggregate([("correct", "sum"), ("correct", "count")])
+    df = grouped.to_pandas().rename(columns={"correct_sum": "correct", "correct_count": "graded"})
+    df["accuracy"] = df["correct"] / df["graded"]
+    return df.sort_values(keys).reset_index(drop=True)
+
+
+def violation_counts(table: pa.Table, keys: List[str]) -> pd.DataFrame:
+    """Number of rows that violated each rubric code, grouped by `keys`."""
+    violations = table["violations"].combine_chunks()
+    parents = pc.list_parent_indices(violations)
+    exploded = pa.table(
+        {key: pc.take(table[key], parents) for key in keys}
+        | {"violation": pc.list_flatten(violations)}
+    )
+    grouped = exploded.group_by(keys + ["violation"]).aggregate([("violation", "count")])
+    df = grouped.to_pandas().rename(columns={"violation_count": "count"})
+    return df.sort_values(keys + ["count"], ascending=[True] * len(keys) + [False]).reset_index(drop=True)
+
+
+def infer_run_metadata(csv_path: str) -> dict:
+    """
+    Labels for a legacy CSV, which does not record them. Only the file itself
+    is used: the agent is read from its name and the model is "unknown"; it is
+    never guessed or borrowed from another run.
+    """
+    name = os.path.basename(csv_path).lower()
+    return {"model": "unknown", "agent": "auto" if "auto" in name else "intent"}
+
+
+def convert_legacy_outputs(directory: str = OUTPUT_DIR) -> List[str]:
+    """Writes a .legacy.parquet next to every graded legacy CSV that has no Parquet run yet."""
+    written = []
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith("reliability_results_") or not name.endswith(".csv"):
+            continue
+        if os.path.exists(os.path.join(directory, name[:-4] + ".parquet")):
+            continue  # already reported from its own Parquet run
+        parquet_path = os.path.join(directory, name[:-4] + ".legacy.parquet")
+        if os.path.exists(parquet_path):
+            continue
+        csv_path = os.path.join(directory, name)
+        table = legacy_csv_to_table(csv_path, **infer_run_metadata(csv_path))
+        pq.write_table(table, parquet_path, compression="zstd")
+        written.append(parquet_path)
+    return written
+
+
+def main():
+    converted = convert_legacy_outputs(OUTPUT_DIR)
+    if converted:
+        print(f"Converted {len(converted)} legacy CSVs to Parquet.")
+
+    table = read_runs(OUTPUT_DIR, columns=["run_id", "model", "agent", "detected_intent", "is_correct", "violations"])
+    if table.num_rows == 0:
+        print(f"No Parquet runs found in '{OUTPUT_DIR}'.")
+        return
+
+    pd.set_option("display.width", 200)
+    print("--- Accuracy per run ---")
+    print(accuracy_by(table, ["run_id", "model", "agent"]).to_string(index=False))
+    print("\n--- Accuracy per model / agent ---")
+    print(accuracy_by(table, ["model", "agent"]).to_string(index=False))
+    print("\n--- Accuracy per intent ---")
+    print(accuracy_by(table, ["agent", "detected_intent"]).to_string(index=False))
+    print("\n--- Violations per model / agent ---")
+    print(violation_counts(table, ["model", "agent"]).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
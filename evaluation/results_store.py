@@ -0,0 +1,161 @@
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+MESSAGE_TYPE = pa.struct([("role", pa.string()), ("content", pa.string())])
+
+# One row per graded conversation turn. Every run in output/ shares this schema,
+# so many runs can be scanned as one dataset with column projection.
+EVAL_SCHEMA = pa.schema([
+    ("run_id", pa.string()),
+    ("model", pa.string()),
+    ("agent", pa.string()),
+    ("row", pa.int32()),
+    ("input_history", pa.list_(MESSAGE_TYPE)),
+    ("input_question", pa.string()),
+    ("agent_response", pa.string()),
+    ("detected_intent", pa.dictionary(pa.int32(), pa.string())),
+    ("tools_called", pa.list_(pa.string())),
+    ("latency_ms", pa.float64()),
+    ("prompt_tokens", pa.int64()),
+    ("completion_tokens", pa.int64()),
+    ("degraded", pa.bool_()),  # a fallback answered part of the turn; null for older runs
+    ("is_correct", pa.bool_()),
+    ("violations", pa.list_(pa.string())),
+])
+
+_QUOTED_RE = re.compile(r"'([^']*)'")
+
+
+def flatten_history(history: List[Dict[str, Any]]) -> List[Dict[str, str]]:
+    """Converts evaluation.json messages ({"role", "content": [{"text"}]}) to {"role", "content"}."""
+    flat = []
+    for message in history:
+        try:
+            content = message.get("content", [{}])[0].get("text", "")
+        except Exception:
+            content = ""
+        flat.append({"role": message.get("role"), "content": content})
+    return flat
+
+
+def run_id_from_path(path: str) -> str:
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def to_table(records: List[Dict[str, Any]], run_id: str, model: Optional[str] = None, agent: Optional[str] = None) -> pa.Table:
+    rows = []
+    for i, record in enumerate(records):
+        row = {"run_id": run_id, "model": model, "agent": agent, "row": i}
+        row.update(record)
+        rows.append(row)
+    return pa.Table.from_pylist(rows, schema=EVAL_SCHEMA)
+
+
+def write_results(
+    records: List[Dict[str, Any]],
+    path: str,
+    model: Optional[str] = None,
+    agent: Optional[str] = None,
+    run_id: Optional[str] = None,
+) -> pa.Table:
+    run_id = run_id or run_id_from_path(path)
+    table = to_table(records, run_id=run_id, model=model, agent=agent)
+    # Also recorded once per file, so tools can label a run without scanning its rows
+    labels = {"run_id": run_id, "model": model, "agent": agent}
+    table = table.replace_schema_metadata({key: value for key, value in labels.items() if value})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    pq.write_table(table, path, compression="zstd")
+    return table
+
+
+def run_metadata(path: str) -> Dict[str, str]:
+    """The run_id/model/agent labels `write_results` stored in a Parquet file ({} if there are none)."""
+    try:
+        metadata = pq.read_schema(path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return {}
+    return {key: metadata[key.encode()].decode() for key in ("run_id", "model", "agent") if key.encode() in metadata}
+
+
+def _parse_list(value: Any) -> Optional[List[str]]:
+    """Parses legacy list reprs such as "['R-4']" or "[<ToolName.X: 'x'>]"."""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    if str(value) in ("ERROR", "N/A (String Output)"):
+        return None
+    return _QUOTED_RE.findall(str(value))
+
+
+def _parse_bool(value: Any) -> Optional[bool]:
+    text = str(value).strip().lower()
+    if text == "true":
+        return True
+    if text == "false":
+        return False
+    return None
+
+
+def legacy_csv_to_table(csv_path: str, model: Optional[str] = None, agent: Optional[str] = None) -> pa.Table:
+    """Reads one of the old CSV outputs (JSON-in-a-cell history, repr'd lists) into EVAL_SCHEMA."""
+    df = pd.read_csv(csv_path)
+    records = []
+    for row in df.to_dict("records"):
+        try:
+            history = flatten_history(json.loads(row.get("input_history") or "[]"))
+        except (TypeError, ValueError):
+            history = None
+        intent = row.get("detected_intent")
+        records.append({
+            "input_history": history,
+            "input_question": row.get("input_question"),
+            "agent_response": row.get("agent_response"),
+            "detected_intent": None if pd.isna(intent) else str(intent),
+            "tools_called": _parse_list(row.get("tools_called")),
+            "is_correct": _parse_bool(row.get("is_correct")),
+            "violations": _parse_list(row.get("violations")),
+        })
+    return to_table(records, run_id=run_id_from_path(csv_path), model=model, agent=agent)
+
+
+def with_grades(table: pa.Table, is_correct: List[Optional[bool]], violations: List[Optional[List[str]]]) -> pa.Table:
+    """Returns `table` with the judge's is_correct/violations columns filled in."""
+    for name, values in (("is_correct", is_correct), ("violations", violations)):
+        idx = table.column_names.index(name)
+        table = table.set_column(idx, EVAL_SCHEMA.field(name), pa.array(values, type=EVAL_SCHEMA.field(name).type))
+    return table
+
+
+def load_results(path: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Loads a results file as a DataFrame, reading only `columns` where the format allows it."""
+    if path.endswith(".parquet"):
+        return pd.read_parquet(path, columns=columns)
+    if columns:
+        available = pd.read_csv(path, nrows=0).columns
+        return pd.read_csv(path, usecols=[c for c in columns if c in available])
+    return pd.read_csv(path)
+
+
+def read_runs(directory: str = "output", columns: Optional[List[str]] = None) -> pa.Table:
+    """
+    Scans every *.parquet run in `directory` as a single Arrow table. A
+    converted *.legacy.parquet is skipped when the run also has its own
+    Parquet file, so it is not counted twice.
+    """
+    names = set(os.listdir(directory))
+    paths = sorted(
+        os.path.join(directory, name)
+        for name in names
+        if name.endswith(".parquet")
+        and not (name.endswith(".legacy.parquet") and name[: -len(".legacy.parquet")] + ".parquet" in names)
+    )
+    if not paths:
+        return EVAL_SCHEMA.empty_table()
+    dataset = ds.dataset(paths, format="parquet", schema=EVAL_SCHEMA)
+    return dataset.to_table(columns=columns)
@@ -0,0 +1,292 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+from enum import Enum
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, List, Optional, Sequence, Type
+
+from pydantic import BaseModel
+from llama_index.core.llms import ChatMessage, ChatResponse, MessageRole
+from llama_index.core.tools import ToolSelection
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMode(str, Enum):
+    AUTO = "auto"        # replay hits, record misses
+    RECORD = "record"    # always call the live LLM and overwrite
+    REPLAY = "replay"    # never call the live LLM, a miss is an error
+
+
+class CassetteMissError(KeyError):
+    """Raised in replay mode when a request was never recorded."""
+
+
+def _jsonable(value: Any) -> Any:
+    def _default(obj: Any) -> Any:
+        if hasattr(obj, "model_dump"):
+            return obj.model_dump(mode="json")
+        return str(obj)
+    return json.loads(json.dumps(value, default=_default, ensure_ascii=False))
+
+
+def dump_message(message: ChatMessage) -> Dict[str, Any]:
+    role = message.role.value if isinstance(message.role, MessageRole) else str(message.role)
+    return {
+        "role": role,
+        "content": message.content,
+        "additional_kwargs": _jsonable(message.additional_kwargs or {}),
+    }
+
+
+def load_message(data: Dict[str, Any]) -> ChatMessage:
+    return ChatMessage(
+        role=MessageRole(data["role"]),
+        content=data.get("content"),
+        additional_kwargs=data.get("additional_kwargs") or {},
+    )
+
+
+class LLMCache:
+    """
+    Content-addressed store of LLM responses.
+
+    Entries are keyed by the sha256 of the canonical request (model, messages,
+    tools, params) and persisted as a gzipped JSONL "cassette". New entries are
+    appended as extra gzip members on `save()`, so re-recording never rewrites
+    the whole file; the last entry for a key wins on load.
+    """
+
+    def __init__(self, path: Optional[str] = None) -> None:
+        self.path = path
+        self._entries: Dict[str, Any] = {}
+        self._pending: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    @staticmethod
+    def make_key(**payload: Any) -> str:
+        blob = json.dumps(_jsonable(payload), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _load(self) -> None:
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                self._entries[record["k"]] = record["v"]
+        logger.info(f"Loaded {len(self._entries)} cached LLM responses from {self.path}")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Optional[Any]:
+        return self._entries.get(key)
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._pending[key] = value
+
+    def save(self) -> None:
+        if not self.path or not self._pending:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            for key, value in pending.items():
+                f.write(json.dumps({"k": key, "v": value}, ensure_ascii=False, separators=(",", ":")) + "\n")
+        logger.info(f"Saved {len(pending)} new LLM responses to {self.path}")
+
+    def get_or_call(self, key: str, call: Callable[[], Any], mode: CacheMode = CacheMode.AUTO) -> Any:
+        if mode != CacheMode.RECORD:
+            hit = self.get(key)
+            if hit is not None:
+                return hit
+            if mode == CacheMode.REPLAY:
+                raise CassetteMissError(key)
+        value = call()
+        self.put(key, value)
+        return value
+
+    async def aget_or_call(self, key: str, call: Callable[[], Awaitable[Any]], mode: CacheMode = CacheMode.AUTO) -> Any:
+        if mode != CacheMode.RECORD:
+            hit = self.get(key)
+            if hit is not None:
+                return hit
+            if mode == CacheMode.REPLAY:
+                raise CassetteMissError(key)
+        value = await call()
+        self.put(key, value)
+        return value
+
+
+class RecordReplayLLM:
+    """
+    Wraps a llama_index LLM and serves `chat`/`achat`, `astream_chat_with_tools`
+    and structured calls from an `LLMCache`.
+
+    Responses are normalized in every mode (tool calls become plain
+    OpenAI-style dicts), so the messages fed back into the history - and thus
+    the cache keys of later calls - are identical whether a turn was recorded
+    or replayed. Everything else is delegated to the wrapped LLM.
+    """
+
+    def __init__(self, llm: Any, cache: LLMCache, mode: CacheMode = CacheMode.AUTO) -> None:
+        self.llm = llm
+        self.cache = cache
+        self.mode = CacheMode(mode)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.llm, "model", None) or self.llm.metadata.model_name
+
+    def _key(self, kind: str, messages: Sequence[ChatMessage], tools: Optional[List[Any]] = None, **params: Any) -> str:
+        return LLMCache.make_key(
+            kind=kind,
+            model=self.model_name,
+            temperature=getattr(self.llm, "temperature", None),
+            messages=[dump_message(m) for m in messages],
+            tools=[tool.metadata.to_openai_tool() for tool in tools or []],
+            params=params,
+        )
+
+    def _normalize(self, response: ChatResponse, with_tools: bool = False) -> Dict[str, Any]:
+        message = {"role": MessageRole.ASSISTANT.value, "content": response.message.content, "additional_kwargs": {}}
+        if with_tools:
+            selections = self.llm.get_tool_calls_from_response(response, error_on_no_tool_call=False)
+            if selections:
+                message["additional_kwargs"]["tool_calls"] = [
+                    {
+                        "id": s.tool_id,
+                        "type": "function",
+                        "function": {"name": s.tool_name, "arguments": json.dumps(s.tool_kwargs, ensure_ascii=False)},
+                    }
+                    for s in selections
+                ]
+        usage = {k: v for k, v in (response.additional_kwargs or {}).items() if k.endswith("_tokens")}
+        return {"message": message, "usage": usage}
+
+    @staticmethod
+    def _to_response(value: Dict[str, Any]) -> ChatResponse:
+        message = load_message(value["message"])
+        return ChatResponse(message=message, delta=message.content or "", additional_kwargs=value.get("usage") or {})
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        key = self._key("chat", messages, **kwargs)
+        value = self.cache.get_or_call(
+            key, lambda: self._normalize(self.llm.chat(messages, **kwargs)), self.mode
+        )
+        return self._to_response(value)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        key = self._key("chat", messages, **kwargs)
+
+        async def _call() -> Dict[str, Any]:
+            return self._normalize(await self.llm.achat(messages, **kwargs))
+
+        value = await self.cache.aget_or_call(key, _call, self.mode)
+        return self._to_response(value)
+
+    async def astream_chat_with_tools(
+        self,
+        tools: List[Any],
+        user_msg: Optional[Any] = None,
+        chat_history: Optional[List[ChatMessage]] = None,
+        **kwargs: Any,
+    ) -> AsyncGenerator[ChatResponse, None]:
+        messages = list(chat_history or [])
+        if user_msg is not None:
+            messages.append(user_msg if isinstance(user_msg, ChatMessage) else ChatMessage(role=MessageRole.USER, content=user_msg))
+        key = self._key("chat_with_tools", messages, tools=tools, **kwargs)
+
+        if self.mode != CacheMode.RECORD:
+            hit = self.cache.get(key)
+            if hit is not None:
+                return self._replay_stream(hit)
+            if self.mode == CacheMode.REPLAY:
+                raise CassetteMissError(key)
+
+        live_stream = await self.llm.astream_chat_with_tools(tools, chat_history=messages, **kwargs)
+        return self._record_stream(key, live_stream)
+
+    async def _replay_stream(self, value: Dict[str, Any]) -> AsyncGenerator[ChatResponse, None]:
+        yield self._to_response(value)
+
+    async def _record_stream(self, key: str, live_stream: AsyncGenerator[ChatResponse, None]) -> AsyncGenerator[ChatResponse, None]:
+        last = None
+        async for chunk in live_stream:
+            last = chunk
+            yield chunk
+        if last is None:
+            return
+        value = self._normalize(last, with_tools=True)
+        self.cache.put(key, value)
+        final = self._to_response(value)
+        final.delta = ""
+        yield final
+
+    def get_tool_calls_from_response(
+        self, response: ChatResponse, error_on_no_tool_call: bool = True, **kwargs: Any
+    ) -> List[ToolSelection]:
+        tool_calls = response.message.additional_kwargs.get("tool_calls") or []
+        if not tool_calls and error_on_no_tool_call:
+            raise ValueError(f"Expected at least one tool call, but got {len(tool_calls)} tool calls.")
+        return [
+            ToolSelection(
+                tool_id=call["id"],
+                tool_name=call["function"]["name"],
+                tool_kwargs=json.loads(call["function"]["arguments"] or "{}"),
+            )
+            for call in tool_calls
+        ]
+
+    def as_structured_llm(self, output_cls: Type[BaseModel], **kwargs: Any) -> "StructuredRecordReplayLLM":
+        return StructuredRecordReplayLLM(self, output_cls, **kwargs)
+
+
+class StructuredRecordReplayLLM:
+    """Cached counterpart of `llm.as_structured_llm(output_cls)`; `response.raw` is the parsed model."""
+
+    def __init__(self, parent: RecordReplayLLM, output_cls: Type[BaseModel], **kwargs: Any) -> None:
+        self.parent = parent
+        self.output_cls = output_cls
+        self.kwargs = kwargs
+
+    def _key(self, messages: Sequence[ChatMessage]) -> str:
+        return self.parent._key("structured", messages, output_schema=self.output_cls.model_json_schema())
+
+    def _to_response(self, value: Dict[str, Any]) -> ChatResponse:
+        output = value["output"]
+        return ChatResponse(
+            message=ChatMessage(role=MessageRole.ASSISTANT, content=json.dumps(output, ensure_ascii=False)),
+            raw=self.output_cls.model_validate(output),
+        )
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        def _call() -> Dict[str, Any]:
+            structured = self.parent.llm.as_structured_llm(self.output_cls, **self.kwargs)
+            return {"output": structured.chat(messages=messages, **kwargs).raw.model_dump(mode="json")}
+
+        value = self.parent.cache.get_or_call(self._key(messages), _call, self.parent.mode)
+        return self._to_response(value)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        async def _call() -> Dict[str, Any]:
+            structured = self.parent.llm.as_structured_llm(self.output_cls, **self.kwargs)
+            response = await structured.achat(messages=messages, **kwargs)
+            return {"output": response.raw.model_dump(mode="json")}
+
+        value = await self.parent.cache.aget_or_call(self._key(messages), _call, self.parent.mode)
+        return self._to_response(value)
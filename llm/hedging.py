@@ -0,0 +1,161 @@
+"""
+Hedged LLM calls with adaptive delays and per-step deadlines.
+
+Latencies of completed calls are kept in a rolling window per (model, step).
+Once a key has HEDGE_MIN_SAMPLES samples, a call still running after that
+key's HEDGE_PERCENTILE latency gets a hedge: an identical duplicate request.
+Whichever of the two finishes first wins, and the other is cancelled.
+Hedging at p95 duplicates about 5% of requests and cuts off the slow tail
+that drives p99.
+
+Each turn has a time budget of TURN_BUDGET_S (`begin_turn_budget`). Each
+step's deadline is its share of whatever budget remains (STEP_BUDGET_SHARE).
+A call that reaches its step deadline raises DeadlineExceeded, so the
+caller's fallback can still answer within the turn budget.
+
+    response = await hedged_call(lambda: llm.achat(messages=messages), model="gpt-4o", step="synthesize")
+"""
+import asyncio
+import contextvars
+import logging
+import threading
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Optional, Set, Tuple, TypeVar
+
+import numpy as np
+
+from config.env import HEDGE_MIN_SAMPLES, HEDGE_PERCENTILE, HEDGE_WINDOW, TURN_BUDGET_S
+from telemetry.tracing import span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Fraction of the remaining turn budget a step may use. Steps that produce the
+# final answer default to all of it; routing has to leave room for them.
+STEP_BUDGET_SHARE: Dict[str, float] = {
+    "get_intent": 0.4,
+}
+
+
+class DeadlineExceeded(asyncio.TimeoutError):
+    """The step ran out of its share of the turn budget."""
+
+
+class LatencyTracker:
+    """Rolling window of call latencies (seconds) per (model, step)."""
+
+    def __init__(self, window: int = HEDGE_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES) -> None:
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, step: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault((model, step), deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, model: str, step: str, p: float) -> Optional[float]:
+        """The p-th percentile latency, or None while there are too few samples to trust it."""
+        with self._lock:
+            samples = list(self._samples.get((model, step), ()))
+        if len(samples) < self.min_samples:
+            return None
+        return float(np.percentile(samples, p))
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            items = [(key, list(samples)) for key, samples in self._samples.items()]
+        return {
+            f"{model}/{step}": {
+                "n": len(samples),
+                "p50_ms": round(float(np.percentile(samples, 50)) * 1000, 1),
+                "p95_ms": round(float(np.percentile(samples, 95)) * 1000, 1),
+                "p99_ms": round(float(np.percentile(samples, 99)) * 1000, 1),
+            }
+            for (model, step), samples in items if samples
+        }
+
+
+latency_tracker = LatencyTracker()
+
+_turn_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("turn_deadline", default=None)
+
+
+def begin_turn_budget(budget_s: float = TURN_BUDGET_S) -> contextvars.Token:
+    """Starts the turn's clock; like Tracer.begin_turn, bind it before the workflow task is created."""
+    return _turn_deadline.set(time.monotonic() + budget_s if budget_s > 0 else None)
+
+
+def end_turn_budget(token: contextvars.Token) -> None:
+    _turn_deadline.reset(token)
+
+
+def step_deadline(step: str) -> Optional[float]:
+    """Monotonic deadline for a step starting now, or None outside a budgeted turn."""
+    turn_deadline = _turn_deadline.get()
+    if turn_deadline is None:
+        return None
+    now = time.monotonic()
+    return now + max(0.0, turn_deadline - now) * STEP_BUDGET_SHARE.get(step, 1.0)
+
+
+async def _hedge(factory: Callable[[], Awaitable[T]], model: str, step: str, delay: float) -> T:
+    with span("llm.hedge", kind="llm", model=model, step=step, delay_ms=round(delay * 1000, 1)):
+        return await factory()
+
+
+async def hedged_call(
+    factory: Callable[[], Awaitable[T]],
+    model: str,
+    step: str,
+    tracker: LatencyTracker = latency_tracker,
+) -> T:
+    """
+    Awaits `factory()`, firing one duplicate after the adaptive hedge delay and
+    giving up at the step deadline. `factory` must start a fresh request on
+    every call. A failure before the hedge fires is raised right away, since
+    retrying errors is the circuit breaker's job. Once both attempts are
+    running, the first success wins.
+    """
+    deadline = step_deadline(step)
+    delay = tracker.percentile(model, step, HEDGE_PERCENTILE) if HEDGE_PERCENTILE > 0 else None
+    started = time.monotonic()
+    attempts: Dict[asyncio.Future, float] = {asyncio.ensure_future(factory()): started}
+    pending: Set[asyncio.Future] = set(attempts)
+    hedged = False
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            now = time.monotonic()
+            waits = []
+            if deadline is not None:
+                waits.append(deadline - now)
+            if delay is not None and not hedged:
+                waits.append(started + delay - now)
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, min(waits)) if waits else None, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    tracker.record(model, step, time.monotonic() - attempts[task])
+                    return task.result()
+                error = task.exception()
+            if error is not None and not pending:
+                raise error
+            now = time.monotonic()
+            if deadline is not None and now >= deadline:
+                # Censored sample: the call took at least this long
+                tracker.record(model, step, now - started)
+                raise DeadlineExceeded(f"{step} exceeded its deadline after {now - started:.2f}s")
+            if delay is not None and not hedged and now - started >= delay:
+                hedged = True
+                logger.info(f"Hedging {model}/{step} after {now - started:.2f}s (p{HEDGE_PERCENTILE:g} {delay:.2f}s)")
+                hedge = asyncio.ensure_future(_hedge(factory, model, step, delay))
+                attempts[hedge] = now
+                pending.add(hedge)
+        raise error or RuntimeError("No attempt completed")
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,114 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncGenerator, Iterator, List, Optional, Sequence, Type
+
+from pydantic import BaseModel
+from llama_index.core.instrumentation import get_dispatcher
+from llama_index.core.instrumentation.event_handlers import BaseEventHandler
+from llama_index.core.instrumentation.events import BaseEvent
+from llama_index.core.instrumentation.events.llm import LLMChatEndEvent
+from llama_index.core.llms import ChatMessage, ChatResponse
+
+from telemetry.tracing import Span, record_usage, span
+
+# Span that the usage of LLM chat completions is added to (see capture_usage)
+_usage_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("usage_span", default=None)
+
+
+class UsageEventHandler(BaseEventHandler):
+    """Adds the token usage of each llama_index LLM chat completion to the span bound by `capture_usage`."""
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "UsageEventHandler"
+
+    def handle(self, event: BaseEvent, **kwargs: Any) -> None:
+        if isinstance(event, LLMChatEndEvent):
+            record_usage(_usage_span.get(), event.response)
+
+
+get_dispatcher().add_event_handler(UsageEventHandler())
+
+
+@contextmanager
+def capture_usage(current: Optional[Span]) -> Iterator[None]:
+    """
+    Records the usage of the completions made inside the block onto `current`.
+    For calls whose own response does not carry it, such as a structured LLM,
+    whose `response.raw` is the parsed model.
+    """
+    token = _usage_span.set(current)
+    try:
+        yield
+    finally:
+        _usage_span.reset(token)
+
+
+class TracedLLM:
+    """
+    Wraps an LLM (OpenAI or RecordReplayLLM) so every chat call becomes an
+    "llm" span carrying its latency and token counts. Everything else is
+    delegated to the wrapped LLM.
+    """
+
+    def __init__(self, llm: Any, name: Optional[str] = None) -> None:
+        self.llm = llm
+        self.name = name or getattr(llm, "model", None) or type(llm).__name__
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.llm, attr)
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        with span("llm.chat", "llm", model=self.name, messages=len(messages)) as current:
+            response = self.llm.chat(messages, **kwargs)
+            record_usage(current, response)
+            return response
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        with span("llm.achat", "llm", model=self.name, messages=len(messages)) as current:
+            response = await self.llm.achat(messages, **kwargs)
+            record_usage(current, response)
+            return response
+
+    async def astream_chat_with_tools(self, tools: List[Any], *args: Any, **kwargs: Any) -> AsyncGenerator[ChatResponse, None]:
+        stream = await self.llm.astream_chat_with_tools(tools, *args, **kwargs)
+        return self._traced_stream(stream, tools=len(tools))
+
+    async def _traced_stream(self, stream: AsyncGenerator[ChatResponse, None], tools: int) -> AsyncGenerator[ChatResponse, None]:
+        # the span covers the whole stream, so duration_ms is time-to-last-token
+        with span("llm.astream_chat_with_tools", "llm", model=self.name, tools=tools) as current:
+            started = time.perf_counter()
+            last = None
+            async for chunk in stream:
+                if last is None and current is not None:
+                    current.attributes["first_token_ms"] = round((time.perf_counter() - started) * 1000, 2)
+                last = chunk
+                yield chunk
+            record_usage(current, last)
+
+    def as_structured_llm(self, output_cls: Type[BaseModel], **kwargs: Any) -> "TracedStructuredLLM":
+        return TracedStructuredLLM(self.llm.as_structured_llm(output_cls, **kwargs), self.name, output_cls.__name__)
+
+
+class TracedStructuredLLM:
+    """
+    Structured counterpart of TracedLLM. The token counts come from the
+    completions the structured LLM makes, not from its parsed response.
+    """
+
+    def __init__(self, structured_llm: Any, name: str, output_name: str) -> None:
+        self.structured_llm = structured_llm
+        self.name = name
+        self.output_name = output_name
+
+    def __getattr__(self, attr: str) -> Any:
+        return getattr(self.structured_llm, attr)
+
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        with span("llm.structured_chat", "llm", model=self.name, output=self.output_name) as current, capture_usage(current):
+            return self.structured_llm.chat(messages=messages, **kwargs)
+
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        with span("llm.structured_achat", "llm", model=self.name, output=self.output_name) as current, capture_usage(current):
+            return await self.structured_llm.achat(messages=messages, **kwargs)
@@ -1,18 +1,21 @@
+import argparse
 import logging
 import uuid
 import asyncio
 from llama_index.llms.openai import OpenAI
-from llama_index.core.workflow import Context
 
 from config.env import OPENAI_MODEL
 from agent.agent import CRMAgent
+from session.store import get_session_store, restore_context, save_context
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-async def main():
+async def main(session_id: str = None):
     """
     Sets up and runs the JTCG Agent Workflow in a chat loop.
+    The conversation is saved to the session store after every turn, so it can
+    be resumed (by this or any other worker) with --session.
     """
     
     try:
@@ -22,7 +25,7 @@ async def main():
         logger.error("Please make sure your OPENAI_API_KEY environment variable is set.")
         return
 
-    conversation_id = f"JTCG-CHAT-{uuid.uuid4()}"
+    conversation_id = session_id or f"JTCG-CHAT-{uuid.uuid4()}"
     agent = CRMAgent(
         llm=llm,
     )
@@ -31,15 +34,10 @@ async def main():
     print("--- JTCG 'Senior Skill' Agent Workflow Initialized ---")
     print("This version uses a 'get_intent' -> 'router' -> 'worker' graph.")
     print("Type 'exit' or 'quit' to end the chat.")
+    print(f"Session: {conversation_id}")
     
-    context = Context(agent)
-    await context.store.set("conversation_id", conversation_id)
-    await context.store.set("history", [])
-    await context.store.set("user_id", None)
-    await context.store.set("order_id", None)
-    await context.store.set("email", None)
-    await context.store.set("waiting_for", None)
-    await context.store.set("language", "en")
+    sessions = get_session_store()
+    context = None
     
     while True:
         try:
@@ -48,7 +46,10 @@ async def main():
                 print("Agent: Goodbye!")
                 break
                 
+            # Reloaded only when another worker has served this session since our last save
+            context = await restore_context(agent, sessions, conversation_id, ctx=context)
             result = await agent.run(input=user_input, ctx=context)
+            await save_context(context, sessions, conversation_id)
             print(f"\nIntent: {result['intent']}")
             print(f"\nTool: {result['tools']}")
             print(f"\nAgent: {result['message']}")
@@ -59,6 +60,11 @@ async def main():
             break
         except Exception as e:
             logger.error(f"An error occurred: {e}", exc_info=True)
+            # Drop whatever the failed turn left in the Context; the next turn restores the stored session
+            context = None
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Chat with the JTCG intent agent.")
+    parser.add_argument("--session", default=None, help="Resume a stored conversation by its id")
+    args = parser.parse_args()
+    asyncio.run(main(args.session))
\ No newline at end of file
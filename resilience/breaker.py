@@ -0,0 +1,199 @@
+"""
+Timeouts and circuit breakers for the agent's remote dependencies.
+
+Each dependency ("retrieval", "llm") gets one CircuitBreaker per process:
+- Every call is bounded by the dependency's timeout.
+- After BREAKER_FAILURE_THRESHOLD consecutive failures or timeouts, the
+  breaker opens and calls go straight to their fallback, without waiting.
+- After BREAKER_RESET_S one trial call is let through (half-open). A success
+  closes the breaker again; a failure keeps it open for another period.
+
+    results = breaker("retrieval").call(retreive_from_vector_store, query, fallback=lambda: keyword_search(query))
+    response = await breaker("llm").acall(llm.achat, messages, fallback=canned_reply)
+
+A call that used its fallback is recorded as a "degraded" span. Errors
+the caller caused (CALLER_ERRORS, e.g. a ValueError from bad input) and
+cancellations do not count as failures of the dependency and are re-raised
+rather than answered by the fallback. Types passed as `ignore=` do not count
+either, but still use the fallback.
+"""
+import asyncio
+import concurrent.futures
+import contextvars
+import logging
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, Type, TypeVar
+
+from config.env import BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_S, LLM_TIMEOUT_S, RETRIEVAL_TIMEOUT_S
+from telemetry.tracing import span
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+# Per-dependency call timeouts, in seconds
+TIMEOUTS: Dict[str, float] = {
+    "retrieval": RETRIEVAL_TIMEOUT_S,
+    "llm": LLM_TIMEOUT_S,
+}
+
+
+# Raised for bad input rather than by an unhealthy dependency; they propagate to the caller
+CALLER_ERRORS = (ValueError, TypeError, KeyError)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a dependency whose breaker is open (when there is no fallback)."""
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name: str,
+        timeout_s: float,
+        failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+        reset_after_s: float = BREAKER_RESET_S,
+    ) -> None:
+        self.name = name
+        self.timeout_s = timeout_s
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+
+    def allow(self) -> bool:
+        """Whether a call may go through now; in half-open state only one trial call at a time."""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_after_s:
+                self.state = HALF_OPEN
+                self._trial_running = False
+            if self.state == HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self.state, self.failures, self._trial_running = CLOSED, 0, False
+
+    def record_failure(self, error: BaseException) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {self.failures} failures (last: {error!r})")
+                self.state, self.opened_at = OPEN, time.monotonic()
+
+    def release_trial(self) -> None:
+        """Ends a call that neither proved nor disproved the dependency's health."""
+        with self._lock:
+            self._trial_running = False
+
+    def _failed(
+        self,
+        error: BaseException,
+        reason: str,
+        fallback: Optional[Callable[[], T]],
+        ignore: Tuple[Type[BaseException], ...] = (),
+    ) -> T:
+        if isinstance(error, ignore):
+            self.release_trial()
+            reason = type(error).__name__
+            logger.warning(f"{self.name} call gave up ({reason}): {error!r}")
+        elif isinstance(error, CALLER_ERRORS):
+            self.release_trial()
+            raise error
+        else:
+            self.record_failure(error)
+            logger.warning(f"{self.name} call failed ({reason}): {error!r}")
+        return self._fallback(fallback, reason)
+
+    def _pool(self) -> concurrent.futures.ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix=f"breaker-{self.name}")
+        return self._executor
+
+    def _fallback(self, fallback: Optional[Callable[[], T]], reason: str) -> T:
+        if fallback is None:
+            raise CircuitOpenError(f"{self.name} unavailable ({reason})")
+        with span(f"{self.name}.degraded", kind="degraded", reason=reason):
+            return fallback()
+
+    def call(
+        self,
+        fn: Callable[..., T],
+        *args: Any,
+        fallback: Optional[Callable[[], T]] = None,
+        ignore: Tuple[Type[BaseException], ...] = (),
+        **kwargs: Any,
+    ) -> T:
+        """
+        Runs `fn` on a worker thread and waits at most `timeout_s`. A call that
+        times out keeps running in the background, but the caller moves on.
+        """
+        if not self.allow():
+            return self._fallback(fallback, "circuit open")
+        future = self._pool().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+        try:
+            result = future.result(timeout=self.timeout_s)
+        except Exception as e:
+            reason = "timeout" if isinstance(e, concurrent.futures.TimeoutError) else type(e).__name__
+            return self._failed(e, reason, fallback, ignore)
+        except BaseException:
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+    async def acall(
+        self,
+        fn: Callable[..., Awaitable[T]],
+        *args: Any,
+        fallback: Optional[Callable[[], T]] = None,
+        ignore: Tuple[Type[BaseException], ...] = (),
+        **kwargs: Any,
+    ) -> T:
+        if not self.allow():
+            return self._fallback(fallback, "circuit open")
+        try:
+            result = await asyncio.wait_for(fn(*args, **kwargs), timeout=self.timeout_s)
+        except Exception as e:
+            reason = "timeout" if isinstance(e, asyncio.TimeoutError) else type(e).__name__
+            return self._failed(e, reason, fallback, ignore)
+        except BaseException:
+            # Cancelled (or interrupted) before the dependency answered: free a half-open trial slot
+            self.release_trial()
+            raise
+        self.record_success()
+        return result
+
+    def status(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "timeout_s": self.timeout_s}
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker(name: str) -> CircuitBreaker:
+    """The process-wide breaker for a dependency; its timeout comes from TIMEOUTS."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, timeout_s=TIMEOUTS[name])
+        return _breakers[name]
+
+
+def breaker_status() -> Dict[str, Dict[str, Any]]:
+    return {name: b.status() for name, b in _breakers.items()}
@@ -0,0 +1,260 @@
+"""
+Milvus connections shared by every collection store in the process.
+
+- Sync calls go through a pool of MILVUS_POOL_SIZE MilvusClients per (uri,
+  token). Calls are handed out round-robin, so the knowledge-base and product
+  stores share the same channels. pymilvus reuses one connection for every
+  client with the same uri and token, so each slot gets its own connection
+  alias, and with it its own gRPC channel that can be closed on its own.
+- Async calls use one AsyncMilvusClient per event loop, created on first use
+  inside that loop under an alias of its own; grpc.aio channels cannot be
+  shared between loops.
+- A slot that has been idle for MILVUS_HEALTH_INTERVAL_S is pinged before it
+  is used again.
+- When the server cannot be reached, the failing slot is dropped and reopened
+  with exponential backoff. Reads are retried up to MILVUS_RECONNECT_ATTEMPTS
+  times. Writes are reported instead of retried, since an insert may already
+  have landed.
+- A forked worker starts with an empty pool rather than the parent's channels.
+"""
+import asyncio
+import functools
+import inspect
+import itertools
+import logging
+import os
+import random
+import threading
+import time
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymilvus import AsyncMilvusClient, MilvusClient
+from pymilvus.exceptions import ConnectError, ConnectionNotExistException, MilvusUnavailableException
+
+from config.env import (
+    MILVUS_HEALTH_INTERVAL_S,
+    MILVUS_POOL_SIZE,
+    MILVUS_RECONNECT_ATTEMPTS,
+    MILVUS_RECONNECT_BACKOFF_S,
+    MILVUS_URL,
+)
+
+logger = logging.getLogger(__name__)
+
+# Calls that are safe to repeat after a reconnect
+RETRYABLE_CALLS = frozenset({
+    "search",
+    "hybrid_search",
+    "query",
+    "get",
+    "list_collections",
+    "has_collection",
+    "describe_collection",
+    "get_load_state",
+    "get_collection_stats",
+    "list_indexes",
+    "describe_index",
+    "get_server_version",
+    "load_collection",
+    "flush",
+})
+
+
+def is_connection_error(error: BaseException) -> bool:
+    if isinstance(error, (ConnectError, ConnectionNotExistException, MilvusUnavailableException)):
+        return True
+    # grpc.RpcError from a dead channel
+    code = getattr(error, "code", None)
+    return callable(code) and getattr(code(), "name", None) == "UNAVAILABLE"
+
+
+def backoff(attempt: int) -> float:
+    """Exponential delay with jitter before reconnect attempt `attempt + 1`."""
+    return MILVUS_RECONNECT_BACKOFF_S * (2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+_pool_ids = itertools.count()
+
+
+class MilvusPool:
+    def __init__(self, uri: str, token: str = "", size: int = MILVUS_POOL_SIZE) -> None:
+        self.uri = uri
+        self.token = token
+        self.size = max(1, size)
+        self._id = next(_pool_ids)
+        self._reset()
+        self.sync = PooledClient(self)
+        self.aio = PooledAsyncClient(self)
+
+    def _reset(self) -> None:
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._clients: List[Optional[MilvusClient]] = [None] * self.size
+        self._checked = [0.0] * self.size
+        self._next = itertools.count()
+        self._aclients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncMilvusClient]" = weakref.WeakKeyDictionary()
+        self._aio_ids = itertools.count()
+        # pymilvus keeps connections per process by alias; the pid keeps a child from reusing the parent's
+        self._alias = f"{self.uri}|pool-{self._id}|pid-{self._pid}"
+
+    def _check_pid(self) -> None:
+        if self._pid != os.getpid():
+            # Channels inherited through fork() are not usable in the child
+            self._reset()
+
+    def _open(self, slot: int) -> MilvusClient:
+        for attempt in range(MILVUS_RECONNECT_ATTEMPTS):
+            try:
+                return MilvusClient(uri=self.uri, token=self.token, alias=f"{self._alias}|slot-{slot}")
+            except Exception as e:
+                if attempt + 1 >= MILVUS_RECONNECT_ATTEMPTS or not is_connection_error(e):
+                    raise
+                delay = backoff(attempt)
+                logger.warning(f"Milvus at {self.uri} unreachable ({e}); retrying in {delay:.2f}s")
+                time.sleep(delay)
+        raise ConnectError(message=f"Could not connect to Milvus at {self.uri}")
+
+    def client(self, slot: Optional[int] = None) -> MilvusClient:
+        self._check_pid()
+        slot = next(self._next) % self.size if slot is None else slot
+        client = self._clients[slot]
+        if client is None:
+            with self._lock:
+                client = self._clients[slot]
+                if client is None:
+                    client = self._clients[slot] = self._open(slot)
+                    self._checked[slot] = time.monotonic()
+        elif time.monotonic() - self._checked[slot] > MILVUS_HEALTH_INTERVAL_S:
+            self._checked[slot] = time.monotonic()
+            if not self._ping(client):
+                self._drop(slot, client)
+                return self.client(slot)
+        return client
+
+    def _ping(self, client: MilvusClient) -> bool:
+        try:
+            client.get_server_version()
+            return True
+        except Exception as e:
+            logger.warning(f"Milvus health check failed: {e}")
+            return False
+
+    def _drop(self, slot: int, client: MilvusClient) -> None:
+        with self._lock:
+            if self._clients[slot] is not client:
+                return  # another thread already reopened it
+            self._clients[slot] = None
+        try:
+            client.close()
+        except Exception:
+            pass
+
+    def call(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        attempts = MILVUS_RECONNECT_ATTEMPTS if name in RETRYABLE_CALLS else 1
+        for attempt in range(attempts):
+            slot = next(self._next) % self.size
+            client = self.client(slot)
+            try:
+                return getattr(client, name)(*args, **kwargs)
+            except Exception as e:
+                if not is_connection_error(e):
+                    raise
+                self._drop(slot, client)
+                if attempt + 1 >= attempts:
+                    raise
+                delay = backoff(attempt)
+                logger.warning(f"Milvus {name} lost its connection ({e}); reconnecting in {delay:.2f}s")
+                time.sleep(delay)
+
+    def aclient(self) -> AsyncMilvusClient:
+        self._check_pid()
+        loop = asyncio.get_running_loop()
+        client = self._aclients.get(loop)
+        if client is None:
+            with self._lock:
+                client = self._aclients.get(loop)
+                if client is None:
+                    # A fresh alias per client: a later loop must not get a channel bound to a closed one
+                    alias = f"{self._alias}|aio-{next(self._aio_ids)}"
+                    client = self._aclients[loop] = AsyncMilvusClient(uri=self.uri, token=self.token, alias=alias)
+        return client
+
+    async def _adrop(self, client: AsyncMilvusClient) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._aclients.get(loop) is not client:
+                return
+            del self._aclients[loop]
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+    async def acall(self, name: str, *args: Any, **kwargs: Any) -> Any:
+        attempts = MILVUS_RECONNECT_ATTEMPTS if name in RETRYABLE_CALLS else 1
+        for attempt in range(attempts):
+            client = self.aclient()
+            try:
+                return await getattr(client, name)(*args, **kwargs)
+            except Exception as e:
+                if not is_connection_error(e):
+                    raise
+                await self._adrop(client)
+                if attempt + 1 >= attempts:
+                    raise
+                delay = backoff(attempt)
+                logger.warning(f"Milvus async {name} lost its connection ({e}); reconnecting in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def health(self) -> Dict[str, Any]:
+        """Pings every open slot; for readiness probes and the bench."""
+        self._check_pid()
+        slots = []
+        for slot, client in enumerate(list(self._clients)):
+            if client is None:
+                slots.append("closed")
+            elif self._ping(client):
+                self._checked[slot] = time.monotonic()
+                slots.append("ok")
+            else:
+                self._drop(slot, client)
+                slots.append("reconnecting")
+        return {"uri": self.uri, "slots": slots, "event_loops": len(self._aclients)}
+
+
+class PooledClient:
+    """Stands in for a MilvusClient; each method call runs on the next pooled client."""
+
+    def __init__(self, pool: MilvusPool) -> None:
+        self._pool = pool
+
+    def __getattr__(self, name: str) -> Any:
+        if callable(getattr(MilvusClient, name, None)):
+            return functools.partial(self._pool.call, name)
+        return getattr(self._pool.client(0), name)
+
+
+class PooledAsyncClient:
+    """Stands in for an AsyncMilvusClient; calls run on the client of the current event loop."""
+
+    def __init__(self, pool: MilvusPool) -> None:
+        self._pool = pool
+
+    def __getattr__(self, name: str) -> Any:
+        if inspect.iscoroutinefunction(getattr(AsyncMilvusClient, name, None)):
+            return functools.partial(self._pool.acall, name)
+        return getattr(self._pool.aclient(), name)
+
+
+_pools: Dict[Tuple[str, str], MilvusPool] = {}
+_pools_lock = threading.Lock()
+
+
+def milvus_pool(uri: Optional[str] = None, token: str = "") -> MilvusPool:
+    """The process-wide pool for a Milvus endpoint (MILVUS_URL by default)."""
+    key = (uri or MILVUS_URL, token)
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = MilvusPool(*key)
+        return _pools[key]
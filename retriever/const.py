@@ -1 +1,4 @@
-EMBEDDING_TOP_K=5
\ No newline at end of file
+EMBEDDING_TOP_K=5
+# Chunks fetched per knowledge-base search before collapsing them to EMBEDDING_TOP_K articles
+CHUNK_CANDIDATES=10
+PRODUCT_CANDIDATES=10
@@ -0,0 +1,88 @@
+"""
+Retrieval that works without Milvus or the embedding API, used while the
+"retrieval" circuit breaker is open (see resilience/breaker.py).
+
+- Knowledge base: BM25 over jieba tokens of the knowledge_base.csv chunks,
+  built in memory on first use. It uses the same tokenizer and BM25
+  parameters as the local backend, so keyword matches rank as they would in
+  the sparse leg of hybrid search.
+- Products: the in-memory catalog filtered with `ProductFilter.matches`,
+  ranked by how many query tokens the name / compatibility notes contain.
+"""
+import logging
+import math
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from document.chunking import collapse_chunks, knowledge_nodes
+from document.data import product_catalog
+from retriever.const import EMBEDDING_TOP_K
+from retriever.local import BM25_B, BM25_K1, tokenize
+from retriever.product_filter import ProductFilter
+
+logger = logging.getLogger(__name__)
+
+KNOWLEDGE_BASE_PATH = "document/knowledge_base.csv"
+
+
+class KeywordIndex:
+    """Minimal in-memory BM25 index over text nodes."""
+
+    def __init__(self, nodes: List[TextNode]) -> None:
+        self.nodes = nodes
+        self.tokens = [Counter(tokenize(node.get_content())) for node in nodes]
+        self.lengths = [sum(tf.values()) for tf in self.tokens]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 1.0
+        self.doc_freq: Counter = Counter(token for tf in self.tokens for token in tf)
+
+    def search(self, query: str, top_k: int) -> List[NodeWithScore]:
+        n_docs = len(self.nodes)
+        scores = [0.0] * n_docs
+        for token in set(tokenize(query)):
+            df = self.doc_freq.get(token)
+            if not df:
+                continue
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            for row, tf in enumerate(self.tokens):
+                if token in tf:
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[row] / self.avg_length)
+                    scores[row] += idf * tf[token] * (BM25_K1 + 1) / (tf[token] + norm)
+        ranked = sorted((row for row in range(n_docs) if scores[row] > 0), key=lambda row: scores[row], reverse=True)
+        return [NodeWithScore(node=self.nodes[row], score=scores[row]) for row in ranked[:top_k]]
+
+
+_kb_index: Optional[KeywordIndex] = None
+_kb_lock = threading.Lock()
+
+
+def knowledge_index() -> KeywordIndex:
+    global _kb_index
+    with _kb_lock:
+        if _kb_index is None:
+            rows = pd.read_csv(KNOWLEDGE_BASE_PATH).to_dict("records")
+            _kb_index = KeywordIndex([node for row in rows for node in knowledge_nodes(row)])
+            logger.info(f"Built degraded-mode keyword index over {len(_kb_index.nodes)} knowledge-base chunks")
+        return _kb_index
+
+
+def keyword_search(query: str, top_k: int = EMBEDDING_TOP_K) -> List[NodeWithScore]:
+    """Knowledge-base articles for `query`, ranked by BM25 alone."""
+    return collapse_chunks(knowledge_index().search(query, top_k * 2), limit=top_k)
+
+
+def filter_products(query: Optional[str], product_filter: ProductFilter, limit: int) -> List[Dict[str, Any]]:
+    """Catalog records passing the filter, best keyword overlap with `query` first."""
+    records = [record for record in product_catalog if product_filter.matches(record)] if product_filter else list(product_catalog)
+    terms = set(tokenize(query or ""))
+    if terms:
+        def overlap(record: Dict[str, Any]) -> int:
+            return len(terms.intersection(tokenize(f"{record.get('name') or ''} {record.get('compatibility_notes') or ''}")))
+
+        records = sorted(records, key=overlap, reverse=True)
+        if not product_filter:
+            records = [record for record in records if overlap(record) > 0]
+    return records[:limit]
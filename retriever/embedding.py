@@ -1,6 +1,30 @@
+from typing import List
+
 from llama_index.embeddings.openai import OpenAIEmbedding
 from config.env import OPENAI_API_KEY, OPENAI_EMBEDDING_MODEL, EMBED_DIM
+from telemetry.tracing import span
+
+
+class TracedOpenAIEmbedding(OpenAIEmbedding):
+    """OpenAIEmbedding that records an "embedding" span per API call."""
+
+    def _get_query_embedding(self, query: str) -> List[float]:
+        with span("embedding.query", kind="embedding", model=self.model_name):
+            return super()._get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> List[float]:
+        with span("embedding.aquery", kind="embedding", model=self.model_name):
+            return await super()._aget_query_embedding(query)
+
+    def _get_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        with span("embedding.texts", kind="embedding", model=self.model_name, texts=len(texts)):
+            return super()._get_text_embeddings(texts)
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[List[float]]:
+        with span("embedding.atexts", kind="embedding", model=self.model_name, texts=len(texts)):
+            return await super()._aget_text_embeddings(texts)
+
 
-embedding_model = OpenAIEmbedding(
+embedding_model = TracedOpenAIEmbedding(
     api_key=OPENAI_API_KEY, model=OPENAI_EMBEDDING_MODEL, dimensions=EMBED_DIM
 )
@@ -0,0 +1,189 @@
+"""
+Persistent document embeddings keyed by (model, dim, sha256(text)).
+
+`embed_texts` / `aembed_texts` look each text up in the store and only send
+the misses to `embedding_model`. Re-seeding, seeding a second collection or
+rebuilding after a schema / storage change therefore costs no embedding calls
+for text that was embedded before. The store is one SQLite file
+(EMBEDDING_STORE_PATH, "none" disables it). It can be moved between machines
+with export / import:
+
+    python -m retriever.embedding_store export embeddings.jsonl
+    python -m retriever.embedding_store import embeddings.jsonl
+    python -m retriever.embedding_store stats
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from config.env import EMBED_DIM, EMBEDDING_STORE_PATH
+from retriever.embedding import embedding_model
+from telemetry.tracing import span
+
+logger = logging.getLogger(__name__)
+
+Key = Tuple[str, int, str]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    """SQLite table of float32 vectors; safe to share between threads."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "model TEXT NOT NULL, dim INTEGER NOT NULL, hash TEXT NOT NULL, vector BLOB NOT NULL, "
+                "PRIMARY KEY (model, dim, hash))"
+            )
+
+    def get_many(self, model: str, dim: int, hashes: Sequence[str]) -> Dict[str, List[float]]:
+        found: Dict[str, List[float]] = {}
+        unique = list(dict.fromkeys(hashes))
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND dim = ? AND hash IN ({','.join('?' * len(batch))})",
+                    (model, dim, *batch),
+                ).fetchall()
+                found.update((h, np.frombuffer(blob, dtype=np.float32).tolist()) for h, blob in rows)
+        return found
+
+    def put_many(self, rows: Iterable[Tuple[str, int, str, Sequence[float]]]) -> int:
+        records = [(model, dim, h, np.asarray(vector, dtype=np.float32).tobytes()) for model, dim, h, vector in rows]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", records)
+        return len(records)
+
+    def export(self, path: str, model: Optional[str] = None) -> int:
+        """Writes the store (or one model's rows) as JSONL with base64 float32 vectors."""
+        query, params = "SELECT model, dim, hash, vector FROM embeddings", ()
+        if model:
+            query, params = query + " WHERE model = ?", (model,)
+        count = 0
+        with self._lock:
+            rows = self._conn.execute(query, params)
+            with open(path, "w", encoding="utf-8") as f:
+                for model_name, dim, h, blob in rows:
+                    f.write(json.dumps({"model": model_name, "dim": dim, "hash": h, "vector": base64.b64encode(blob).decode("ascii")}) + "\n")
+                    count += 1
+        return count
+
+    def import_file(self, path: str, batch_size: int = 1000) -> int:
+        count, batch = 0, []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                vector = np.frombuffer(base64.b64decode(row["vector"]), dtype=np.float32)
+                batch.append((row["model"], int(row["dim"]), row["hash"], vector))
+                if len(batch) >= batch_size:
+                    count += self.put_many(batch)
+                    batch = []
+        return count + self.put_many(batch)
+
+    def stats(self) -> List[Tuple[str, int, int]]:
+        with self._lock:
+            return self._conn.execute("SELECT model, dim, COUNT(*) FROM embeddings GROUP BY model, dim").fetchall()
+
+
+_store: Optional[EmbeddingStore] = None
+_store_opened = False
+
+
+def get_embedding_store() -> Optional[EmbeddingStore]:
+    """The process-wide store at EMBEDDING_STORE_PATH, or None when it is disabled."""
+    global _store, _store_opened
+    if not _store_opened:
+        _store = None if EMBEDDING_STORE_PATH.lower() in ("", "none") else EmbeddingStore(EMBEDDING_STORE_PATH)
+        _store_opened = True
+    return _store
+
+
+def _lookup(texts: List[str]) -> Tuple[List[Optional[List[float]]], List[str]]:
+    store = get_embedding_store()
+    hashes = [text_hash(text) for text in texts]
+    found = store.get_many(embedding_model.model_name, EMBED_DIM, hashes) if store else {}
+    return [found.get(h) for h in hashes], hashes
+
+
+def _remember(texts: List[str], hashes: List[str], vectors: List[Optional[List[float]]], missing: List[int], fresh: List[List[float]]) -> None:
+    for i, vector in zip(missing, fresh):
+        vectors[i] = vector
+    store = get_embedding_store()
+    if store and missing:
+        store.put_many((embedding_model.model_name, EMBED_DIM, hashes[i], vectors[i]) for i in missing)
+
+
+def embed_texts(texts: List[str]) -> List[List[float]]:
+    """Document embeddings for `texts`; only texts missing from the store reach the embedding model."""
+    if not texts:
+        return []
+    with span("embedding.store", kind="embedding", texts=len(texts)) as current:
+        vectors, hashes = _lookup(texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if current is not None:
+            current.attributes["hits"] = len(texts) - len(missing)
+    fresh = embedding_model.get_text_embedding_batch([texts[i] for i in missing]) if missing else []
+    _remember(texts, hashes, vectors, missing, fresh)
+    return vectors
+
+
+async def aembed_texts(texts: List[str]) -> List[List[float]]:
+    """`embed_texts` for the event loop; the SQLite lookups and writes run in a worker thread."""
+    if not texts:
+        return []
+    with span("embedding.store", kind="embedding", texts=len(texts)) as current:
+        vectors, hashes = await asyncio.to_thread(_lookup, texts)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if current is not None:
+            current.attributes["hits"] = len(texts) - len(missing)
+    fresh = await embedding_model.aget_text_embedding_batch([texts[i] for i in missing]) if missing else []
+    await asyncio.to_thread(_remember, texts, hashes, vectors, missing, fresh)
+    return vectors
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Export, import or inspect the persistent embedding store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export = sub.add_parser("export", help="Write the store as JSONL")
+    export.add_argument("path")
+    export.add_argument("--model", default=None, help="Only this embedding model's vectors")
+    sub.add_parser("import", help="Load a JSONL export into the store").add_argument("path")
+    sub.add_parser("stats", help="Vectors per (model, dim)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    store = get_embedding_store()
+    if store is None:
+        raise SystemExit("EMBEDDING_STORE_PATH is 'none'; nothing to do.")
+    if args.command == "export":
+        print(f"Exported {store.export(args.path, model=args.model)} embeddings to {args.path}")
+    elif args.command == "import":
+        print(f"Imported {store.import_file(args.path)} embeddings from {args.path}")
+    else:
+        for model, dim, count in store.stats():
+            print(f"{model} ({dim}d): {count}")
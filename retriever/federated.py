@@ -0,0 +1,119 @@
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from llama_index.core.schema import NodeWithScore
+
+from config.env import COLLECTION_NAME, PRODUCT_COLLECTION_NAME
+from retriever.const import PRODUCT_CANDIDATES
+from retriever.embedding import embedding_model
+from retriever.fusion import FusionConfig, fusion_profile
+from retriever.utils import knowledge_candidates
+from retriever.vector_store import vector_store_for
+from telemetry.tracing import span, traced
+
+SOURCE_KEY = "source"
+
+
+@dataclass(frozen=True)
+class Source:
+    """One collection taking part in a federated search."""
+    name: str
+    collection: str
+    top_k: int
+    profile: Optional[str] = None
+
+
+def default_sources() -> List[Source]:
+    """Each source fetches as many candidates as its single-collection search does, for the same post-processing."""
+    return [
+        Source(name="knowledge_base", collection=COLLECTION_NAME, top_k=knowledge_candidates(), profile="faq"),
+        Source(name="product", collection=PRODUCT_COLLECTION_NAME, top_k=PRODUCT_CANDIDATES, profile="product_search"),
+    ]
+
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="federated")
+    return _executor
+
+
+def normalize_scores(results: List[NodeWithScore]) -> List[NodeWithScore]:
+    """Min-max scales one source's scores to [0, 1] so RRF and weighted scores become comparable."""
+    scores = [r.score or 0.0 for r in results]
+    if not scores:
+        return results
+    low, high = min(scores), max(scores)
+    for r, score in zip(results, scores):
+        r.score = 1.0 if high == low else (score - low) / (high - low)
+    return results
+
+
+class FederatedRetriever:
+    """
+    Queries several collections with one query embedding, concurrently, and
+    merges the per-source top-k lists by normalized score. Every node gets
+    `metadata["source"]` (kept out of the embed/LLM metadata text).
+    """
+
+    def __init__(self, sources: Optional[List[Source]] = None, fusion: Optional[Dict[str, FusionConfig]] = None) -> None:
+        self.sources = sources or default_sources()
+        self.fusion = fusion or {}
+
+    def _search(self, source: Source, query: str, embedding: List[float]) -> List[NodeWithScore]:
+        config = self.fusion.get(source.name) or fusion_profile(source.profile, source.collection)
+        with span(f"federated.{source.name}", kind="retrieval", collection=source.collection, top_k=source.top_k):
+            result = vector_store_for(source.collection).hybrid_search_many([query], [embedding], source.top_k, fusion=config)[0]
+        return self._tag(source, result)
+
+    async def _asearch(self, source: Source, query: str, embedding: List[float]) -> List[NodeWithScore]:
+        config = self.fusion.get(source.name) or fusion_profile(source.profile, source.collection)
+        with span(f"federated.{source.name}", kind="retrieval", collection=source.collection, top_k=source.top_k):
+            results = await vector_store_for(source.collection).ahybrid_search_many([query], [embedding], source.top_k, fusion=config)
+        return self._tag(source, results[0])
+
+    @staticmethod
+    def _tag(source: Source, result) -> List[NodeWithScore]:
+        tagged = []
+        for node, score in zip(result.nodes or [], result.similarities or []):
+            node.metadata[SOURCE_KEY] = source.name
+            for keys in (node.excluded_embed_metadata_keys, node.excluded_llm_metadata_keys):
+                if SOURCE_KEY not in keys:
+                    keys.append(SOURCE_KEY)
+            tagged.append(NodeWithScore(node=node, score=score))
+        return normalize_scores(tagged)
+
+    def _merge(self, per_source: List[List[NodeWithScore]]) -> List[NodeWithScore]:
+        # Stable sort: equal scores keep the order of self.sources
+        merged = [result for results in per_source for result in results]
+        return sorted(merged, key=lambda r: r.score or 0.0, reverse=True)
+
+    @traced("retrieval.federated", kind="retrieval")
+    def retrieve(self, query: str) -> List[NodeWithScore]:
+        embedding = embedding_model.get_query_embedding(query)
+        futures = [
+            _pool().submit(contextvars.copy_context().run, self._search, source, query, embedding)
+            for source in self.sources
+        ]
+        return self._merge([future.result() for future in futures])
+
+    @traced("retrieval.afederated", kind="retrieval")
+    async def aretrieve(self, query: str) -> List[NodeWithScore]:
+        embedding = await embedding_model.aget_query_embedding(query)
+        per_source = await asyncio.gather(*[self._asearch(source, query, embedding) for source in self.sources])
+        return self._merge(list(per_source))
+
+
+_federated: Optional[FederatedRetriever] = None
+
+
+def retrieve_federated(query: str) -> List[NodeWithScore]:
+    global _federated
+    if _federated is None:
+        _federated = FederatedRetriever()
+    return _federated.retrieve(query)
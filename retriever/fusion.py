@@ -0,0 +1,136 @@
+import dataclasses
+import json
+import logging
+import math
+import os
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+from config.env import FUSION_PROFILES_PATH
+
+logger = logging.getLogger(__name__)
+
+RANKERS = ("RRFRanker", "WeightedRanker")
+
+# (id, score) as returned by one search leg, best first
+Hit = Tuple[Hashable, float]
+
+
+@dataclass(frozen=True)
+class FusionConfig:
+    """
+    How the dense and sparse legs of a hybrid search are fetched and fused.
+
+    Frozen so a config can be shared between calls and threads; derive
+    variants with `replace()`. `dense_top_k`/`sparse_top_k` are the candidate
+    depths of each leg (None means the query's similarity_top_k).
+    """
+    ranker: str = "RRFRanker"
+    k: int = 60
+    weights: Tuple[float, float] = (1.0, 1.0)
+    dense_top_k: Optional[int] = None
+    sparse_top_k: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        if self.ranker not in RANKERS:
+            raise ValueError(f"Unsupported ranker: {self.ranker}")
+        object.__setattr__(self, "weights", tuple(float(w) for w in self.weights))
+
+    def limits(self, top_k: int, sparse_top_k: Optional[int] = None) -> Tuple[int, int]:
+        return self.dense_top_k or top_k, self.sparse_top_k or sparse_top_k or top_k
+
+    def replace(self, **changes: Any) -> "FusionConfig":
+        return dataclasses.replace(self, **changes)
+
+    @classmethod
+    def from_ranker(cls, ranker: str, params: Optional[Dict[str, Any]] = None) -> "FusionConfig":
+        """Builds a config from MilvusVectorStore-style `hybrid_ranker`/`hybrid_ranker_params`."""
+        params = params or {}
+        if ranker == "WeightedRanker":
+            return cls(ranker=ranker, weights=tuple(params.get("weights", (1.0, 1.0))))
+        return cls(ranker=ranker, k=params.get("k", 60))
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**dataclasses.asdict(self), "weights": list(self.weights)}
+
+
+def normalize_dense(score: float, metric: str = "IP") -> float:
+    # Milvus WeightedRanker normalization per metric
+    if metric == "L2":
+        return 1.0 - 2 * math.atan(score) / math.pi
+    return 0.5 + math.atan(score) / math.pi
+
+
+def normalize_sparse(score: float) -> float:
+    # Milvus WeightedRanker normalization for BM25
+    return 2 * math.atan(score) / math.pi
+
+
+def fuse(
+    dense: Sequence[Hit],
+    sparse: Sequence[Hit],
+    config: FusionConfig,
+    limit: int,
+    dense_metric: str = "IP",
+) -> List[Hit]:
+    """Fuses two ranked legs the way Milvus' RRFRanker/WeightedRanker would, cut to `limit`."""
+    dense_limit, sparse_limit = config.limits(limit)
+    dense, sparse = dense[:dense_limit], sparse[:sparse_limit]
+    fused: Dict[Hashable, float] = defaultdict(float)
+
+    if config.ranker == "WeightedRanker":
+        for hit_id, score in dense:
+            fused[hit_id] += config.weights[0] * normalize_dense(score, dense_metric)
+        for hit_id, score in sparse:
+            fused[hit_id] += config.weights[1] * normalize_sparse(score)
+    else:
+        for leg in (dense, sparse):
+            for rank, (hit_id, _) in enumerate(leg, start=1):
+                fused[hit_id] += 1.0 / (config.k + rank)
+
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+# Defaults per intent (UserIntent values) or collection name. They match the
+# original search (RRF k=60, each leg at the query's top_k); only a tuned
+# FUSION_PROFILES_PATH (`python -m retriever.tune_fusion`) changes the ranking.
+FUSION_PROFILES: Dict[str, FusionConfig] = {
+    "faq": FusionConfig(),
+    "product_search": FusionConfig(),
+}
+
+
+def load_profiles(path: Optional[str] = FUSION_PROFILES_PATH) -> Dict[str, FusionConfig]:
+    profiles = dict(FUSION_PROFILES)
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            for name, params in json.load(f).items():
+                profiles[name] = FusionConfig(**params)
+        logger.info(f"Loaded fusion profiles {sorted(profiles)} from {path}")
+    return profiles
+
+
+_profiles: Optional[Dict[str, FusionConfig]] = None
+
+
+def fusion_profile(*names: Optional[str]) -> Optional[FusionConfig]:
+    """First configured profile among `names` (e.g. intent, then collection), or None."""
+    global _profiles
+    if _profiles is None:
+        _profiles = load_profiles()
+    for name in names:
+        if name and name in _profiles:
+            return _profiles[name]
+    return None
+
+
+def save_profiles(profiles: Dict[str, FusionConfig], path: str = FUSION_PROFILES_PATH) -> None:
+    existing = {}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            existing = json.load(f)
+    existing.update({name: config.to_dict() for name, config in profiles.items()})
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(existing, f, indent=2)
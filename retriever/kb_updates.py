@@ -0,0 +1,145 @@
+"""
+Online knowledge-base updates: upsert / delete articles by doc_id while the agent is serving.
+
+Writes go into a write-behind buffer that keeps only the latest operation per
+doc_id. A background thread applies the buffer as one bulk write every
+KB_FLUSH_INTERVAL_S seconds, or sooner once KB_FLUSH_MAX_DOCS docs are waiting.
+An applied change is visible to searches within about one flush interval. How
+much more delay Milvus adds depends on the collection's consistency level
+(MILVUS_CONSISTENCY_LEVEL). With the default "Session", this process reads
+its own writes at once.
+
+    upsert_article("kb-returns", "退換貨政策", "JTCG Shop 提供 14 天鑑賞期...", url="https://...")
+    delete_article("kb-old-promo")
+    flush_updates()  # apply now instead of waiting for the next tick
+"""
+import atexit
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from llama_index.core.schema import TextNode
+
+from config.env import COLLECTION_NAME, KB_FLUSH_INTERVAL_S, KB_FLUSH_MAX_DOCS
+from document.chunking import knowledge_nodes
+from retriever.rerank import get_reranker
+from retriever.vector_store import vector_store_for
+from telemetry.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindBuffer:
+    """
+    Coalesces doc-level writes and applies them in bulk with `replace_docs`.
+    An empty node list stands for a delete.
+    """
+
+    def __init__(
+        self,
+        collection: str = COLLECTION_NAME,
+        interval_s: float = KB_FLUSH_INTERVAL_S,
+        max_docs: int = KB_FLUSH_MAX_DOCS,
+    ) -> None:
+        self.collection = collection
+        self.interval_s = interval_s
+        self.max_docs = max_docs
+        self._pending: Dict[str, List[TextNode]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "WriteBehindBuffer":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kb-write-behind", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+        return self
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Knowledge-base flush failed, will retry: {e}", exc_info=True)
+
+    def put(self, doc_id: str, nodes: List[TextNode]) -> None:
+        with self._lock:
+            self._pending[str(doc_id)] = nodes
+            full = len(self._pending) >= self.max_docs
+        if full:
+            self._wake.set()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> int:
+        """Applies everything buffered so far; returns the number of docs written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+            try:
+                with span("kb.flush", kind="ingest", collection=self.collection, docs=len(batch)):
+                    node_ids = vector_store_for(self.collection).replace_docs(batch)
+            except Exception:
+                # Put the batch back unless a newer write for the same doc arrived meanwhile
+                with self._lock:
+                    self._pending = {**batch, **self._pending}
+                raise
+
+        reranker = get_reranker()
+        if reranker is not None:
+            reranker.cache.invalidate(node_ids)
+        logger.info(f"Applied {len(batch)} knowledge-base updates to '{self.collection}'")
+        return len(batch)
+
+    def close(self) -> None:
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval_s + 5)
+        self.flush()
+
+
+_buffer: Optional[WriteBehindBuffer] = None
+_buffer_lock = threading.Lock()
+
+
+def get_kb_buffer() -> WriteBehindBuffer:
+    global _buffer
+    with _buffer_lock:
+        if _buffer is None:
+            _buffer = WriteBehindBuffer().start()
+    return _buffer
+
+
+def upsert_article(
+    doc_id: str,
+    title: str,
+    content: str,
+    url: Optional[str] = None,
+    image: Optional[str] = None,
+    tags: Optional[List[str]] = None,
+) -> List[str]:
+    """Queues a new or changed article; returns the ids of its chunk nodes."""
+    row = {"id": doc_id, "title": title, "content": content, "urls/0/href": url, "images/0": image}
+    row.update({f"tags/{i}": tag for i, tag in enumerate((tags or [])[:3])})
+    nodes = knowledge_nodes(row)
+    get_kb_buffer().put(doc_id, nodes)
+    return [node.node_id for node in nodes]
+
+
+def delete_article(doc_id: str) -> None:
+    get_kb_buffer().put(doc_id, [])
+
+
+def flush_updates() -> int:
+    """Applies buffered updates now, e.g. before answering a question about what was just changed."""
+    return get_kb_buffer().flush()
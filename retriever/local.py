@@ -0,0 +1,428 @@
+import asyncio
+import atexit
+import json
+import logging
+import math
+import os
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import jieba
+import numpy as np
+from pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode, TextNode
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    FilterCondition,
+    FilterOperator,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryMode,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
+
+from retriever.embedding_store import aembed_texts, embed_texts
+from retriever.fusion import FusionConfig, Hit, fuse
+from telemetry.tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Same BM25 parameters as the Milvus SPARSE_INVERTED_INDEX in CustomMilvusVector
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    """jieba tokens as CustomMilvusVector.do_jieba produces them, lowercased like Milvus' standard analyzer."""
+    return [token.lower() for token in jieba.cut(text or "") if token.strip() != ""]
+
+
+def _match(value: Any, operator: FilterOperator, target: Any) -> bool:
+    if operator == FilterOperator.EQ:
+        return value == target
+    if operator == FilterOperator.NE:
+        return value != target
+    if operator == FilterOperator.IN:
+        return value in target
+    if operator == FilterOperator.NIN:
+        return value not in target
+    if operator == FilterOperator.CONTAINS:
+        return isinstance(value, list) and target in value
+    if value is None:
+        return False
+    if operator == FilterOperator.GT:
+        return value > target
+    if operator == FilterOperator.GTE:
+        return value >= target
+    if operator == FilterOperator.LT:
+        return value < target
+    if operator == FilterOperator.LTE:
+        return value <= target
+    raise ValueError(f"Unsupported filter operator for the local backend: {operator}")
+
+
+def passes_filters(metadata: Dict[str, Any], filters: MetadataFilters) -> bool:
+    """Whether a node's metadata satisfies (possibly nested) MetadataFilters."""
+    results = []
+    for f in filters.filters:
+        if isinstance(f, MetadataFilters):
+            results.append(passes_filters(metadata, f))
+        else:
+            results.append(_match(metadata.get(f.key), f.operator, f.value))
+    if filters.condition == FilterCondition.OR:
+        return any(results)
+    return all(results)
+
+
+class LocalHybridVector(BasePydanticVectorStore):
+    """
+    Embedded drop-in for CustomMilvusVector.
+
+    Dense vectors live in one L2-normalized float32 matrix (memory-mapped from
+    `<persist_dir>/<collection>/vectors.npy` when reloaded), the sparse leg is
+    a BM25 inverted index over jieba tokens, and hybrid queries are fused with
+    the same client-side `retriever.fusion.fuse` as CustomMilvusVector. Meant for
+    knowledge bases of up to a few thousand nodes, where a full matrix product
+    is cheaper than a network hop to Milvus.
+
+    Writes only change memory. `persist()` writes both files (each to a temp
+    file that is then renamed over the old one), and skips the write if
+    nothing changed. Call it once after a batch of writes, or pass
+    `force_flush=True` to `add` / `async_add`. Pending writes are also
+    persisted at interpreter exit.
+    """
+
+    stores_text: bool = True
+    is_embedding_query: bool = True
+
+    collection_name: str
+    dim: int
+    persist_dir: Optional[str] = None
+    hybrid_ranker: str = "RRFRanker"
+    hybrid_ranker_params: Dict[str, Any] = {}
+    doc_id_field: str = "doc_id"
+
+    _ids: List[str] = PrivateAttr(default_factory=list)
+    _doc_ids: List[str] = PrivateAttr(default_factory=list)
+    _metadata: List[Dict[str, Any]] = PrivateAttr(default_factory=list)
+    _vectors: Any = PrivateAttr(default=None)
+    _postings: Dict[str, Dict[int, int]] = PrivateAttr(default_factory=lambda: defaultdict(dict))
+    _doc_lengths: List[int] = PrivateAttr(default_factory=list)
+    _lock: Any = PrivateAttr(default_factory=threading.RLock)
+    _dirty: bool = PrivateAttr(default=False)
+
+    def __init__(self, collection_name: str, dim: int, persist_dir: Optional[str] = None, **kwargs: Any) -> None:
+        super().__init__(collection_name=collection_name, dim=dim, persist_dir=persist_dir, **kwargs)
+        self._vectors = np.zeros((0, dim), dtype=np.float32)
+        if self._path and os.path.exists(os.path.join(self._path, "nodes.jsonl")):
+            self._load()
+        if self._path:
+            atexit.register(self.persist)
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalHybridVector"
+
+    @property
+    def client(self) -> Any:
+        return None
+
+    @property
+    def dimension(self) -> int:
+        return self.dim
+
+    @property
+    def _path(self) -> Optional[str]:
+        return os.path.join(self.persist_dir, self.collection_name) if self.persist_dir else None
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    # --- Persistence ---
+
+    def _load(self) -> None:
+        vectors = np.load(os.path.join(self._path, "vectors.npy"), mmap_mode="r")
+        if vectors.shape[1] != self.dim:
+            raise ValueError(
+                f"Dimension mismatch: local store '{self.collection_name}' has dimension {vectors.shape[1]}, "
+                f"but {self.dim} was requested."
+            )
+        rows = []
+        with open(os.path.join(self._path, "nodes.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rows.append(json.loads(line))
+        if len(rows) != vectors.shape[0]:
+            raise ValueError(
+                f"Local store '{self.collection_name}' is inconsistent: {len(rows)} nodes but {vectors.shape[0]} vectors. "
+                "Re-seed it."
+            )
+        self._vectors = vectors
+        self._ids = [row["id"] for row in rows]
+        self._doc_ids = [row["doc_id"] for row in rows]
+        self._metadata = [row["metadata"] for row in rows]
+        self._rebuild_sparse_index([row["tokens"] for row in rows])
+        logger.info(f"Loaded {len(rows)} nodes for '{self.collection_name}' from {self._path}")
+
+    def persist(self) -> None:
+        """Writes the store to disk if it changed since the last persist."""
+        if not self._path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            os.makedirs(self._path, exist_ok=True)
+            vectors_path = os.path.join(self._path, "vectors.npy")
+            nodes_path = os.path.join(self._path, "nodes.jsonl")
+            tokens = self._tokens_by_row()
+            with open(vectors_path + ".tmp", "wb") as f:
+                np.save(f, np.ascontiguousarray(self._vectors))
+            with open(nodes_path + ".tmp", "w", encoding="utf-8") as f:
+                for i, node_id in enumerate(self._ids):
+                    row = {"id": node_id, "doc_id": self._doc_ids[i], "tokens": tokens[i], "metadata": self._metadata[i]}
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            os.replace(vectors_path + ".tmp", vectors_path)
+            os.replace(nodes_path + ".tmp", nodes_path)
+            self._dirty = False
+
+    # --- Sparse index ---
+
+    def _index_tokens(self, row: int, tokens: List[str]) -> None:
+        for token, tf in Counter(tokens).items():
+            self._postings[token][row] = tf
+        self._doc_lengths.append(len(tokens))
+
+    def _rebuild_sparse_index(self, tokens_by_row: List[List[str]]) -> None:
+        self._postings = defaultdict(dict)
+        self._doc_lengths = []
+        for row, tokens in enumerate(tokens_by_row):
+            self._index_tokens(row, tokens)
+
+    def _tokens_by_row(self) -> List[List[str]]:
+        tokens: List[List[str]] = [[] for _ in self._ids]
+        for token, postings in self._postings.items():
+            for row, tf in postings.items():
+                tokens[row].extend([token] * tf)
+        return tokens
+
+    def _bm25(self, query_str: str) -> np.ndarray:
+        scores = np.zeros(len(self._ids), dtype=np.float32)
+        if not self._ids:
+            return scores
+        lengths = np.asarray(self._doc_lengths, dtype=np.float32)
+        avg_length = float(lengths.mean()) or 1.0
+        n_docs = len(self._ids)
+        for token in set(tokenize(query_str)):
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            rows = np.fromiter(postings.keys(), dtype=np.int64, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=np.float32, count=len(postings))
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[rows] / avg_length)
+            scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    # --- Writes ---
+
+    def _embed(self, nodes: List[BaseNode]) -> np.ndarray:
+        missing = [node for node in nodes if node.embedding is None]
+        if missing:
+            embeddings = embed_texts([node.get_content() for node in missing])
+            for node, embedding in zip(missing, embeddings):
+                node.embedding = embedding
+        return np.asarray([node.embedding for node in nodes], dtype=np.float32).reshape(len(nodes), self.dim)
+
+    def _append(self, nodes: List[BaseNode], vectors: np.ndarray) -> List[str]:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        with self._lock:
+            start = len(self._ids)
+            self._vectors = np.vstack([self._vectors, vectors])
+            for offset, node in enumerate(nodes):
+                metadata = node_to_metadata_dict(node, remove_text=False, flat_metadata=False)
+                self._ids.append(node.node_id)
+                self._doc_ids.append(str(node.metadata.get(self.doc_id_field, "")))
+                self._metadata.append(metadata)
+                self._index_tokens(start + offset, tokenize(node.get_content()))
+            self._dirty = True
+        return [node.node_id for node in nodes]
+
+    def add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        ids = self._append(nodes, self._embed(nodes))
+        if add_kwargs.get("force_flush", False):
+            self.persist()
+        return ids
+
+    async def async_add(self, nodes: List[BaseNode], **add_kwargs: Any) -> List[str]:
+        if not nodes:
+            return []
+        missing = [node for node in nodes if node.embedding is None]
+        if missing:
+            embeddings = await aembed_texts([node.get_content() for node in missing])
+            for node, embedding in zip(missing, embeddings):
+                node.embedding = embedding
+        ids = self._append(nodes, self._embed(nodes))
+        if add_kwargs.get("force_flush", False):
+            await asyncio.to_thread(self.persist)
+        return ids
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: Any) -> None:
+        self.delete_docs([ref_doc_id])
+
+    def delete_docs(self, doc_ids: List[str]) -> None:
+        if self._remove(doc_ids):
+            self.persist()
+
+    def _remove(self, doc_ids: List[str]) -> bool:
+        removed = {str(doc_id) for doc_id in doc_ids}
+        with self._lock:
+            keep = [i for i, doc_id in enumerate(self._doc_ids) if doc_id not in removed]
+            if len(keep) == len(self._ids):
+                return False
+            tokens = self._tokens_by_row()
+            self._vectors = np.asarray(self._vectors[keep], dtype=np.float32)
+            self._ids = [self._ids[i] for i in keep]
+            self._doc_ids = [self._doc_ids[i] for i in keep]
+            self._metadata = [self._metadata[i] for i in keep]
+            self._rebuild_sparse_index([tokens[i] for i in keep])
+            self._dirty = True
+        return True
+
+    def replace_docs(self, nodes_by_doc: Dict[str, List[BaseNode]]) -> List[str]:
+        """Replaces every node of each doc_id with the given ones (an empty list deletes the doc)."""
+        nodes = [node for doc_nodes in nodes_by_doc.values() for node in doc_nodes]
+        vectors = self._embed(nodes) if nodes else None
+        ids: List[str] = []
+        with self._lock:
+            self._remove(list(nodes_by_doc))
+            if nodes:
+                ids = self._append(nodes, vectors)
+        self.persist()
+        return ids
+
+    # --- Reads ---
+
+    def _candidate_mask(self, query: VectorStoreQuery) -> Optional[np.ndarray]:
+        if not (query.filters or query.doc_ids or query.node_ids):
+            return None
+        mask = np.ones(len(self._ids), dtype=bool)
+        if query.doc_ids:
+            wanted = set(map(str, query.doc_ids))
+            mask &= np.fromiter((d in wanted for d in self._doc_ids), dtype=bool, count=len(self._ids))
+        if query.node_ids:
+            wanted = set(query.node_ids)
+            mask &= np.fromiter((i in wanted for i in self._ids), dtype=bool, count=len(self._ids))
+        if query.filters:
+            mask &= np.fromiter((passes_filters(m, query.filters) for m in self._metadata), dtype=bool, count=len(self._ids))
+        return mask
+
+    @staticmethod
+    def _top(scores: np.ndarray, limit: int, mask: Optional[np.ndarray]) -> np.ndarray:
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        limit = min(limit, int(np.isfinite(scores).sum()))
+        if limit <= 0:
+            return np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, limit - 1)[:limit]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    def _dense(self, query: VectorStoreQuery) -> np.ndarray:
+        embedding = np.asarray(query.query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(embedding)
+        return self._vectors @ (embedding / norm if norm else embedding)
+
+    def _legs(
+        self, dense: np.ndarray, sparse: np.ndarray, dense_limit: int, sparse_limit: int, mask: Optional[np.ndarray]
+    ) -> Tuple[List[Hit], List[Hit]]:
+        dense_top = self._top(dense, dense_limit, mask)
+        sparse_top = self._top(sparse, sparse_limit, sparse > 0 if mask is None else mask & (sparse > 0))
+        return (
+            [(int(row), float(dense[row])) for row in dense_top],
+            [(int(row), float(sparse[row])) for row in sparse_top],
+        )
+
+    def search_legs(
+        self, query: VectorStoreQuery, dense_limit: int, sparse_limit: int, mask: Optional[np.ndarray] = None
+    ) -> Tuple[List[Hit], List[Hit]]:
+        """Top rows and raw scores of the dense and BM25 legs, fetched to their own depths."""
+        return self._legs(self._dense(query), self._bm25(query.query_str), dense_limit, sparse_limit, mask)
+
+    def hybrid_search_many(
+        self,
+        query_strs: List[str],
+        query_embeddings: List[List[float]],
+        similarity_top_k: int,
+        fusion: Optional[FusionConfig] = None,
+        **kwargs: Any,
+    ) -> List[VectorStoreQueryResult]:
+        """Hybrid search for N queries; the dense leg is one (rows x N) matrix product."""
+        if not query_strs:
+            return []
+        fusion = fusion or FusionConfig.from_ranker(self.hybrid_ranker, self.hybrid_ranker_params)
+        dense_limit, sparse_limit = fusion.limits(similarity_top_k)
+        with span("local.search_many", kind="vector_search", collection=self.collection_name, top_k=similarity_top_k, queries=len(query_strs)):
+            with self._lock:
+                if not self._ids:
+                    return [VectorStoreQueryResult(nodes=[], similarities=[], ids=[]) for _ in query_strs]
+                embeddings = np.asarray(query_embeddings, dtype=np.float32).reshape(len(query_strs), self.dim)
+                norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                dense_all = self._vectors @ (embeddings / np.where(norms == 0, 1, norms)).T
+
+                results = []
+                for i, query_str in enumerate(query_strs):
+                    dense_hits, sparse_hits = self._legs(dense_all[:, i], self._bm25(query_str), dense_limit, sparse_limit, None)
+                    fused = fuse(dense_hits, sparse_hits, fusion, similarity_top_k)
+                    results.append(VectorStoreQueryResult(
+                        nodes=[self._to_node(row) for row, _ in fused],
+                        similarities=[score for _, score in fused],
+                        ids=[self._ids[row] for row, _ in fused],
+                    ))
+        return results
+
+    async def ahybrid_search_many(self, *args: Any, **kwargs: Any) -> List[VectorStoreQueryResult]:
+        return self.hybrid_search_many(*args, **kwargs)
+
+    def node_keys(self, field: str) -> Dict[int, Any]:
+        """Maps every row (the ids search_legs returns) to one metadata field (e.g. doc_id, sku)."""
+        return {row: metadata.get(field) for row, metadata in enumerate(self._metadata)}
+
+    def _to_node(self, row: int) -> TextNode:
+        node = metadata_dict_to_node(self._metadata[row])
+        node.embedding = None
+        return node
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        limit = query.similarity_top_k
+        with span("local.search", kind="vector_search", collection=self.collection_name, top_k=limit, mode=str(query.mode)):
+            with self._lock:
+                if not self._ids:
+                    return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+                mask = self._candidate_mask(query)
+
+                if query.mode == VectorStoreQueryMode.HYBRID:
+                    fusion = kwargs.get("fusion") or FusionConfig.from_ranker(self.hybrid_ranker, self.hybrid_ranker_params)
+                    dense_hits, sparse_hits = self.search_legs(query, *fusion.limits(limit, query.sparse_top_k), mask=mask)
+                    fused = fuse(dense_hits, sparse_hits, fusion, limit)
+                    rows = [row for row, _ in fused]
+                    scores = [score for _, score in fused]
+                elif query.mode in (VectorStoreQueryMode.SPARSE, VectorStoreQueryMode.TEXT_SEARCH):
+                    sparse = self._bm25(query.query_str)
+                    rows = self._top(sparse, limit, sparse > 0 if mask is None else mask & (sparse > 0))
+                    scores = sparse[rows]
+                else:
+                    dense = self._dense(query)
+                    rows = self._top(dense, limit, mask)
+                    scores = dense[rows]
+
+                nodes = [self._to_node(int(row)) for row in rows]
+                ids = [self._ids[int(row)] for row in rows]
+
+        return VectorStoreQueryResult(nodes=nodes, similarities=[float(s) for s in scores], ids=ids)
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        return self.query(query, **kwargs)
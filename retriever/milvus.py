@@ -1,12 +1,21 @@
+import asyncio
+import json
 import logging
-from typing import Any, List, Optional, Tuple
+import threading
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, ClassVar, Dict, List, Optional, Tuple, Union
 
 import jieba
+from pydantic import Field
 from llama_index.core.schema import TextNode
 from llama_index.core.utils import iter_batch
-from llama_index.core.vector_stores.types import VectorStoreQuery
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryResult
 from llama_index.core.vector_stores.utils import node_to_metadata_dict
 from llama_index.vector_stores.milvus import MilvusVectorStore as MilvusVectorStoreBase
+from llama_index.vector_stores.milvus import base as milvus_base
 from llama_index.vector_stores.milvus.base import MILVUS_ID_FIELD
 from pymilvus import (
     AnnSearchRequest,
@@ -19,7 +28,13 @@ from pymilvus import (
     WeightedRanker,
 )
 
-from retriever.embedding import embedding_model
+from config.env import EMBED_CONCURRENCY, MILVUS_CONSISTENCY_LEVEL
+from retriever.connections import MilvusPool, milvus_pool
+from retriever.embedding_store import aembed_texts, embed_texts
+from retriever.fusion import FusionConfig, Hit, fuse
+from retriever.product_filter import ARM_TYPES
+from retriever.storage import StorageConfig
+from telemetry.tracing import span
 
 logger = logging.getLogger(__name__)
 
@@ -27,29 +42,122 @@ def fakefunction():
     pass
 
 
+# Per-call options ("fusion", "expr") for the duration of one query()/aquery()
+_call_options: ContextVar[Dict[str, Any]] = ContextVar("call_options", default={})
+# StorageConfig of the store being constructed; the base __init__ builds the schema before ours can set fields
+_init_storage: ContextVar[Optional[StorageConfig]] = ContextVar("init_storage", default=None)
+
+
+def _storage_for_init() -> StorageConfig:
+    return _init_storage.get() or StorageConfig.from_env()
+
+
+_base_init_lock = threading.Lock()
+
+
+@contextmanager
+def _pooled_base_clients(pool: MilvusPool):
+    """While the base store initializes, hand it the shared pool instead of opening its own clients."""
+    with _base_init_lock:
+        originals = milvus_base.MilvusClient, milvus_base.AsyncMilvusClient
+        milvus_base.MilvusClient = lambda *args, **kwargs: pool.sync
+        milvus_base.AsyncMilvusClient = lambda *args, **kwargs: pool.aio
+        try:
+            yield
+        finally:
+            milvus_base.MilvusClient, milvus_base.AsyncMilvusClient = originals
+
+
+def and_exprs(*exprs: Optional[str]) -> str:
+    parts = [e for e in exprs if e]
+    if len(parts) <= 1:
+        return parts[0] if parts else ""
+    return " and ".join(f"({e})" for e in parts)
+
+
+@dataclass(frozen=True)
+class ScalarField:
+    """A typed, indexed scalar column added to the collection schema next to the dynamic metadata."""
+    name: str
+    datatype: DataType
+    index_type: str
+    params: Dict[str, Any] = field(default_factory=dict)
+    allowed: Optional[Tuple[str, ...]] = None  # enum-like VARCHAR values, enforced on insert
+
+
+PRODUCT_SCALAR_FIELDS = [
+    ScalarField("arm_type", DataType.VARCHAR, "INVERTED", {"max_length": 64}, allowed=ARM_TYPES),
+    ScalarField("size_max_inch", DataType.INT64, "STL_SORT"),
+    ScalarField("weight_min_kg", DataType.FLOAT, "STL_SORT"),
+    ScalarField("weight_max_kg", DataType.FLOAT, "STL_SORT"),
+    ScalarField("desk_min_mm", DataType.FLOAT, "STL_SORT"),
+    ScalarField("desk_max_mm", DataType.FLOAT, "STL_SORT"),
+    ScalarField(
+        "vesa_patterns",
+        DataType.ARRAY,
+        "INVERTED",
+        {"element_type": DataType.VARCHAR, "max_capacity": 8, "max_length": 16},
+    ),
+]
+
+
+_embed_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _embed_semaphore() -> asyncio.Semaphore:
+    """Caps concurrent async embedding requests process-wide (one semaphore per event loop)."""
+    loop = asyncio.get_running_loop()
+    if loop not in _embed_slots:
+        _embed_slots[loop] = asyncio.Semaphore(EMBED_CONCURRENCY)
+    return _embed_slots[loop]
+
+
+def jieba_text(text: str) -> str:
+    """Space-joined jieba tokens, the form the BM25 analyzer of the text field expects."""
+    tokenized_query = jieba.cut(text)
+    filtered_query = [token for token in tokenized_query if token.strip() != ""]
+    return " ".join(filtered_query)
+
+
 class CustomMilvusVector(MilvusVectorStoreBase):
     text_field: str = "text"
     sparse_function_name: str = "text_bm25"
     doc_id_field: str = "doc_id"
+    scalar_fields: ClassVar[List[ScalarField]] = []
+    storage: StorageConfig = Field(default_factory=_storage_for_init)
 
     def __init__(
         self,
         uri: str,
         collection_name: str,
         dim: Optional[int] = None,
+        storage: Optional[StorageConfig] = None,
     ) -> None:
-        super().__init__(
-            collection_name=collection_name,
-            dim=dim,
-            uri=uri,
-            enable_sparse=True,
-        )
+        storage = storage or StorageConfig.from_env()
+        token = _init_storage.set(storage)
+        try:
+            with _pooled_base_clients(milvus_pool(uri)):
+                super().__init__(
+                    collection_name=collection_name,
+                    dim=storage.stored_dim(dim) if dim else dim,
+                    uri=uri,
+                    enable_sparse=True,
+                    index_config=storage.index_config(),
+                    search_config=storage.preset.search_params,
+                    consistency_level=MILVUS_CONSISTENCY_LEVEL,
+                )
+        finally:
+            _init_storage.reset(token)
+
+    @property
+    def dense_metric(self) -> str:
+        return self.storage.metric(self.similarity_metric)
 
     @property
     def dimension(self):
-        for field in self._collection.schema.fields:
-            if field.name == "embedding":
-                return field.params["dim"]
+        for schema_field in self._collection.schema.fields:
+            if schema_field.name == "embedding":
+                return schema_field.params["dim"]
         return None
 
     def _create_hybrid_index(self, collection_name: str) -> None:
@@ -70,7 +178,7 @@ class CustomMilvusVector(MilvusVectorStoreBase):
             )
             schema.add_field(
                 field_name=self.embedding_field,
-                datatype=DataType.FLOAT_VECTOR,
+                datatype=self.storage.datatype,
                 dim=self.dim,
             )
             schema.add_field(
@@ -83,6 +191,8 @@ class CustomMilvusVector(MilvusVectorStoreBase):
                 max_length=65535,
                 enable_analyzer=True,
             )
+            for scalar in self.scalar_fields:
+                schema.add_field(field_name=scalar.name, datatype=scalar.datatype, nullable=True, **scalar.params)
 
             bm25_function = Function(
                 name=self.sparse_function_name,
@@ -93,10 +203,16 @@ class CustomMilvusVector(MilvusVectorStoreBase):
 
             schema.add_function(bm25_function)
             self.client.create_collection(
-                collection_name=collection_name, schema=schema
+                collection_name=collection_name, schema=schema, consistency_level=self.consistency_level
             )
 
         self._collection = Collection(collection_name, using=self.client._using)
+        stored_type = next((f.dtype for f in self._collection.schema.fields if f.name == self.embedding_field), None)
+        if stored_type is not None and stored_type != self.storage.datatype:
+            raise ValueError(
+                f"Collection '{collection_name}' stores {stored_type.name}, but VECTOR_STORAGE is "
+                f"'{self.storage.spec}'. Drop and re-seed the collection to change its storage."
+            )
 
         dense_index_exists = self._collection.has_index(index_name=self.embedding_field)
         sparse_index_exists = self._collection.has_index(
@@ -116,7 +232,7 @@ class CustomMilvusVector(MilvusVectorStoreBase):
         index_type = base_params.pop("index_type", "FLAT")
         dense_index = {
             "params": base_params,
-            "metric_type": self.similarity_metric,
+            "metric_type": self.dense_metric,
             "index_type": index_type,
         }
         self._collection.create_index(self.embedding_field, dense_index)
@@ -133,95 +249,200 @@ class CustomMilvusVector(MilvusVectorStoreBase):
             },
         }
         self._collection.create_index(self.sparse_embedding_field, sparse_index)
+        self._create_scalar_indexes()
         self._collection.load()
 
+    def _create_scalar_indexes(self) -> None:
+        existing = {f.name for f in self._collection.schema.fields}
+        for scalar in self.scalar_fields:
+            if scalar.name not in existing:
+                logger.warning(
+                    f"Collection '{self.collection_name}' predates scalar field '{scalar.name}'; "
+                    f"drop and re-seed it to enable filtered search on it."
+                )
+                continue
+            if not self._collection.has_index(index_name=scalar.name):
+                self._collection.create_index(scalar.name, {"index_type": scalar.index_type}, index_name=scalar.name)
+
+    def _fill_scalars(self, entry: Dict[str, Any]) -> None:
+        """Casts the typed columns from node metadata; missing values are stored as null."""
+        for scalar in self.scalar_fields:
+            value = entry.get(scalar.name)
+            if value is None or value == "" or value == []:
+                entry[scalar.name] = None
+                continue
+            if scalar.allowed is not None and value not in scalar.allowed:
+                raise ValueError(f"Invalid {scalar.name} '{value}', expected one of {scalar.allowed}")
+            if scalar.datatype == DataType.INT64:
+                value = int(value)
+            elif scalar.datatype == DataType.FLOAT:
+                value = float(value)
+            elif scalar.datatype == DataType.ARRAY:
+                value = [str(v) for v in value]
+            entry[scalar.name] = value
+
     def do_jieba(self, text: str) -> str:
-        tokenized_query = jieba.cut(text)
-        filtered_query = [token for token in tokenized_query if token.strip() != ""]
-        text = " ".join(filtered_query)
-        return text
+        return jieba_text(text)
 
-    def add(self, nodes: List[TextNode], **add_kwargs: Any) -> List[str]:
-        insert_list = []
-        insert_ids = []
+    def do_jieba_batch(self, texts: List[str]) -> List[str]:
+        return [self.do_jieba(text) for text in texts]
 
-        for node in nodes:
+    def _entries(self, nodes: List[TextNode], tokenized: List[Optional[str]]) -> List[Dict[str, Any]]:
+        """Insert rows for already-embedded nodes; jieba runs here unless the BM25 text was pre-tokenized."""
+        entries = []
+        for node, tokens in zip(nodes, tokenized):
             entry = node_to_metadata_dict(node)
             entry[MILVUS_ID_FIELD] = node.node_id
-            entry[self.embedding_field] = embedding_model.get_text_embedding(node.text)
-            entry[self.text_field] = self.do_jieba(node.text)
+            entry[self.embedding_field] = self.storage.encode(node.embedding)
+            entry[self.text_field] = tokens if tokens is not None else self.do_jieba(node.text)
             entry[self.doc_id_field] = str(node.metadata.get("doc_id", ""))
+            self._fill_scalars(entry)
+            entries.append(entry)
+        return entries
+
+    def add(self, nodes: List[TextNode], **add_kwargs: Any) -> List[str]:
+        # Pre-tokenized BM25 text (e.g. from ingestion workers), aligned with nodes
+        tokenized = add_kwargs.get("tokenized") or [None] * len(nodes)
 
-            insert_ids.append(node.node_id)
-            insert_list.append(entry)
+        # One embedding call for the whole batch; nodes that arrive embedded are kept as they are
+        missing = [node for node in nodes if node.embedding is None]
+        if missing:
+            for node, embedding in zip(missing, embed_texts([node.text for node in missing])):
+                node.embedding = embedding
 
-        for insert_batch in iter_batch(insert_list, self.batch_size):
+        for insert_batch in iter_batch(self._entries(nodes, tokenized), self.batch_size):
             self.client.insert(self.collection_name, insert_batch)
 
         if add_kwargs.get("force_flush", False):
             self.client.flush(self.collection_name)
 
-        return insert_ids
+        return [node.node_id for node in nodes]
 
     async def async_add(self, nodes: List[TextNode], **add_kwargs: Any) -> List[str]:
-        insert_list = []
-        insert_ids = []
-
-        for node in nodes:
-            entry = node_to_metadata_dict(node)
-            entry[MILVUS_ID_FIELD] = node.node_id
-            entry[self.embedding_field] = node.embedding
-            entry[self.text_field] = self.do_jieba(node.text)
-            entry[self.doc_id_field] = node.metadata.get("doc_id", "")
-
-            insert_ids.append(node.node_id)
-            insert_list.append(entry)
-
-        for insert_batch in iter_batch(insert_list, self.batch_size):
-            await self.aclient.insert(self.collection_name, insert_batch)
+        """
+        Embeds and inserts `batch_size` batches concurrently: embedding calls are
+        capped by EMBED_CONCURRENCY across the process, and each batch is inserted
+        as soon as its own embeddings arrive, overlapping with the others' calls.
+        """
+        tokenized = add_kwargs.get("tokenized") or [None] * len(nodes)
+
+        async def write(batch: List[TextNode], tokens: List[Optional[str]]) -> None:
+            missing = [node for node in batch if node.embedding is None]
+            if missing:
+                async with _embed_semaphore():
+                    embeddings = await aembed_texts([node.text for node in missing])
+                for node, embedding in zip(missing, embeddings):
+                    node.embedding = embedding
+            # jieba is CPU-bound; keep it off the event loop that serves chat traffic
+            entries = await asyncio.to_thread(self._entries, batch, tokens)
+            await self.aclient.insert(self.collection_name, entries)
+
+        await asyncio.gather(*(
+            write(batch, tokens)
+            for batch, tokens in zip(iter_batch(nodes, self.batch_size), iter_batch(tokenized, self.batch_size))
+        ))
 
         if add_kwargs.get("force_flush", False):
-            raise NotImplementedError("force flush is not supported in async mode")
-
-        return insert_ids
+            # AsyncMilvusClient has no flush
+            await asyncio.to_thread(self.client.flush, self.collection_name)
+
+        return [node.node_id for node in nodes]
+
+    def _doc_expr(self, doc_ids: List[str]) -> str:
+        return f"{self.doc_id_field} in {json.dumps([str(d) for d in doc_ids])}"
+
+    def delete_docs(self, doc_ids: List[str]) -> None:
+        if doc_ids:
+            self.client.delete(self.collection_name, filter=self._doc_expr(doc_ids))
+
+    def replace_docs(self, nodes_by_doc: Dict[str, List[TextNode]], **add_kwargs: Any) -> List[str]:
+        """
+        Replaces every node of each doc_id with the given ones (an empty list
+        deletes the doc). New nodes are upserted by primary key first, then the
+        doc's leftover nodes are deleted, so a doc is never missing from search.
+        """
+        nodes = [node for doc_nodes in nodes_by_doc.values() for node in doc_nodes]
+        missing = [node for node in nodes if node.embedding is None]
+        if missing:
+            for node, embedding in zip(missing, embed_texts([node.text for node in missing])):
+                node.embedding = embedding
+        for batch in iter_batch(self._entries(nodes, [None] * len(nodes)), self.batch_size):
+            self.client.upsert(self.collection_name, batch)
+
+        stale = self._doc_expr(list(nodes_by_doc))
+        if nodes:
+            stale += f" and {MILVUS_ID_FIELD} not in {json.dumps([node.node_id for node in nodes])}"
+        self.client.delete(self.collection_name, filter=stale)
 
-    def _hybrid_search(
-        self, query: VectorStoreQuery, string_expr: str, output_fields: List[str]
-    ) -> Tuple[List[TextNode], List[float], List[str]]:
+        if add_kwargs.get("force_flush", False):
+            self.client.flush(self.collection_name)
+        return [node.node_id for node in nodes]
+
+    def query(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        # The base class does not forward kwargs to _hybrid_search, so the per-call
+        # FusionConfig and filter expr travel through a ContextVar for the duration of the call.
+        token = _call_options.set({"fusion": kwargs.pop("fusion", None), "expr": kwargs.pop("expr", None)})
+        try:
+            return super().query(query, **kwargs)
+        finally:
+            _call_options.reset(token)
+
+    async def aquery(self, query: VectorStoreQuery, **kwargs: Any) -> VectorStoreQueryResult:
+        token = _call_options.set({"fusion": kwargs.pop("fusion", None), "expr": kwargs.pop("expr", None)})
+        try:
+            return await super().aquery(query, **kwargs)
+        finally:
+            _call_options.reset(token)
+
+    def _fusion_for_call(self) -> FusionConfig:
+        return _call_options.get().get("fusion") or FusionConfig.from_ranker(self.hybrid_ranker, self.hybrid_ranker_params)
+
+    def _hybrid_requests(
+        self,
+        query_embeddings: List[List[float]],
+        query_strs: List[str],
+        dense_limit: int,
+        sparse_limit: int,
+        string_expr: str,
+    ) -> List[AnnSearchRequest]:
+        # One request per leg; each carries all nq queries
+        dense_req = AnnSearchRequest(
+            data=self.storage.encode_batch(query_embeddings),
+            anns_field=self.embedding_field,
+            param={"metric_type": self.dense_metric, "params": self.search_config},
+            limit=dense_limit,
+            expr=string_expr,
+        )
         sparse_req = AnnSearchRequest(
-            data=[self.do_jieba(query.query_str)],
+            data=self.do_jieba_batch(query_strs),
             anns_field=self.sparse_embedding_field,
             param={"metric_type": "BM25"},
-            limit=query.similarity_top_k,
+            limit=sparse_limit,
             expr=string_expr,
         )
+        return [dense_req, sparse_req]
 
-        dense_req = AnnSearchRequest(
-            data=[query.query_embedding],
-            anns_field=self.embedding_field,
-            param={"metric_type": self.similarity_metric, "params": self.search_config},
-            limit=query.similarity_top_k,
-            expr=string_expr,
-        )
+    def _single_requests(self, query: VectorStoreQuery, string_expr: str, fusion: FusionConfig) -> List[AnnSearchRequest]:
+        dense_limit, sparse_limit = fusion.limits(query.similarity_top_k, query.sparse_top_k)
+        expr = and_exprs(string_expr, _call_options.get().get("expr"))
+        return self._hybrid_requests([query.query_embedding], [query.query_str], dense_limit, sparse_limit, expr)
 
-        if self.hybrid_ranker == "WeightedRanker":
-            if self.hybrid_ranker_params == {}:
-                self.hybrid_ranker_params = {"weights": [1.0, 1.0]}
-            ranker = WeightedRanker(*self.hybrid_ranker_params["weights"])
-        elif self.hybrid_ranker == "RRFRanker":
-            if self.hybrid_ranker_params == {}:
-                self.hybrid_ranker_params = {"k": 60}
-            ranker = RRFRanker(self.hybrid_ranker_params["k"])
-        else:
-            raise ValueError(f"Unsupported ranker: {self.hybrid_ranker}")
-
-        res = self.client.hybrid_search(
-            self.collection_name,
-            [dense_req, sparse_req],
-            ranker=ranker,
-            limit=query.similarity_top_k,
-            output_fields=output_fields,
-        )
+    def _hybrid_search(
+        self, query: VectorStoreQuery, string_expr: str, output_fields: List[str], **kwargs: Any
+    ) -> Tuple[List[TextNode], List[float], List[str]]:
+        fusion = kwargs.get("fusion") or self._fusion_for_call()
+        if self.storage.is_binary:
+            expr = and_exprs(string_expr, _call_options.get().get("expr"))
+            res = self._rescored_hybrid_search([query.query_embedding], [query.query_str], query.similarity_top_k, fusion, expr, output_fields)
+            return self._parse_from_milvus_results(res)
+        with span("milvus.hybrid_search", kind="vector_search", collection=self.collection_name, top_k=query.similarity_top_k, ranker=fusion.ranker):
+            res = self.client.hybrid_search(
+                self.collection_name,
+                self._single_requests(query, string_expr, fusion),
+                ranker=to_milvus_ranker(fusion),
+                limit=query.similarity_top_k,
+                output_fields=output_fields,
+            )
 
         nodes, similarities, ids = self._parse_from_milvus_results(res)
 
@@ -234,41 +455,227 @@ class CustomMilvusVector(MilvusVectorStoreBase):
         output_fields: List[str],
         **kwargs,
     ) -> Tuple[List[TextNode], List[float], List[str]]:
-        sparse_req = AnnSearchRequest(
-            data=[query.query_str],
+        fusion = kwargs.get("fusion") or self._fusion_for_call()
+        if self.storage.is_binary:
+            expr = and_exprs(string_expr, _call_options.get().get("expr"))
+            res = await self._arescored_hybrid_search([query.query_embedding], [query.query_str], query.similarity_top_k, fusion, expr, output_fields)
+            return self._parse_from_milvus_results(res)
+        with span("milvus.ahybrid_search", kind="vector_search", collection=self.collection_name, top_k=query.similarity_top_k, ranker=fusion.ranker):
+            res = await self.aclient.hybrid_search(
+                self.collection_name,
+                self._single_requests(query, string_expr, fusion),
+                ranker=to_milvus_ranker(fusion),
+                limit=query.similarity_top_k,
+                output_fields=output_fields,
+            )
+
+        nodes, similarities, ids = self._parse_from_milvus_results(res)
+        return nodes, similarities, ids
+
+    # --- Binary storage: Hamming search, full-precision rescoring, client-side fusion ---
+
+    def _leg_searches(
+        self,
+        query_embeddings: List[List[float]],
+        query_strs: List[str],
+        dense_limit: int,
+        sparse_limit: int,
+        string_expr: str,
+        output_fields: List[str],
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        dense = dict(
+            data=self.storage.encode_batch(query_embeddings),
+            anns_field=self.embedding_field,
+            search_params={"metric_type": self.dense_metric, "params": self.search_config},
+            limit=dense_limit * self.storage.rescore_factor,
+            filter=string_expr,
+            output_fields=list(output_fields) + [self.embedding_field],
+        )
+        sparse = dict(
+            data=self.do_jieba_batch(query_strs),
             anns_field=self.sparse_embedding_field,
-            param={"metric_type": "BM25"},
-            limit=query.similarity_top_k,
-            expr=string_expr,
+            search_params={"metric_type": "BM25"},
+            limit=sparse_limit,
+            filter=string_expr,
+            output_fields=list(output_fields),
         )
+        return dense, sparse
 
-        dense_req = AnnSearchRequest(
-            data=[query.query_embedding],
+    def _rescore_and_fuse(
+        self,
+        query_embeddings: List[List[float]],
+        dense_res: Any,
+        sparse_res: Any,
+        top_k: int,
+        fusion: FusionConfig,
+    ) -> List[List[Dict[str, Any]]]:
+        """Re-ranks the over-fetched Hamming hits by asymmetric score, cuts them to the dense depth and fuses."""
+        dense_limit, _ = fusion.limits(top_k)
+        results = []
+        for embedding, dense_hits, sparse_hits in zip(query_embeddings, dense_res, sparse_res):
+            entities = {hit["id"]: hit["entity"] for hit in list(dense_hits) + list(sparse_hits)}
+            scores = self.storage.rescore(embedding, [hit["entity"][self.embedding_field] for hit in dense_hits])
+            dense = sorted(zip([hit["id"] for hit in dense_hits], scores), key=lambda h: h[1], reverse=True)[:dense_limit]
+            sparse = [(hit["id"], hit["distance"]) for hit in sparse_hits]
+            results.append([
+                {
+                    "id": hit_id,
+                    "distance": score,
+                    "entity": {k: v for k, v in entities[hit_id].items() if k != self.embedding_field},
+                }
+                for hit_id, score in fuse(dense, sparse, fusion, top_k, dense_metric="IP")
+            ])
+        return results
+
+    def _rescored_hybrid_search(
+        self,
+        query_embeddings: List[List[float]],
+        query_strs: List[str],
+        top_k: int,
+        fusion: FusionConfig,
+        string_expr: str,
+        output_fields: List[str],
+    ) -> List[List[Dict[str, Any]]]:
+        dense, sparse = self._leg_searches(query_embeddings, query_strs, *fusion.limits(top_k), string_expr, output_fields)
+        with span("milvus.rescored_search", kind="vector_search", collection=self.collection_name, top_k=top_k, queries=len(query_strs)):
+            dense_res = self.client.search(self.collection_name, **dense)
+            sparse_res = self.client.search(self.collection_name, **sparse)
+            return self._rescore_and_fuse(query_embeddings, dense_res, sparse_res, top_k, fusion)
+
+    async def _arescored_hybrid_search(
+        self,
+        query_embeddings: List[List[float]],
+        query_strs: List[str],
+        top_k: int,
+        fusion: FusionConfig,
+        string_expr: str,
+        output_fields: List[str],
+    ) -> List[List[Dict[str, Any]]]:
+        dense, sparse = self._leg_searches(query_embeddings, query_strs, *fusion.limits(top_k), string_expr, output_fields)
+        with span("milvus.arescored_search", kind="vector_search", collection=self.collection_name, top_k=top_k, queries=len(query_strs)):
+            dense_res, sparse_res = await asyncio.gather(
+                self.aclient.search(self.collection_name, **dense),
+                self.aclient.search(self.collection_name, **sparse),
+            )
+            return self._rescore_and_fuse(query_embeddings, dense_res, sparse_res, top_k, fusion)
+
+    def dense_search_many(
+        self, query_embeddings: List[List[float]], limit: int, string_expr: str = ""
+    ) -> List[List[Hit]]:
+        """Dense leg only, (id, score) per query; binary storage is rescored. Used by bench.storage."""
+        if not self.storage.is_binary:
+            res = self.client.search(
+                self.collection_name,
+                data=self.storage.encode_batch(query_embeddings),
+                anns_field=self.embedding_field,
+                search_params={"metric_type": self.dense_metric, "params": self.search_config},
+                limit=limit,
+                filter=string_expr,
+            )
+            return [[(hit["id"], hit["distance"]) for hit in hits] for hits in res]
+
+        dense, _ = self._leg_searches(query_embeddings, [], limit, limit, string_expr, [])
+        res = self.client.search(self.collection_name, **dense)
+        results = []
+        for embedding, hits in zip(query_embeddings, res):
+            scores = self.storage.rescore(embedding, [hit["entity"][self.embedding_field] for hit in hits])
+            results.append(sorted(zip([hit["id"] for hit in hits], scores), key=lambda h: h[1], reverse=True)[:limit])
+        return results
+
+    def _to_query_result(self, hits: Any) -> VectorStoreQueryResult:
+        nodes, similarities, ids = self._parse_from_milvus_results([hits])
+        return VectorStoreQueryResult(nodes=nodes, similarities=similarities, ids=ids)
+
+    def hybrid_search_many(
+        self,
+        query_strs: List[str],
+        query_embeddings: List[List[float]],
+        similarity_top_k: int,
+        fusion: Optional[FusionConfig] = None,
+        string_expr: str = "",
+        output_fields: Optional[List[str]] = None,
+    ) -> List[VectorStoreQueryResult]:
+        """Hybrid search for N queries in a single hybrid_search round trip; one result per query, in order."""
+        if not query_strs:
+            return []
+        fusion = fusion or FusionConfig.from_ranker(self.hybrid_ranker, self.hybrid_ranker_params)
+        if self.storage.is_binary:
+            res = self._rescored_hybrid_search(query_embeddings, query_strs, similarity_top_k, fusion, string_expr, output_fields or ["*"])
+            return [self._to_query_result(hits) for hits in res]
+        dense_limit, sparse_limit = fusion.limits(similarity_top_k)
+        with span("milvus.hybrid_search_many", kind="vector_search", collection=self.collection_name, top_k=similarity_top_k, queries=len(query_strs)):
+            res = self.client.hybrid_search(
+                self.collection_name,
+                self._hybrid_requests(query_embeddings, query_strs, dense_limit, sparse_limit, string_expr),
+                ranker=to_milvus_ranker(fusion),
+                limit=similarity_top_k,
+                output_fields=output_fields or ["*"],
+            )
+        return [self._to_query_result(hits) for hits in res]
+
+    async def ahybrid_search_many(
+        self,
+        query_strs: List[str],
+        query_embeddings: List[List[float]],
+        similarity_top_k: int,
+        fusion: Optional[FusionConfig] = None,
+        string_expr: str = "",
+        output_fields: Optional[List[str]] = None,
+    ) -> List[VectorStoreQueryResult]:
+        if not query_strs:
+            return []
+        fusion = fusion or FusionConfig.from_ranker(self.hybrid_ranker, self.hybrid_ranker_params)
+        if self.storage.is_binary:
+            res = await self._arescored_hybrid_search(query_embeddings, query_strs, similarity_top_k, fusion, string_expr, output_fields or ["*"])
+            return [self._to_query_result(hits) for hits in res]
+        dense_limit, sparse_limit = fusion.limits(similarity_top_k)
+        with span("milvus.ahybrid_search_many", kind="vector_search", collection=self.collection_name, top_k=similarity_top_k, queries=len(query_strs)):
+            res = await self.aclient.hybrid_search(
+                self.collection_name,
+                self._hybrid_requests(query_embeddings, query_strs, dense_limit, sparse_limit, string_expr),
+                ranker=to_milvus_ranker(fusion),
+                limit=similarity_top_k,
+                output_fields=output_fields or ["*"],
+            )
+        return [self._to_query_result(hits) for hits in res]
+
+    def search_legs(
+        self, query: VectorStoreQuery, dense_limit: int, sparse_limit: int, string_expr: str = ""
+    ) -> Tuple[List[Hit], List[Hit]]:
+        """Raw (id, score) candidates of each leg, unfused; used to tune FusionConfigs offline."""
+        dense_res = self.client.search(
+            self.collection_name,
+            data=[self.storage.encode(query.query_embedding)],
             anns_field=self.embedding_field,
-            param={"metric_type": self.similarity_metric, "params": self.search_config},
-            limit=query.similarity_top_k,
-            expr=string_expr,
+            search_params={"metric_type": self.dense_metric, "params": self.search_config},
+            limit=dense_limit,
+            filter=string_expr,
         )
-
-        if self.hybrid_ranker == "WeightedRanker":
-            if self.hybrid_ranker_params == {}:
-                self.hybrid_ranker_params = {"weights": [1.0, 1.0]}
-            ranker = WeightedRanker(*self.hybrid_ranker_params["weights"])
-        elif self.hybrid_ranker == "RRFRanker":
-            if self.hybrid_ranker_params == {}:
-                self.hybrid_ranker_params = {"k": 60}
-            ranker = RRFRanker(self.hybrid_ranker_params["k"])
-        else:
-            raise ValueError(f"Unsupported ranker: {self.hybrid_ranker}")
-
-        res = await self.aclient.hybrid_search(
+        sparse_res = self.client.search(
             self.collection_name,
-            [dense_req, sparse_req],
-            ranker=ranker,
-            limit=query.similarity_top_k,
-            output_fields=output_fields,
+            data=[self.do_jieba(query.query_str)],
+            anns_field=self.sparse_embedding_field,
+            search_params={"metric_type": "BM25"},
+            limit=sparse_limit,
+            filter=string_expr,
+        )
+        return (
+            [(hit["id"], hit["distance"]) for hit in dense_res[0]],
+            [(hit["id"], hit["distance"]) for hit in sparse_res[0]],
         )
 
-        nodes, similarities, ids = self._parse_from_milvus_results(res)
-        return nodes, similarities, ids
+    def node_keys(self, field: str) -> Dict[str, Any]:
+        """Maps every primary key to one stored field (e.g. doc_id, sku)."""
+        rows = self.client.query(self.collection_name, filter=f'{MILVUS_ID_FIELD} != ""', output_fields=[field])
+        return {row[MILVUS_ID_FIELD]: row.get(field) for row in rows}
+
+
+class CustomMilvusProductVector(CustomMilvusVector):
+    """Product collection: adds typed, indexed spec columns so product filters run inside the ANN search."""
+    scalar_fields: ClassVar[List[ScalarField]] = PRODUCT_SCALAR_FIELDS
+
 
+def to_milvus_ranker(fusion: FusionConfig) -> Union[RRFRanker, WeightedRanker]:
+    if fusion.ranker == "WeightedRanker":
+        return WeightedRanker(*fusion.weights)
+    return RRFRanker(fusion.k)
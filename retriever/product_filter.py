@@ -0,0 +1,107 @@
+import json
+from dataclasses import dataclass, fields
+from typing import Any, Dict, List, Optional, Union
+
+from llama_index.core.vector_stores.types import FilterCondition, FilterOperator, MetadataFilter, MetadataFilters
+
+# Typed product metadata written by seed_products_db and filtered on here
+PRODUCT_FILTER_FIELDS = [
+    "arm_type",
+    "size_max_inch",
+    "weight_min_kg",
+    "weight_max_kg",
+    "desk_min_mm",
+    "desk_max_mm",
+    "vesa_patterns",
+]
+
+# Allowed values of the arm_type column (Milvus has no enum type, so they are checked on insert)
+ARM_TYPES = (
+    "accessory",
+    "dual_gas_spring",
+    "single_heavy_gas_spring",
+    "single_mechanical",
+    "wall_mount",
+)
+
+# Accessories have no size limit of their own, so they pass the size filter
+SIZE_EXEMPT_ARM_TYPE = "accessory"
+
+
+@dataclass(frozen=True)
+class ProductFilter:
+    """Structured product constraints, pushed into the vector query as metadata filters."""
+    size_inch: Optional[int] = None
+    weight_kg: Optional[float] = None
+    arm_type: Optional[str] = None
+    vesa: Optional[str] = None
+    desk_thickness_mm: Optional[int] = None
+
+    def __bool__(self) -> bool:
+        return any(getattr(self, f.name) is not None for f in fields(self))
+
+    @classmethod
+    def from_entities(cls, entities: Any) -> "ProductFilter":
+        """Builds the filter from agent.schemas.ExtractedEntities (or any object with the same fields)."""
+        return cls(**{f.name: getattr(entities, f.name, None) for f in fields(cls)})
+
+    def to_milvus_expr(self) -> str:
+        """
+        Same predicate as `to_metadata_filters`, as a boolean expression over
+        the product collection's typed scalar fields (see retriever.milvus.PRODUCT_SCALAR_FIELDS).
+        """
+        clauses = []
+        if self.arm_type:
+            clauses.append(f"arm_type == {json.dumps(self.arm_type)}")
+        if self.size_inch:
+            clauses.append(f"(size_max_inch >= {int(self.size_inch)} or arm_type == {json.dumps(SIZE_EXEMPT_ARM_TYPE)})")
+        if self.weight_kg:
+            clauses.append(f"weight_min_kg <= {float(self.weight_kg)} and weight_max_kg >= {float(self.weight_kg)}")
+        if self.vesa:
+            clauses.append(f"array_contains(vesa_patterns, {json.dumps(self.vesa)})")
+        if self.desk_thickness_mm:
+            clauses.append(f"desk_min_mm <= {float(self.desk_thickness_mm)} and desk_max_mm >= {float(self.desk_thickness_mm)}")
+        return " and ".join(clauses)
+
+    def to_metadata_filters(self) -> Optional[MetadataFilters]:
+        if not self:
+            return None
+        filters: List[Union[MetadataFilter, MetadataFilters]] = []
+        if self.arm_type:
+            filters.append(MetadataFilter(key="arm_type", operator=FilterOperator.EQ, value=self.arm_type))
+        if self.size_inch:
+            filters.append(MetadataFilters(
+                filters=[
+                    MetadataFilter(key="size_max_inch", operator=FilterOperator.GTE, value=self.size_inch),
+                    MetadataFilter(key="arm_type", operator=FilterOperator.EQ, value=SIZE_EXEMPT_ARM_TYPE),
+                ],
+                condition=FilterCondition.OR,
+            ))
+        if self.weight_kg:
+            filters.append(MetadataFilter(key="weight_min_kg", operator=FilterOperator.LTE, value=self.weight_kg))
+            filters.append(MetadataFilter(key="weight_max_kg", operator=FilterOperator.GTE, value=self.weight_kg))
+        if self.vesa:
+            filters.append(MetadataFilter(key="vesa_patterns", operator=FilterOperator.CONTAINS, value=self.vesa))
+        if self.desk_thickness_mm:
+            filters.append(MetadataFilter(key="desk_min_mm", operator=FilterOperator.LTE, value=self.desk_thickness_mm))
+            filters.append(MetadataFilter(key="desk_max_mm", operator=FilterOperator.GTE, value=self.desk_thickness_mm))
+        return MetadataFilters(filters=filters, condition=FilterCondition.AND)
+
+    def matches(self, record: Dict[str, Any]) -> bool:
+        """Same predicate as `to_metadata_filters`, for records already in memory (see document.data.product_catalog)."""
+        def between(low_key: str, high_key: str, value: float) -> bool:
+            low, high = record.get(low_key), record.get(high_key)
+            return low is not None and high is not None and low <= value <= high
+
+        if self.arm_type and record.get("arm_type") != self.arm_type:
+            return False
+        if self.size_inch and record.get("arm_type") != SIZE_EXEMPT_ARM_TYPE:
+            if record.get("size_max_inch") is None or record["size_max_inch"] < self.size_inch:
+                return False
+        if self.weight_kg and not between("weight_min_kg", "weight_max_kg", self.weight_kg):
+            return False
+        if self.vesa and self.vesa not in (record.get("vesa_patterns") or []):
+            return False
+        if self.desk_thickness_mm and not between("desk_min_mm", "desk_max_mm", self.desk_thickness_mm):
+            return False
+        return True
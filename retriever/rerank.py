@@ -0,0 +1,166 @@
+import logging
+import math
+import threading
+from collections import Counter, OrderedDict
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+from llama_index.core.schema import NodeWithScore
+
+from config.env import RERANKER, RERANK_MODEL, RERANK_CACHE_SIZE
+from retriever.local import tokenize
+from telemetry.tracing import span
+
+logger = logging.getLogger(__name__)
+
+
+class Scorer:
+    """Scores (query, passage) pairs; higher is more relevant."""
+    name: str = "scorer"
+    # False when a passage's score also depends on the other passages scored with it
+    pairwise: bool = True
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        raise NotImplementedError
+
+
+class LexicalScorer(Scorer):
+    """
+    BM25 over the candidate set itself, with a bonus for covering more of the
+    distinct query tokens. No model, no network; cheap enough to always run.
+    """
+    name = "lexical"
+    # idf and the average length come from the candidate set, so scores are not cacheable per node
+    pairwise = False
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        query_tokens = set(tokenize(query))
+        docs = [Counter(tokenize(p)) for p in passages]
+        if not query_tokens or not docs:
+            return [0.0] * len(passages)
+        avg_length = sum(sum(d.values()) for d in docs) / len(docs) or 1.0
+        df = {t: sum(1 for d in docs if t in d) for t in query_tokens}
+
+        scores = []
+        for doc in docs:
+            length = sum(doc.values())
+            bm25 = 0.0
+            for token in query_tokens:
+                tf = doc.get(token, 0)
+                if not tf:
+                    continue
+                idf = math.log(1 + (len(docs) - df[token] + 0.5) / (df[token] + 0.5))
+                bm25 += idf * tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / avg_length))
+            coverage = sum(1 for t in query_tokens if t in doc) / len(query_tokens)
+            scores.append(bm25 * (0.5 + coverage))
+        return scores
+
+
+class CrossEncoderScorer(Scorer):
+    """Local cross-encoder on CPU (requires `sentence-transformers`)."""
+
+    def __init__(self, model_name: str = RERANK_MODEL, max_length: int = 512, batch_size: int = 16) -> None:
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError as e:
+            raise ImportError("RERANKER=cross_encoder requires `pip install sentence-transformers`") from e
+        self.name = f"cross_encoder:{model_name}"
+        self.batch_size = batch_size
+        self._model = CrossEncoder(model_name, max_length=max_length, device="cpu")
+
+    def score(self, query: str, passages: Sequence[str]) -> List[float]:
+        if not passages:
+            return []
+        scores = self._model.predict([(query, p) for p in passages], batch_size=self.batch_size, show_progress_bar=False)
+        return [float(s) for s in scores]
+
+
+class ScoreCache:
+    """LRU of scores keyed by (scorer, query, node_id)."""
+
+    def __init__(self, max_size: int = RERANK_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self._scores: "OrderedDict[Tuple[str, str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple[str, str, str]) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is not None:
+                self._scores.move_to_end(key)
+            return score
+
+    def invalidate(self, node_ids: Iterable[str]) -> int:
+        """Drops every cached score of the given nodes (their content changed)."""
+        stale = set(node_ids)
+        with self._lock:
+            keys = [key for key in self._scores if key[2] in stale]
+            for key in keys:
+                del self._scores[key]
+        return len(keys)
+
+    def put(self, key: Tuple[str, str, str], score: float) -> None:
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_size:
+                self._scores.popitem(last=False)
+
+
+class Reranker:
+    """
+    Rescores retrieved candidates and keeps the best `top_n`. Runs in its own
+    "rerank" span, so its latency shows up separately in the turn breakdown.
+    """
+
+    def __init__(self, scorer: Scorer, cache: Optional[ScoreCache] = None) -> None:
+        self.scorer = scorer
+        self.cache = cache or ScoreCache()
+
+    def rerank(self, query: str, nodes: List[NodeWithScore], top_n: int) -> List[NodeWithScore]:
+        with span("rerank", kind="rerank", scorer=self.scorer.name, candidates=len(nodes)) as current:
+            if self.scorer.pairwise:
+                scores, hits = self._cached_scores(query, nodes)
+            else:
+                scores, hits = self.scorer.score(query, [n.node.get_content() for n in nodes]), 0
+            if current is not None:
+                current.attributes["cache_hits"] = hits
+
+            ranked = sorted(zip(nodes, scores), key=lambda pair: pair[1], reverse=True)[:top_n]
+            return [NodeWithScore(node=n.node, score=score) for n, score in ranked]
+
+    def _cached_scores(self, query: str, nodes: List[NodeWithScore]) -> Tuple[List[float], int]:
+        """Scores of `nodes`, scoring only the ones not in the cache; also returns the number of hits."""
+        keys = [(self.scorer.name, query, n.node.node_id) for n in nodes]
+        scores = [self.cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            fresh = self.scorer.score(query, [nodes[i].node.get_content() for i in missing])
+            for i, score in zip(missing, fresh):
+                scores[i] = score
+                self.cache.put(keys[i], score)
+        return scores, len(nodes) - len(missing)
+
+
+def build_reranker(kind: str = RERANKER) -> Optional[Reranker]:
+    if kind == "lexical":
+        return Reranker(LexicalScorer())
+    if kind == "cross_encoder":
+        return Reranker(CrossEncoderScorer())
+    return None
+
+
+_reranker: Optional[Reranker] = None
+_reranker_built = False
+
+
+def get_reranker() -> Optional[Reranker]:
+    """The process-wide reranker selected by RERANKER, or None when reranking is off."""
+    global _reranker, _reranker_built
+    if not _reranker_built:
+        _reranker = build_reranker()
+        _reranker_built = True
+    return _reranker
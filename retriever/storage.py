@@ -0,0 +1,156 @@
+"""
+How dense vectors are stored and indexed in Milvus.
+
+A storage spec is `<type>[@<dim>][:<index>]`, e.g. `float32:flat` (the
+default), `float16:hnsw`, `float32@512:hnsw` or `binary:ivf_flat`:
+- type: float32, float16, bfloat16 or binary (1 bit per dimension).
+- dim: keep only the first `dim` dimensions and re-normalize (Matryoshka-style
+  truncation; text-embedding-3 vectors are trained for it).
+- index: one of INDEX_PRESETS.
+
+Binary vectors are searched by Hamming distance over `rescore_factor` times
+more candidates. Those candidates are then rescored against the full-precision
+query, so ranking quality stays close to float while the vectors take 1/32 of
+the memory.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from pymilvus import DataType
+
+from config.env import VECTOR_STORAGE, VECTOR_RESCORE_FACTOR
+
+VECTOR_TYPES = ("float32", "float16", "bfloat16", "binary")
+
+
+@dataclass(frozen=True)
+class IndexPreset:
+    index_type: str
+    build_params: Dict[str, Any] = field(default_factory=dict)
+    search_params: Dict[str, Any] = field(default_factory=dict)
+    # Rough extra memory per vector (graph links / inverted list ids), for estimates only
+    overhead_bytes: int = 0
+
+
+INDEX_PRESETS: Dict[str, IndexPreset] = {
+    "flat": IndexPreset("FLAT"),
+    "hnsw": IndexPreset("HNSW", {"M": 16, "efConstruction": 200}, {"ef": 64}, overhead_bytes=16 * 2 * 4),
+    "ivf_flat": IndexPreset("IVF_FLAT", {"nlist": 128}, {"nprobe": 16}, overhead_bytes=8),
+    "ivf_sq8": IndexPreset("IVF_SQ8", {"nlist": 128}, {"nprobe": 16}, overhead_bytes=8),
+}
+
+BINARY_INDEX_PRESETS: Dict[str, IndexPreset] = {
+    "flat": IndexPreset("BIN_FLAT"),
+    "ivf_flat": IndexPreset("BIN_IVF_FLAT", {"nlist": 128}, {"nprobe": 16}, overhead_bytes=8),
+}
+
+_DATATYPES = {
+    "float32": DataType.FLOAT_VECTOR,
+    "float16": DataType.FLOAT16_VECTOR,
+    "bfloat16": DataType.BFLOAT16_VECTOR,
+    "binary": DataType.BINARY_VECTOR,
+}
+
+
+def truncate(vector: Sequence[float], dim: Optional[int]) -> np.ndarray:
+    """First `dim` dimensions, L2-normalized again (no-op copy when dim is None)."""
+    array = np.asarray(vector, dtype=np.float32)
+    if dim is None or dim >= array.shape[-1]:
+        return array
+    array = array[..., :dim]
+    norm = np.linalg.norm(array, axis=-1, keepdims=True)
+    return array / np.where(norm == 0, 1.0, norm)
+
+
+@dataclass(frozen=True)
+class StorageConfig:
+    vector_type: str = "float32"
+    dim: Optional[int] = None
+    index: str = "flat"
+    rescore_factor: int = VECTOR_RESCORE_FACTOR
+
+    def __post_init__(self) -> None:
+        if self.vector_type not in VECTOR_TYPES:
+            raise ValueError(f"Unsupported vector type: {self.vector_type}")
+        presets = BINARY_INDEX_PRESETS if self.is_binary else INDEX_PRESETS
+        if self.index not in presets:
+            raise ValueError(f"Index '{self.index}' is not available for {self.vector_type} vectors")
+        if self.is_binary and self.dim is not None and self.dim % 8:
+            raise ValueError("Binary vectors need a dimension divisible by 8")
+
+    @classmethod
+    def parse(cls, spec: str, **overrides: Any) -> "StorageConfig":
+        spec = (spec or "float32").strip().lower()
+        kind, _, index = spec.partition(":")
+        vector_type, _, dim = kind.partition("@")
+        return cls(vector_type=vector_type, dim=int(dim) if dim else None, index=index or "flat", **overrides)
+
+    @classmethod
+    def from_env(cls) -> "StorageConfig":
+        return cls.parse(VECTOR_STORAGE)
+
+    @property
+    def spec(self) -> str:
+        dim = f"@{self.dim}" if self.dim else ""
+        return f"{self.vector_type}{dim}:{self.index}"
+
+    @property
+    def is_binary(self) -> bool:
+        return self.vector_type == "binary"
+
+    @property
+    def datatype(self) -> DataType:
+        return _DATATYPES[self.vector_type]
+
+    @property
+    def preset(self) -> IndexPreset:
+        return (BINARY_INDEX_PRESETS if self.is_binary else INDEX_PRESETS)[self.index]
+
+    def stored_dim(self, full_dim: int) -> int:
+        return min(self.dim or full_dim, full_dim)
+
+    def metric(self, default: str) -> str:
+        return "HAMMING" if self.is_binary else default
+
+    def index_config(self) -> Dict[str, Any]:
+        return {"index_type": self.preset.index_type, **self.preset.build_params}
+
+    def encode(self, vector: Sequence[float]) -> Any:
+        """One embedding in the wire format Milvus expects for this vector type."""
+        array = truncate(vector, self.dim)
+        if self.vector_type == "float32":
+            return array.tolist()
+        if self.vector_type == "float16":
+            return array.astype(np.float16).tobytes()
+        if self.vector_type == "bfloat16":
+            # bfloat16 is the upper half of a float32
+            return (array.view(np.uint32) >> 16).astype(np.uint16).tobytes()
+        return np.packbits(array > 0).tobytes()
+
+    def encode_batch(self, vectors: Sequence[Sequence[float]]) -> List[Any]:
+        return [self.encode(v) for v in vectors]
+
+    def rescore(self, query: Sequence[float], packed: Sequence[bytes]) -> List[float]:
+        """
+        Asymmetric scores for binary candidates: the full-precision query dotted
+        with each candidate's +/-1 signs, scaled to roughly [-1, 1].
+        """
+        if not packed:
+            return []
+        q = truncate(query, self.dim)
+        bits = np.unpackbits(np.frombuffer(b"".join(packed), dtype=np.uint8).reshape(len(packed), -1), axis=1)
+        signs = bits[:, : q.shape[0]].astype(np.float32) * 2 - 1
+        return (signs @ q / np.sqrt(q.shape[0])).tolist()
+
+    def bytes_per_vector(self, full_dim: int) -> int:
+        dim = self.stored_dim(full_dim)
+        if self.is_binary:
+            return dim // 8
+        if self.index == "ivf_sq8":
+            return dim
+        return dim * (4 if self.vector_type == "float32" else 2)
+
+    def estimated_memory(self, count: int, full_dim: int) -> int:
+        """Approximate bytes the dense field and its index occupy on the query node."""
+        return count * (self.bytes_per_vector(full_dim) + self.preset.overhead_bytes)
@@ -0,0 +1,142 @@
+"""
+Sweeps hybrid fusion settings (ranker, RRF k, weights, per-leg depth) against
+labelled queries and reports recall@k and latency per collection. The best
+config per profile is written to FUSION_PROFILES_PATH, where
+`retriever.fusion.fusion_profile` picks it up.
+
+    python -m retriever.tune_fusion
+
+Labels come from LABELS_FILE when it exists:
+    {"faq": {"field": "doc_id", "queries": [{"query": "...", "relevant": ["..."]}]}, ...}
+Otherwise each knowledge-base title / product name is used as a query for its
+own doc_id / sku, which is a weak but free labelled set.
+"""
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Tuple
+
+import pandas as pd
+from llama_index.core.vector_stores.types import VectorStoreQuery, VectorStoreQueryMode
+
+from config.env import COLLECTION_NAME, PRODUCT_COLLECTION_NAME, FUSION_PROFILES_PATH
+from retriever.const import EMBEDDING_TOP_K
+from retriever.embedding import embedding_model
+from retriever.fusion import FusionConfig, fuse, save_profiles
+from retriever.vector_store import vector_store_for
+
+LABELS_FILE = "document/retrieval_labels.json"
+PROFILES = {
+    # profile name -> (collection, top_k the agent asks for)
+    "faq": (COLLECTION_NAME, EMBEDDING_TOP_K),
+    "product_search": (PRODUCT_COLLECTION_NAME, 3),
+}
+DEPTHS = [5, 10, 20, 40]
+RRF_KS = [10, 30, 60, 100]
+WEIGHTS = [(1.0, 0.0), (0.8, 0.2), (0.6, 0.4), (0.5, 0.5), (0.4, 0.6), (0.2, 0.8), (0.0, 1.0)]
+SAVE_BEST = True
+
+
+def derived_labels() -> Dict[str, Dict[str, Any]]:
+    knowledge_df = pd.read_csv("document/knowledge_base.csv")
+    products_df = pd.read_csv("document/product.csv").fillna("")
+    return {
+        "faq": {
+            "field": "doc_id",
+            "queries": [{"query": row["title"], "relevant": [str(row["id"])]} for _, row in knowledge_df.iterrows()],
+        },
+        "product_search": {
+            "field": "sku",
+            "queries": [{"query": row["name"], "relevant": [str(row["sku"])]} for _, row in products_df.iterrows() if row["name"]],
+        },
+    }
+
+
+def load_labels() -> Dict[str, Dict[str, Any]]:
+    if os.path.exists(LABELS_FILE):
+        with open(LABELS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    print(f"{LABELS_FILE} not found, deriving labels from titles / product names.")
+    return derived_labels()
+
+
+def candidate_configs(depth: int) -> List[FusionConfig]:
+    configs = [FusionConfig(ranker="RRFRanker", k=k, dense_top_k=depth, sparse_top_k=depth) for k in RRF_KS]
+    configs += [FusionConfig(ranker="WeightedRanker", weights=w, dense_top_k=depth, sparse_top_k=depth) for w in WEIGHTS]
+    return configs
+
+
+def recall_at_k(ranked_keys: List[str], relevant: List[str]) -> float:
+    relevant = set(relevant)
+    return len(relevant.intersection(ranked_keys)) / len(relevant) if relevant else 0.0
+
+
+def tune_profile(name: str, collection: str, top_k: int, labels: Dict[str, Any]) -> List[Dict[str, Any]]:
+    store = vector_store_for(collection)
+    keys = store.node_keys(labels["field"])
+    queries = labels["queries"]
+    embeddings = embedding_model.get_text_embedding_batch([q["query"] for q in queries])
+
+    rows = []
+    for depth in DEPTHS:
+        legs: List[Tuple[list, list]] = []
+        fetch_ms: List[float] = []
+        for q, embedding in zip(queries, embeddings):
+            query = VectorStoreQuery(
+                query_embedding=embedding,
+                query_str=q["query"],
+                similarity_top_k=top_k,
+                mode=VectorStoreQueryMode.HYBRID,
+            )
+            started = time.perf_counter()
+            legs.append(store.search_legs(query, depth, depth))
+            fetch_ms.append((time.perf_counter() - started) * 1000)
+
+        for config in candidate_configs(depth):
+            recalls, fuse_us = [], []
+            for q, (dense, sparse) in zip(queries, legs):
+                started = time.perf_counter()
+                fused = fuse(dense, sparse, config, top_k, dense_metric=getattr(store, "similarity_metric", "IP"))
+                fuse_us.append((time.perf_counter() - started) * 1e6)
+                recalls.append(recall_at_k([str(keys.get(hit_id)) for hit_id, _ in fused], q["relevant"]))
+            rows.append({
+                "profile": name,
+                "config": config,
+                f"recall@{top_k}": statistics.mean(recalls),
+                "fetch_p50_ms": statistics.median(fetch_ms),
+                "fuse_p50_us": statistics.median(fuse_us),
+            })
+
+    rows.sort(key=lambda r: (-r[f"recall@{top_k}"], r["fetch_p50_ms"]))
+    return rows
+
+
+def print_rows(rows: List[Dict[str, Any]], top_k: int, limit: int = 10) -> None:
+    print(f"{'ranker':<15} {'k':>4} {'weights':<12} {'depth':>5} {f'recall@{top_k}':>10} {'fetch p50':>10} {'fuse p50':>10}")
+    for row in rows[:limit]:
+        config = row["config"]
+        weights = "-" if config.ranker == "RRFRanker" else f"{config.weights[0]:.1f}/{config.weights[1]:.1f}"
+        k = config.k if config.ranker == "RRFRanker" else "-"
+        print(
+            f"{config.ranker:<15} {k:>4} {weights:<12} {config.dense_top_k:>5} "
+            f"{row[f'recall@{top_k}']:>10.3f} {row['fetch_p50_ms']:>8.2f}ms {row['fuse_p50_us']:>8.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    labels = load_labels()
+    best: Dict[str, FusionConfig] = {}
+
+    for name, (collection, top_k) in PROFILES.items():
+        if name not in labels:
+            print(f"No labels for '{name}', skipping.")
+            continue
+        print(f"\n=== {name} ({collection}, {len(labels[name]['queries'])} queries, top_k={top_k}) ===")
+        rows = tune_profile(name, collection, top_k, labels[name])
+        print_rows(rows, top_k)
+        best[name] = rows[0]["config"]
+
+    if SAVE_BEST and best:
+        save_profiles(best, FUSION_PROFILES_PATH)
+        print(f"\nSaved best configs to {FUSION_PROFILES_PATH}")
@@ -1,26 +1,34 @@
+import asyncio
 from pydantic import UUID4
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from llama_index.core.schema import NodeWithScore
 from llama_index.core.retrievers import BaseRetriever
-from llama_index.core.vector_stores.types import VectorStoreQueryMode
+from llama_index.core.vector_stores.types import VectorStoreQueryMode, VectorStoreQueryResult
 from llama_index.core.schema import TextNode
 
-from retriever.const import EMBEDDING_TOP_K
-from retriever.vector_store import CustomVectorStoreIndex
-from retriever.vector_store import milvus_vector_store, product_vector_store
+from retriever.const import EMBEDDING_TOP_K, CHUNK_CANDIDATES
+from retriever.vector_store import CustomVectorStoreIndex, vector_store_for
 from retriever.embedding import embedding_model
+from retriever.fusion import FusionConfig, fusion_profile
+from retriever.milvus import CustomMilvusVector
+from retriever.product_filter import ProductFilter
+from retriever.rerank import get_reranker
+from document.chunking import collapse_chunks
+from config.env import COLLECTION_NAME, PRODUCT_COLLECTION_NAME, RERANK_CANDIDATES, RERANK_TOP_N
+from telemetry.tracing import traced
 
-def get_retrieval_engine() -> BaseRetriever:
+def get_retrieval_engine(fusion: Optional[FusionConfig] = None, top_k: int = EMBEDDING_TOP_K) -> BaseRetriever:
     vector_index = CustomVectorStoreIndex(
-        vector_store=milvus_vector_store,
+        vector_store=vector_store_for(COLLECTION_NAME),
         embed_model=embedding_model,
         insert_batch_size=512,
     )
 
     vector_retriever = vector_index.as_retriever(
-        similarity_top_k=EMBEDDING_TOP_K,
+        similarity_top_k=top_k,
         vector_store_query_mode=VectorStoreQueryMode.HYBRID,
+        vector_store_kwargs={"fusion": fusion or fusion_profile("faq", COLLECTION_NAME)},
     )
 
     return vector_retriever
@@ -29,34 +37,128 @@ def add_node(text:str, node_id: UUID4, metadata: Optional[dict] = {}) -> None:
     node_to_insert = TextNode(
         id_=str(node_id), text=text, metadata=metadata
     )
-    milvus_vector_store.add([node_to_insert])
+    vector_store_for(COLLECTION_NAME).add([node_to_insert])
 
 def add_node_batch(nodes: List[TextNode]) -> None:
-    milvus_vector_store.add(nodes=nodes)
+    vector_store_for(COLLECTION_NAME).add(nodes=nodes)
+
+async def aadd_node_batch(nodes: List[TextNode], force_flush: bool = False) -> None:
+    """Async KB ingestion: embeds missing vectors concurrently and inserts without blocking the event loop."""
+    await vector_store_for(COLLECTION_NAME).async_add(nodes, force_flush=force_flush)
 
 def add_product_node_batch(nodes: List[TextNode]) -> None:
-    product_vector_store.add(nodes=nodes)
+    vector_store_for(PRODUCT_COLLECTION_NAME).add(nodes=nodes)
 
-def get_retrieval_product_engine() -> BaseRetriever:
+def get_retrieval_product_engine(
+    fusion: Optional[FusionConfig] = None,
+    product_filter: Optional[ProductFilter] = None,
+    top_k: int = 3,
+) -> BaseRetriever:
+    vector_store = vector_store_for(PRODUCT_COLLECTION_NAME)
     vector_index = CustomVectorStoreIndex(
-        vector_store=product_vector_store,
+        vector_store=vector_store,
         embed_model=embedding_model,
         insert_batch_size=512,
     )
 
+    # Milvus filters on the typed scalar columns inside the ANN search; other stores get metadata filters
+    vector_store_kwargs = {"fusion": fusion or fusion_profile("product_search", PRODUCT_COLLECTION_NAME)}
+    filters = None
+    if product_filter:
+        if isinstance(vector_store, CustomMilvusVector):
+            vector_store_kwargs["expr"] = product_filter.to_milvus_expr()
+        else:
+            filters = product_filter.to_metadata_filters()
+
     vector_retriever = vector_index.as_retriever(
-        similarity_top_k=3,
+        similarity_top_k=top_k,
         vector_store_query_mode=VectorStoreQueryMode.HYBRID,
+        filters=filters,
+        vector_store_kwargs=vector_store_kwargs,
     )
 
     return vector_retriever
 
 #TODO: refactor
-def retrieve_from_product(text: str) -> List[NodeWithScore]:
-    retrieval_engine = get_retrieval_product_engine()
+@traced("retrieval.product", kind="retrieval")
+def retrieve_from_product(
+    text: str,
+    fusion: Optional[FusionConfig] = None,
+    product_filter: Optional[ProductFilter] = None,
+    top_k: int = 3,
+) -> List[NodeWithScore]:
+    retrieval_engine = get_retrieval_product_engine(fusion, product_filter=product_filter, top_k=top_k)
     return retrieval_engine.retrieve(text)
 
-def retreive_from_vector_store(text: str) -> List[NodeWithScore]:
-    retrieval_engine = get_retrieval_engine()
-    return retrieval_engine.retrieve(text)
+def knowledge_candidates() -> int:
+    """Chunks fetched per knowledge-base search, before `select_knowledge` cuts them down."""
+    return CHUNK_CANDIDATES if get_reranker() is None else RERANK_CANDIDATES
+
+def select_knowledge(text: str, candidates: List[NodeWithScore]) -> List[NodeWithScore]:
+    """Reranks (when a reranker is on) and collapses KB chunks into the few articles that reach the prompt."""
+    reranker = get_reranker()
+    if reranker is None:
+        return collapse_chunks(candidates, limit=EMBEDDING_TOP_K)
+    return collapse_chunks(reranker.rerank(text, candidates, top_n=len(candidates)), limit=RERANK_TOP_N)
+
+@traced("retrieval.knowledge_base", kind="retrieval")
+def retreive_from_vector_store(text: str, fusion: Optional[FusionConfig] = None) -> List[NodeWithScore]:
+    # Over-fetch, then keep the few articles that reach the prompt
+    candidates = get_retrieval_engine(fusion, top_k=knowledge_candidates()).retrieve(text)
+    return select_knowledge(text, candidates)
+
+
+# collection -> (similarity_top_k, fusion profile) used by the single-query engines above
+RETRIEVAL_DEFAULTS: Dict[str, Tuple[int, str]] = {
+    COLLECTION_NAME: (EMBEDDING_TOP_K, "faq"),
+    PRODUCT_COLLECTION_NAME: (3, "product_search"),
+}
+
+def _with_scores(result: VectorStoreQueryResult) -> List[NodeWithScore]:
+    return [NodeWithScore(node=node, score=score) for node, score in zip(result.nodes or [], result.similarities or [])]
+
+def _batch_plan(queries: Dict[str, List[str]], fusion: Optional[Dict[str, FusionConfig]]):
+    for collection, texts in queries.items():
+        top_k, profile = RETRIEVAL_DEFAULTS.get(collection, (EMBEDDING_TOP_K, None))
+        config = (fusion or {}).get(collection) or fusion_profile(profile, collection)
+        yield collection, texts, top_k, config
+
+@traced("retrieval.batch", kind="retrieval")
+def batch_retrieve(
+    queries: Dict[str, List[str]],
+    fusion: Optional[Dict[str, FusionConfig]] = None,
+) -> Dict[str, List[List[NodeWithScore]]]:
+    """
+    Hybrid retrieval for many queries at once, keyed by collection name.
+    All distinct texts are embedded in one batch and each collection gets a
+    single multi-query hybrid_search; results come back in query order.
+    """
+    texts = list(dict.fromkeys(text for batch in queries.values() for text in batch))
+    embeddings = dict(zip(texts, embedding_model.get_text_embedding_batch(texts))) if texts else {}
+
+    results = {}
+    for collection, batch, top_k, config in _batch_plan(queries, fusion):
+        store_results = vector_store_for(collection).hybrid_search_many(
+            batch, [embeddings[text] for text in batch], top_k, fusion=config
+        )
+        results[collection] = [_with_scores(r) for r in store_results]
+    return results
+
+@traced("retrieval.abatch", kind="retrieval")
+async def abatch_retrieve(
+    queries: Dict[str, List[str]],
+    fusion: Optional[Dict[str, FusionConfig]] = None,
+) -> Dict[str, List[List[NodeWithScore]]]:
+    """Async `batch_retrieve`; the per-collection searches run concurrently."""
+    texts = list(dict.fromkeys(text for batch in queries.values() for text in batch))
+    embeddings = dict(zip(texts, await embedding_model.aget_text_embedding_batch(texts))) if texts else {}
 
+    plan = list(_batch_plan(queries, fusion))
+    store_results = await asyncio.gather(*[
+        vector_store_for(collection).ahybrid_search_many(batch, [embeddings[text] for text in batch], top_k, fusion=config)
+        for collection, batch, top_k, config in plan
+    ])
+    return {
+        collection: [_with_scores(r) for r in collection_results]
+        for (collection, *_), collection_results in zip(plan, store_results)
+    }
@@ -1,6 +1,6 @@
-import asyncio
 import logging
-from typing import Any, Optional, List
+import threading
+from typing import Any, Dict, Optional, List
 
 from llama_index.core.vector_stores.types import BasePydanticVectorStore
 from llama_index.core.embeddings.utils import EmbedType
@@ -21,8 +21,9 @@ from llama_index.core.vector_stores.types import (
     VectorStoreQueryResult,
 )
 
-from retriever.milvus import CustomMilvusVector
-from config.env import EMBED_DIM, MILVUS_URL, COLLECTION_NAME, PRODUCT_COLLECTION_NAME
+from retriever.milvus import CustomMilvusProductVector, CustomMilvusVector
+from retriever.local import LocalHybridVector
+from config.env import EMBED_DIM, MILVUS_URL, COLLECTION_NAME, PRODUCT_COLLECTION_NAME, VECTOR_BACKEND, LOCAL_VECTOR_DIR
 
 logger = logging.getLogger(__name__)
 
@@ -77,9 +78,8 @@ class CustomVectorIndexRetriever(VectorIndexRetriever):
                 self._index.index_struct.nodes_dict[idx] for idx in query_result.ids
             ]
         else:
-            raise ValueError(
-                "Vector store query result should return at least one of nodes or ids."
-            )
+            # Nothing matched (e.g. a pushed-down product filter): an empty result, not an error
+            return []
 
 
 class CustomVectorStoreIndex(VectorStoreIndex):
@@ -110,24 +110,24 @@ class CustomVectorStoreIndex(VectorStoreIndex):
             **kwargs,
         )
     
+def _milvus_class(collection_name: str) -> type:
+    return CustomMilvusProductVector if collection_name == PRODUCT_COLLECTION_NAME else CustomMilvusVector
+
+
 def get_vector_store(collection_name: str) -> Optional[CustomMilvusVector]:
     try:
-        try:
-            asyncio.get_running_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-
-        vector_store = CustomMilvusVector(
+        vector_store = _milvus_class(collection_name)(
             uri=MILVUS_URL,
             collection_name=collection_name,
             dim=EMBED_DIM
         )
 
-        if vector_store.dimension != EMBED_DIM:
+        expected_dim = vector_store.storage.stored_dim(EMBED_DIM)
+        if vector_store.dimension != expected_dim:
             raise ValueError(
                 f"Dimension mismatch: vector_store has dimension {vector_store.dimension}, "
-                f"but embeded_model has dimension {EMBED_DIM}. Ensure both are aligned."
+                f"but VECTOR_STORAGE '{vector_store.storage.spec}' stores {expected_dim} of the "
+                f"embedding model's {EMBED_DIM} dimensions. Ensure both are aligned."
             )
 
         return vector_store
@@ -141,7 +141,7 @@ def get_vector_store(collection_name: str) -> Optional[CustomMilvusVector]:
 
 def create_vector_store(collection_name: str) -> Optional[CustomMilvusVector]:
     try:
-        vector_store = CustomMilvusVector(
+        vector_store = _milvus_class(collection_name)(
             uri=MILVUS_URL,
             collection_name=collection_name,
             dim=EMBED_DIM,
@@ -152,5 +152,43 @@ def create_vector_store(collection_name: str) -> Optional[CustomMilvusVector]:
         logger.error(f"Failed to create Milvus vector store: {e}", exc_info=True)
         raise e
 
-milvus_vector_store = get_vector_store(collection_name=COLLECTION_NAME)
-product_vector_store = get_vector_store(collection_name=PRODUCT_COLLECTION_NAME)
\ No newline at end of file
+_vector_stores: Dict[str, BasePydanticVectorStore] = {}
+_vector_stores_lock = threading.Lock()
+
+
+def set_vector_store(collection_name: str, vector_store: BasePydanticVectorStore) -> None:
+    """Registers the store served for `collection_name` (e.g. an in-process stand-in)."""
+    _vector_stores[collection_name] = vector_store
+
+
+def get_local_vector_store(collection_name: str) -> LocalHybridVector:
+    return LocalHybridVector(
+        collection_name=collection_name,
+        dim=EMBED_DIM,
+        persist_dir=LOCAL_VECTOR_DIR,
+    )
+
+
+def vector_store_for(collection_name: str) -> BasePydanticVectorStore:
+    """Returns the store for a collection, opening the VECTOR_BACKEND store on first use."""
+    if collection_name in _vector_stores:
+        return _vector_stores[collection_name]
+    with _vector_stores_lock:
+        if collection_name in _vector_stores:
+            return _vector_stores[collection_name]
+        if VECTOR_BACKEND == "local":
+            _vector_stores[collection_name] = get_local_vector_store(collection_name=collection_name)
+        elif VECTOR_BACKEND == "milvus":
+            _vector_stores[collection_name] = get_vector_store(collection_name=collection_name)
+        else:
+            raise ValueError(f"Unsupported VECTOR_BACKEND: {VECTOR_BACKEND}")
+    return _vector_stores[collection_name]
+
+
+def __getattr__(name: str) -> Any:
+    # Kept for callers of the old import-time globals
+    if name == "milvus_vector_store":
+        return vector_store_for(COLLECTION_NAME)
+    if name == "product_vector_store":
+        return vector_store_for(PRODUCT_COLLECTION_NAME)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
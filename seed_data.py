@@ -1,93 +1,414 @@
+"""
+Streaming, parallel ingestion of the knowledge base and product catalog.
+
+    python seed_data.py                                   # both bundled corpora
+    python seed_data.py --collection products --source exports/products.jsonl --workers 8 --batch-size 256
+
+The CSV/JSONL corpus is read `--chunk-rows` rows at a time. Each chunk (a
+"shard") goes to a worker process, which builds its nodes with column-wise
+pandas ops and runs jieba on them; tokenization is the CPU-bound part. With
+`--workers 1` (the default, enough for the bundled corpora), a reader thread and a bounded queue do the same work instead.
+Only a few shards are in flight at a time, so memory stays flat.
+
+The parent process collects nodes into `--batch-size` batches. Each batch is
+embedded in one call and written by a pool of `--inserters` threads.
+
+After a shard is fully written and every shard before it is done, its index
+is recorded in `CHECKPOINT_DIR/<collection>.json`. A re-run skips the
+committed shards, and clears partial writes of shards that were in flight
+before redoing them.
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
 import uuid
-import pandas as pd
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
+import pandas as pd
 from tqdm import tqdm
-from typing import List
 from llama_index.core.schema import TextNode
 
-from retriever.utils import add_node_batch, add_product_node_batch
-
-def load_data_and_build_retrievers():
-    """Loads all data sources and prepares them for the tools."""
-    node_list :List[TextNode] = []
-
-    knowledge_df = pd.read_csv("document/knowledge_base.csv")
-    for _, row in tqdm(knowledge_df.iterrows(), desc="Adding knowledge base to vector store"):
-        doc_content = f"Title: {row['title']}\nContent: {row['content']}\nTags: {row.get('tags/0', '')}, {row.get('tags/1', '')}, {row.get('tags/2', '')}"
-        metadata={
-            "doc_id": row['id'],
-            "title": row['title'],
-            "content": row['content'],
-            "url": row['urls/0/href'],
-            "image": row['images/0'],
-            "tag": [row['tags/0'], row['tags/1'], row['tags/2']]
-        }
-        node_list.append(
-            TextNode(
-                id_=str(uuid.uuid4()),
-                text=doc_content,
-                metadata=metadata
-            )
-        )
-    add_node_batch(nodes=node_list)
-
-def seed_products_db(csv_path: str = "document/product.csv"):
-    """
-    Loads products.csv, transforms each product into a searchable TextNode,
-    and adds them to the vector store.
-    """
-    node_list: List[TextNode] = []
-
-    products_df = pd.read_csv(csv_path).fillna('')
-
-    for _, row in tqdm(products_df.iterrows(), desc="Adding products to vector store"):
-        includes = ", ".join(filter(None, [
-            row.get('specs/includes/0', ''),
-            row.get('specs/includes/1', ''),
-            row.get('specs/includes/2', '')
-        ]))
-
-        doc_content = (
-            f"Product Name: {row.get('name', '')}\n"
-            f"Type: {row.get('specs/arm_type', '')}\n"
-            f"Compatibility Notes: {row.get('compatibility_notes', '')}\n"
-            f"Key Features: USB Hub ({row.get('specs/usb_hub', 'false')}), "
-            f"Rotation ({row.get('specs/rotation', 'N/A')}), "
-            f"Tilt ({row.get('specs/tilt', 'N/A')})\n"
-            f"Included Items: {includes}"
-        )
-        
-        metadata = {
-            "sku": row.get('sku', ''),
-            "name": row.get('name', ''),
-            "url": row.get('url', ''),
-            "image": row.get('images/0', ''),
-            "arm_type": row.get('specs/arm_type', ''),
-            "size_max_inch": row.get('specs/size_max_inch', ''),
-            "weight_per_arm_kg": row.get('specs/weight_per_arm_kg', ''),
-            "vesa": ", ".join(filter(None, [
-                row.get('specs/vesa/0', ''), 
-                row.get('specs/vesa/1', '')
-            ])),
-            "desk_thickness_mm": row.get('specs/desk_thickness_mm', ''),
-            "compatibility_notes": row.get('compatibility_notes', ''),
-            "usb_hub": row.get('specs/usb_hub', ''),
-            "includes": includes
-        }
-        
-        metadata_cleaned = {k: v for k, v in metadata.items() if v}
-
-        node_list.append(
-            TextNode(
-                id_=str(uuid.uuid4()),
-                text=doc_content,
-                metadata=metadata_cleaned
-            )
-        )
+from config.env import COLLECTION_NAME, PRODUCT_COLLECTION_NAME
+from retriever.vector_store import vector_store_for
+from retriever.local import LocalHybridVector
+from retriever.milvus import CustomMilvusVector, jieba_text
+from document.data import parse_range_column
+from document.chunking import knowledge_nodes
+
+logger = logging.getLogger(__name__)
+
+CSV_CHUNK_ROWS = 500
+INSERT_BATCH_SIZE = 128
+INSERT_CONCURRENCY = 4
+QUEUE_SIZE = 4
+CHECKPOINT_DIR = "output/ingest"
+
+_DONE = object()
+
+
+# --- Node builders (one CSV chunk -> nodes) ---
+
+def knowledge_chunk_nodes(frame: pd.DataFrame) -> List[TextNode]:
+    nodes: List[TextNode] = []
+    for row in frame.to_dict("records"):
+        nodes.extend(knowledge_nodes(row))
+    return nodes
+
+
+def _col(frame: pd.DataFrame, name: str, default: str = "") -> pd.Series:
+    if name not in frame:
+        return pd.Series(default, index=frame.index)
+    return frame[name].fillna(default).astype(str)
+
+
+def _join_nonempty(frame: pd.DataFrame, names: List[str]) -> pd.Series:
+    joined = _col(frame, names[0])
+    for name in names[1:]:
+        joined = joined + ", " + _col(frame, name)
+    return joined.str.replace(r"^(, )+|(, )+$", "", regex=True).str.replace(r"(, ){2,}", ", ", regex=True)
+
+
+def product_chunk_nodes(frame: pd.DataFrame) -> List[TextNode]:
+    includes = _join_nonempty(frame, ["specs/includes/0", "specs/includes/1", "specs/includes/2"])
+    text = (
+        "Product Name: " + _col(frame, "name") + "\n"
+        + "Type: " + _col(frame, "specs/arm_type") + "\n"
+        + "Compatibility Notes: " + _col(frame, "compatibility_notes") + "\n"
+        + "Key Features: USB Hub (" + _col(frame, "specs/usb_hub", "false") + "), "
+        + "Rotation (" + _col(frame, "specs/rotation", "N/A") + "), "
+        + "Tilt (" + _col(frame, "specs/tilt", "N/A") + ")\n"
+        + "Included Items: " + includes
+    )
+
+    weight_min, weight_max = parse_range_column(_col(frame, "specs/weight_per_arm_kg"))
+    desk_min, desk_max = parse_range_column(_col(frame, "specs/desk_thickness_mm"))
+    size = pd.to_numeric(_col(frame, "specs/size_max_inch"), errors="coerce")
+    vesa = _join_nonempty(frame, ["specs/vesa/0", "specs/vesa/1"])
+    metadata = pd.DataFrame({
+        "doc_id": _col(frame, "sku"),
+        "sku": _col(frame, "sku"),
+        "name": _col(frame, "name"),
+        "url": _col(frame, "url"),
+        "image": _col(frame, "images/0"),
+        "arm_type": _col(frame, "specs/arm_type"),
+        "weight_per_arm_kg": _col(frame, "specs/weight_per_arm_kg"),
+        "vesa": vesa,
+        "desk_thickness_mm": _col(frame, "specs/desk_thickness_mm"),
+        "compatibility_notes": _col(frame, "compatibility_notes"),
+        "usb_hub": _col(frame, "specs/usb_hub"),
+        "includes": includes,
+        # Typed copies of the spec ranges, used for filtered retrieval
+        "size_max_inch": size.astype("Int64"),
+        "weight_min_kg": weight_min,
+        "weight_max_kg": weight_max,
+        "desk_min_mm": desk_min,
+        "desk_max_mm": desk_max,
+        "vesa_patterns": vesa.map(lambda v: [p for p in v.split(", ") if p]),
+    })
+
+    nodes = []
+    for content, record in zip(text, metadata.astype(object).to_dict("records")):
+        cleaned = {k: v for k, v in record.items() if not _is_empty(v)}
+        nodes.append(TextNode(
+            id_=str(uuid.uuid5(uuid.NAMESPACE_URL, f"product:{record['sku']}")),
+            text=content,
+            metadata=cleaned,
+        ))
+    return nodes
+
+
+def _is_empty(value: Any) -> bool:
+    if isinstance(value, list):
+        return not value
+    return value is None or value == "" or pd.isna(value)
+
+
+# --- Checkpoints ---
+
+def _checkpoint_path(collection: str) -> str:
+    return os.path.join(CHECKPOINT_DIR, f"{collection}.json")
+
+
+def _fingerprint(path: str, chunk_rows: int) -> Dict[str, Any]:
+    stat = os.stat(path)
+    return {"source": os.path.abspath(path), "size": stat.st_size, "mtime": int(stat.st_mtime), "chunk_rows": chunk_rows}
+
+
+def load_checkpoint(collection: str, path: str, chunk_rows: int) -> Optional[Dict[str, Any]]:
+    """The checkpoint of the last ingest of `path`, or None (also when the file or shard size changed since)."""
+    try:
+        with open(_checkpoint_path(collection), "r", encoding="utf-8") as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return None
+    fingerprint = _fingerprint(path, chunk_rows)
+    if {k: checkpoint.get(k) for k in fingerprint} != fingerprint:
+        logger.warning(f"{path} changed since the last ingest into '{collection}'; starting over.")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(collection: str, path: str, chunk_rows: int, chunk: int, started: int, rows: int) -> None:
+    os.makedirs(CHECKPOINT_DIR, exist_ok=True)
+    tmp = _checkpoint_path(collection) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({**_fingerprint(path, chunk_rows), "chunk": chunk, "started": started, "rows": rows}, f)
+    os.replace(tmp, _checkpoint_path(collection))
+
+
+# --- Shards ---
+
+# (shard index, source rows, nodes, jieba text per node)
+Shard = Tuple[int, int, List[TextNode], List[str]]
+
+
+def _flatten(value: Any, prefix: str = "") -> Dict[str, Any]:
+    """Nested JSON -> the flat "specs/vesa/0" style columns of the CSV exports."""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list):
+        items = ((str(i), v) for i, v in enumerate(value))
+    else:
+        return {prefix: value}
+    flat: Dict[str, Any] = {}
+    for key, child in items:
+        flat.update(_flatten(child, f"{prefix}/{key}" if prefix else str(key)))
+    return flat
+
+
+def read_shards(path: str, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    if path.endswith((".jsonl", ".ndjson")):
+        for frame in pd.read_json(path, lines=True, chunksize=chunk_rows, dtype=False):
+            yield pd.DataFrame([_flatten(record) for record in frame.to_dict("records")])
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows)
+
+
+def prepare_shard(build_nodes: Callable[[pd.DataFrame], List[TextNode]], index: int, frame: pd.DataFrame) -> Shard:
+    """Nodes of one shard plus their BM25 text; runs in a worker process."""
+    nodes = build_nodes(frame)
+    return index, len(frame), nodes, [jieba_text(node.text) for node in nodes]
+
+
+def _threaded_shards(path: str, build_nodes, chunk_rows: int, skip: int) -> Iterator[Shard]:
+    work: "queue.Queue[Any]" = queue.Queue(maxsize=QUEUE_SIZE)
+
+    def produce() -> None:
+        try:
+            for index, frame in enumerate(read_shards(path, chunk_rows)):
+                if index > skip:
+                    work.put(prepare_shard(build_nodes, index, frame))
+            work.put(_DONE)
+        except BaseException as e:
+            work.put(e)
+
+    reader = threading.Thread(target=produce, name="ingest-reader", daemon=True)
+    reader.start()
+    while True:
+        item = work.get()
+        if item is _DONE:
+            break
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+    reader.join()
+
+
+def _pooled_shards(path: str, build_nodes, chunk_rows: int, skip: int, workers: int) -> Iterator[Shard]:
+    """Shards prepared by a process pool, yielded as they finish (not in order)."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight = set()
+        for index, frame in enumerate(read_shards(path, chunk_rows)):
+            if index <= skip:
+                continue
+            in_flight.add(pool.submit(prepare_shard, build_nodes, index, frame))
+            if len(in_flight) >= workers * 2:
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in as_completed(in_flight):
+            yield future.result()
+
+
+class _Commits:
+    """Counts the nodes still unwritten per shard and advances the contiguous prefix of finished shards."""
+
+    def __init__(self, committed: int) -> None:
+        self.committed = committed
+        self.remaining: Dict[int, int] = {}
+        self.rows: Dict[int, int] = {}
+        self.rows_committed = 0
+        self._finished: set = set()
+
+    def expect(self, index: int, rows: int, nodes: int) -> None:
+        self.rows[index] = rows
+        self.remaining[index] = nodes
+        if not nodes:
+            self._finish(index)
+
+    def written(self, index: int, nodes: int) -> None:
+        self.remaining[index] -= nodes
+        if not self.remaining[index]:
+            self._finish(index)
+
+    def _finish(self, index: int) -> None:
+        del self.remaining[index]
+        self._finished.add(index)
+        while self.committed + 1 in self._finished:
+            self.committed += 1
+            self._finished.remove(self.committed)
+            self.rows_committed += self.rows.pop(self.committed, 0)
+
+
+# --- Pipeline ---
+
+def ingest(
+    path: str,
+    collection: str,
+    build_nodes: Callable[[pd.DataFrame], List[TextNode]],
+    workers: int = 1,
+    batch_size: int = INSERT_BATCH_SIZE,
+    chunk_rows: int = CSV_CHUNK_ROWS,
+    inserters: int = INSERT_CONCURRENCY,
+    resume: bool = True,
+) -> Dict[str, Any]:
+    """Streams one CSV/JSONL corpus into a collection; returns row/node counts and throughput."""
+    store = vector_store_for(collection)
+    durable = isinstance(store, CustomMilvusVector)
+    if not durable:
+        inserters = 1  # other stores are not safe for concurrent writes
+    checkpoint = load_checkpoint(collection, path, chunk_rows) if resume else None
+    committed = checkpoint["chunk"] if checkpoint else -1
+    # Shards the previous run had started but not committed may be partly written
+    dirty = checkpoint.get("started", committed) if checkpoint else -1
+
+    commits = _Commits(committed)
+    commits.rows_committed = checkpoint.get("rows", 0) if checkpoint else 0
+    started = committed
+    pending: List[Tuple[int, TextNode, str]] = []
+    inserts: Dict[Future, List[int]] = {}
+    counts = {"rows": 0, "nodes": 0}
+    began = time.perf_counter()
+
+    def save() -> None:
+        if not durable:
+            return  # in-memory writes are lost on a crash; checkpoint only once they are persisted
+        save_checkpoint(collection, path, chunk_rows, commits.committed, started, commits.rows_committed)
+
+    def collect(block: bool) -> None:
+        if block:
+            done, _ = wait(list(inserts), return_when=FIRST_COMPLETED)
+        else:
+            done = [future for future in inserts if future.done()]
+        if not done:
+            return
+        for future in done:
+            future.result()  # re-raise insert errors
+            for index, nodes in Counter(inserts.pop(future)).items():
+                commits.written(index, nodes)
+        save()
+
+    def submit(batch: List[Tuple[int, TextNode, str]]) -> None:
+        future = writers.submit(store.add, [node for _, node, _ in batch], tokenized=[tokens for *_, tokens in batch])
+        inserts[future] = [index for index, _, _ in batch]
+        counts["nodes"] += len(batch)
+        while len(inserts) >= inserters * 2:
+            collect(block=True)
+
+    shards = (
+        _pooled_shards(path, build_nodes, chunk_rows, committed, workers)
+        if workers > 1
+        else _threaded_shards(path, build_nodes, chunk_rows, committed)
+    )
+    with ThreadPoolExecutor(max_workers=inserters, thread_name_prefix="ingest-insert") as writers, tqdm(
+        desc=f"Ingesting {os.path.basename(path)} into {collection}", unit="rows", initial=commits.rows_committed
+    ) as progress:
+        for index, rows, nodes, tokenized in shards:
+            if index <= dirty:
+                for doc_id in {str(node.metadata.get("doc_id")) for node in nodes}:
+                    store.delete(doc_id)
+            started = max(started, index)
+            commits.expect(index, rows, len(nodes))
+            save()
+            pending.extend((index, node, tokens) for node, tokens in zip(nodes, tokenized))
+            while len(pending) >= batch_size:
+                submit(pending[:batch_size])
+                del pending[:batch_size]
+            collect(block=False)
+
+            counts["rows"] += rows
+            progress.update(rows)
+            progress.set_postfix(nodes_per_s=f"{counts['nodes'] / (time.perf_counter() - began):.0f}")
+        if pending:
+            submit(pending)
+        while inserts:
+            collect(block=True)
+    if isinstance(store, LocalHybridVector):
+        store.persist()  # its writes stay in memory until persisted
+    save_checkpoint(collection, path, chunk_rows, commits.committed, started, commits.rows_committed)
+
+    elapsed = time.perf_counter() - began
+    return {
+        "collection": collection,
+        "rows": counts["rows"],
+        "nodes": counts["nodes"],
+        "seconds": round(elapsed, 2),
+        "rows_per_s": round(counts["rows"] / elapsed, 1) if elapsed else 0.0,
+        "nodes_per_s": round(counts["nodes"] / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def load_data_and_build_retrievers(csv_path: str = "document/knowledge_base.csv", resume: bool = True, **options: Any) -> Dict[str, Any]:
+    """Streams the knowledge base into COLLECTION_NAME as chunk nodes."""
+    return ingest(csv_path, COLLECTION_NAME, knowledge_chunk_nodes, resume=resume, **options)
+
+
+def seed_products_db(csv_path: str = "document/product.csv", resume: bool = True, **options: Any) -> Dict[str, Any]:
+    """Streams the product catalog into PRODUCT_COLLECTION_NAME, one node per product."""
+    return ingest(csv_path, PRODUCT_COLLECTION_NAME, product_chunk_nodes, resume=resume, **options)
+
+
+SEEDERS = {
+    "knowledge_base": load_data_and_build_retrievers,
+    "products": seed_products_db,
+}
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Ingest the knowledge base and/or product catalog into the vector store.")
+    parser.add_argument("--collection", choices=[*SEEDERS, "all"], default="all")
+    parser.add_argument("--source", default=None, help="CSV or JSONL corpus (default: the bundled file of the collection)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for parsing and jieba tokenization (1: a reader thread, no pool)")
+    parser.add_argument("--batch-size", type=int, default=INSERT_BATCH_SIZE, help="Nodes per embedding call and insert")
+    parser.add_argument("--chunk-rows", type=int, default=CSV_CHUNK_ROWS, help="Rows per shard (the unit of resume)")
+    parser.add_argument("--inserters", type=int, default=INSERT_CONCURRENCY, help="Concurrent insert threads")
+    parser.add_argument("--no-resume", action="store_true", help="Ignore checkpoints and ingest everything")
+    args = parser.parse_args()
+    if args.source and args.collection == "all":
+        parser.error("--source needs a single --collection")
+    return args
 
-    add_product_node_batch(nodes=node_list)
 
 if __name__ == "__main__":
-    # load_data_and_build_retrievers()
-    # seed_products_db()
-    pass
\ No newline at end of file
+    args = parse_args()
+    names = list(SEEDERS) if args.collection == "all" else [args.collection]
+    for name in names:
+        source = {"csv_path": args.source} if args.source else {}
+        stats = SEEDERS[name](
+            resume=not args.no_resume,
+            workers=args.workers,
+            batch_size=args.batch_size,
+            chunk_rows=args.chunk_rows,
+            inserters=args.inserters,
+            **source,
+        )
+        print(
+            f"{stats['collection']}: {stats['rows']} rows -> {stats['nodes']} nodes in {stats['seconds']}s "
+            f"({stats['rows_per_s']} rows/s, {stats['nodes_per_s']} nodes/s)"
+        )
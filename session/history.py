@@ -0,0 +1,78 @@
+"""
+Append-only chat history for the intent agent's Context.
+
+The log is put in the Context once (under "history") and appended to in
+place, so adding a message does not re-set or copy the history. `persisted`
+is the offset up to which the session store already has the messages, so
+save_context writes only `log.since(log.persisted)` and then moves the offset.
+
+Messages are never removed or reordered, which makes a snapshot just a
+length. `log.snapshot()` is O(1), and the snapshot keeps showing the history
+as it was, no matter what is appended afterwards.
+
+    log = HistoryLog()
+    log.append(ChatMessage(role=MessageRole.USER, content="hi"))
+    response = await llm.achat(messages=log.snapshot() + [instruction])
+"""
+import itertools
+from typing import Iterator, List, Sequence, Union
+
+from llama_index.core.llms import ChatMessage
+from pydantic import BaseModel, Field
+
+
+class HistorySnapshot(Sequence[ChatMessage]):
+    """Read-only view of the first `end` messages of a HistoryLog."""
+
+    __slots__ = ("_messages", "_end")
+
+    def __init__(self, messages: List[ChatMessage], end: int) -> None:
+        self._messages = messages
+        self._end = end
+
+    def __len__(self) -> int:
+        return self._end
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[ChatMessage, List[ChatMessage]]:
+        if isinstance(index, slice):
+            return [self._messages[i] for i in range(self._end)[index]]
+        if index < 0:
+            index += self._end
+        if not 0 <= index < self._end:
+            raise IndexError("history snapshot index out of range")
+        return self._messages[index]
+
+    def __iter__(self) -> Iterator[ChatMessage]:
+        return itertools.islice(self._messages, self._end)
+
+    def __add__(self, other: Sequence[ChatMessage]) -> List[ChatMessage]:
+        return [*self, *other]
+
+    def __radd__(self, other: Sequence[ChatMessage]) -> List[ChatMessage]:
+        return [*other, *self]
+
+    def __repr__(self) -> str:
+        return f"HistorySnapshot({self._end} messages)"
+
+
+class HistoryLog(BaseModel):
+    """Chat messages in order, plus the offset the session store has persisted up to."""
+
+    messages: List[ChatMessage] = Field(default_factory=list)
+    persisted: int = 0
+
+    def __len__(self) -> int:
+        return len(self.messages)
+
+    def append(self, message: ChatMessage) -> None:
+        self.messages.append(message)
+
+    def snapshot(self) -> HistorySnapshot:
+        return HistorySnapshot(self.messages, len(self.messages))
+
+    def since(self, offset: int) -> List[ChatMessage]:
+        """The messages appended after `offset`; costs the size of the delta, not of the history."""
+        return self.messages[offset:]
+
+    def mark_persisted(self, offset: int) -> None:
+        self.persisted = offset
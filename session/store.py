@@ -0,0 +1,307 @@
+"""
+Conversation state that outlives one process, so any worker can serve any turn.
+
+A session holds the intent agent's workflow state (SESSION_KEYS) and its chat
+history. Messages are stored compactly (role + content, with
+additional_kwargs only when present), and the history is written as deltas.
+Each save appends the messages added since the HistoryLog's `persisted`
+offset (session/history.py) and rewrites only the small state record.
+
+The stored history length doubles as the session's version. save_context
+passes the length its Context last saw as `expected`, and a store whose
+history has moved on since (another worker served a turn) raises
+SessionConflict instead of overwriting that turn. restore_context reuses the
+caller's Context while the version still matches, so a worker serving the
+same conversation turn after turn does not reload it every time.
+
+Backends (SESSION_BACKEND):
+- "memory": an in-process LRU of up to SESSION_MAX_ACTIVE sessions, for a
+  single worker and for tests.
+- "sqlite": one SQLite file (SESSION_PATH) shared by every worker on the host.
+  Sessions idle for longer than SESSION_IDLE_TTL_S are evicted.
+
+Any store with the SessionStore interface (e.g. a Redis hash for state plus a
+list for history) can be dropped in.
+
+    store = get_session_store()
+    ctx = await restore_context(agent, store, session_id, ctx=previous_ctx)
+    result = await agent.run(input=text, ctx=ctx)
+    await save_context(ctx, store, session_id)
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from llama_index.core.llms import ChatMessage, MessageRole
+from llama_index.core.workflow import Context, Workflow
+
+from config.env import SESSION_BACKEND, SESSION_IDLE_TTL_S, SESSION_MAX_ACTIVE, SESSION_PATH
+from llm.cache import dump_message
+from session.history import HistoryLog
+
+logger = logging.getLogger(__name__)
+
+# Context keys persisted next to the history
+SESSION_KEYS = ("conversation_id", "user_id", "order_id", "email", "waiting_for", "language")
+
+
+def pack_message(message: ChatMessage) -> Dict[str, Any]:
+    data = dump_message(message)
+    packed = {"r": data["role"], "c": data["content"]}
+    if data["additional_kwargs"]:
+        packed["k"] = data["additional_kwargs"]
+    return packed
+
+
+def unpack_message(packed: Dict[str, Any]) -> ChatMessage:
+    return ChatMessage(role=MessageRole(packed["r"]), content=packed.get("c"), additional_kwargs=packed.get("k") or {})
+
+
+class SessionConflict(RuntimeError):
+    """The stored history is not the one the save was based on."""
+
+
+@dataclass
+class Session:
+    state: Dict[str, Any] = field(default_factory=dict)
+    history: List[Dict[str, Any]] = field(default_factory=list)  # packed messages
+    updated_at: float = 0.0
+
+
+class SessionStore:
+    def load(self, session_id: str) -> Optional[Session]:
+        raise NotImplementedError
+
+    def save(
+        self,
+        session_id: str,
+        state: Dict[str, Any],
+        new_messages: List[Dict[str, Any]],
+        start: int,
+        expected: Optional[int] = None,
+    ) -> None:
+        """
+        Stores `state` and writes `new_messages` at history positions `start`, `start + 1`, ...
+        With `expected`, raises SessionConflict unless the stored history has exactly that many messages.
+        """
+        raise NotImplementedError
+
+    def version(self, session_id: str) -> int:
+        """Number of stored history messages (0 for an unknown session)."""
+        raise NotImplementedError
+
+    def delete(self, session_id: str) -> None:
+        raise NotImplementedError
+
+    def evict_idle(self, max_idle_s: float = SESSION_IDLE_TTL_S) -> int:
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """LRU of sessions; the least recently used one is dropped past `max_sessions`."""
+
+    def __init__(self, max_sessions: int = SESSION_MAX_ACTIVE) -> None:
+        self.max_sessions = max_sessions
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return None
+            self._sessions.move_to_end(session_id)
+            return Session(dict(session.state), list(session.history), session.updated_at)
+
+    def save(
+        self,
+        session_id: str,
+        state: Dict[str, Any],
+        new_messages: List[Dict[str, Any]],
+        start: int,
+        expected: Optional[int] = None,
+    ) -> None:
+        with self._lock:
+            session = self._sessions.get(session_id) or Session()
+            if expected is not None and len(session.history) != expected:
+                raise SessionConflict(f"Session {session_id} has {len(session.history)} messages, expected {expected}")
+            self._sessions[session_id] = session
+            del session.history[start:]
+            session.history.extend(new_messages)
+            session.state = dict(state)
+            session.updated_at = time.time()
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def version(self, session_id: str) -> int:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            return len(session.history) if session else 0
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def evict_idle(self, max_idle_s: float = SESSION_IDLE_TTL_S) -> int:
+        cutoff = time.time() - max_idle_s
+        with self._lock:
+            idle = [sid for sid, session in self._sessions.items() if session.updated_at < cutoff]
+            for sid in idle:
+                del self._sessions[sid]
+        return len(idle)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in one SQLite file; history rows are keyed by (session, position) so saves only insert the tail."""
+
+    # Idle sessions are swept every this many saves
+    EVICT_EVERY = 200
+
+    def __init__(self, path: str = SESSION_PATH, max_idle_s: float = SESSION_IDLE_TTL_S) -> None:
+        self.path = path
+        self.max_idle_s = max_idle_s
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._saves = 0
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions (id TEXT PRIMARY KEY, state TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS history ("
+                "session_id TEXT NOT NULL, position INTEGER NOT NULL, message TEXT NOT NULL, "
+                "PRIMARY KEY (session_id, position)) WITHOUT ROWID"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+
+    def load(self, session_id: str) -> Optional[Session]:
+        with self._lock:
+            row = self._conn.execute("SELECT state, updated_at FROM sessions WHERE id = ?", (session_id,)).fetchone()
+            if row is None:
+                return None
+            messages = self._conn.execute(
+                "SELECT message FROM history WHERE session_id = ? ORDER BY position", (session_id,)
+            ).fetchall()
+        return Session(json.loads(row[0]), [json.loads(m) for (m,) in messages], row[1])
+
+    def save(
+        self,
+        session_id: str,
+        state: Dict[str, Any],
+        new_messages: List[Dict[str, Any]],
+        start: int,
+        expected: Optional[int] = None,
+    ) -> None:
+        rows = [
+            (session_id, start + i, json.dumps(message, ensure_ascii=False, separators=(",", ":")))
+            for i, message in enumerate(new_messages)
+        ]
+        with self._lock, self._conn:
+            # Take the write lock before reading the version, so no other process can save in between
+            self._conn.execute("BEGIN IMMEDIATE")
+            if expected is not None:
+                stored = self._version(session_id)
+                if stored != expected:
+                    raise SessionConflict(f"Session {session_id} has {stored} messages, expected {expected}")
+            self._conn.execute("DELETE FROM history WHERE session_id = ? AND position >= ?", (session_id, start))
+            self._conn.executemany("INSERT INTO history VALUES (?, ?, ?)", rows)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                (session_id, json.dumps(state, ensure_ascii=False, separators=(",", ":")), time.time()),
+            )
+            self._saves += 1
+            sweep = self._saves % self.EVICT_EVERY == 0
+        if sweep:
+            self.evict_idle(self.max_idle_s)
+
+    def _version(self, session_id: str) -> int:
+        # An index seek on the (session_id, position) primary key, not a count
+        (version,) = self._conn.execute(
+            "SELECT COALESCE(MAX(position) + 1, 0) FROM history WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        return version
+
+    def version(self, session_id: str) -> int:
+        with self._lock:
+            return self._version(session_id)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM history WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def evict_idle(self, max_idle_s: float = SESSION_IDLE_TTL_S) -> int:
+        cutoff = time.time() - max_idle_s
+        with self._lock, self._conn:
+            idle = [sid for (sid,) in self._conn.execute("SELECT id FROM sessions WHERE updated_at < ?", (cutoff,))]
+            self._conn.executemany("DELETE FROM history WHERE session_id = ?", [(sid,) for sid in idle])
+            self._conn.executemany("DELETE FROM sessions WHERE id = ?", [(sid,) for sid in idle])
+        if idle:
+            logger.info(f"Evicted {len(idle)} idle sessions")
+        return len(idle)
+
+
+_store: Optional[SessionStore] = None
+
+
+def get_session_store() -> SessionStore:
+    global _store
+    if _store is None:
+        if SESSION_BACKEND == "memory":
+            _store = MemorySessionStore()
+        elif SESSION_BACKEND == "sqlite":
+            _store = SQLiteSessionStore()
+        else:
+            raise ValueError(f"Unsupported SESSION_BACKEND: {SESSION_BACKEND}")
+    return _store
+
+
+async def _persisted(ctx: Context) -> int:
+    log = await ctx.store.get("history", default=None)
+    return log.persisted if isinstance(log, HistoryLog) else 0
+
+
+async def restore_context(workflow: Workflow, store: SessionStore, session_id: str, ctx: Optional[Context] = None) -> Context:
+    """
+    A Context for `workflow` holding the stored session, or an empty session if there is none.
+    `ctx`, the caller's Context from the previous turn, is returned as is while it is current:
+    same session, and the store holds exactly the history it last saved.
+    """
+    if ctx is not None and await ctx.store.get("conversation_id", default=None) == session_id:
+        if await asyncio.to_thread(store.version, session_id) == await _persisted(ctx):
+            return ctx
+
+    session = await asyncio.to_thread(store.load, session_id) or Session()
+    ctx = Context(workflow)
+    state = {"conversation_id": session_id, "language": "en", **session.state}
+    for key in SESSION_KEYS:
+        await ctx.store.set(key, state.get(key))
+    messages = [unpack_message(m) for m in session.history]
+    await ctx.store.set("history", HistoryLog(messages=messages, persisted=len(messages)))
+    return ctx
+
+
+async def save_context(ctx: Context, store: SessionStore, session_id: str) -> None:
+    """
+    Writes the session state and only the history messages added since the last save.
+    Raises SessionConflict if another worker saved the session since `ctx` was restored or saved.
+    """
+    log = await ctx.store.get("history", default=None)
+    if not isinstance(log, HistoryLog):
+        log = HistoryLog(messages=log or [])
+        await ctx.store.set("history", log)
+    start, end = log.persisted, len(log)
+    state = {key: await ctx.store.get(key, default=None) for key in SESSION_KEYS}
+    await asyncio.to_thread(store.save, session_id, state, [pack_message(m) for m in log.since(start)], start, start)
+    log.mark_persisted(end)
@@ -0,0 +1,279 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config.env import TRACE_PATH, TRACE_SINK
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    name: str
+    kind: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_time: float
+    duration_ms: float = 0.0
+    status: str = "ok"
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class Turn:
+    """All spans recorded while handling one user message."""
+    trace_id: str
+    started: float
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    spans: List[Span] = field(default_factory=list)
+
+    def summary(self) -> Dict[str, Any]:
+        by_kind: Dict[str, float] = {}
+        for s in self.spans:
+            by_kind[s.kind] = by_kind.get(s.kind, 0.0) + s.duration_ms
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round((time.perf_counter() - self.started) * 1000, 2),
+            "prompt_tokens": sum(s.prompt_tokens or 0 for s in self.spans),
+            "completion_tokens": sum(s.completion_tokens or 0 for s in self.spans),
+            "by_kind": {k: round(v, 2) for k, v in by_kind.items()},
+            "tokens_saved": sum(s.attributes.get("tokens_saved", 0) for s in self.spans),
+            "degraded": any(s.kind == "degraded" for s in self.spans),
+            "spans": [
+                {
+                    "name": s.name,
+                    "kind": s.kind,
+                    "duration_ms": round(s.duration_ms, 2),
+                    "prompt_tokens": s.prompt_tokens,
+                    "completion_tokens": s.completion_tokens,
+                }
+                for s in self.spans
+            ],
+        }
+
+
+# --- Sinks ---
+
+class SpanSink:
+    def export(self, span: Span) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+
+class NullSpanSink(SpanSink):
+    def export(self, span: Span) -> None:
+        pass
+
+
+class JsonlSpanSink(SpanSink):
+    """Appends one JSON object per finished span."""
+
+    def __init__(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(asdict(span), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def flush(self) -> None:
+        with self._lock:
+            self._file.flush()
+
+
+class OTelSpanSink(SpanSink):
+    """Re-emits finished spans through the OpenTelemetry API (requires `opentelemetry-api`)."""
+
+    def __init__(self, service_name: str = "jtcg-agent") -> None:
+        try:
+            from opentelemetry import trace
+        except ImportError as e:
+            raise ImportError("TRACE_SINK=otel requires `pip install opentelemetry-api opentelemetry-sdk`") from e
+        self._tracer = trace.get_tracer(service_name)
+
+    def export(self, span: Span) -> None:
+        start_ns = int(span.start_time * 1e9)
+        attributes = {
+            "jtcg.kind": span.kind,
+            "jtcg.trace_id": span.trace_id,
+            "jtcg.span_id": span.span_id,
+            "jtcg.parent_id": span.parent_id or "",
+            **{f"jtcg.{k}": v for k, v in span.attributes.items() if isinstance(v, (str, int, float, bool))},
+        }
+        if span.prompt_tokens is not None:
+            attributes["gen_ai.usage.input_tokens"] = span.prompt_tokens
+        if span.completion_tokens is not None:
+            attributes["gen_ai.usage.output_tokens"] = span.completion_tokens
+        otel_span = self._tracer.start_span(span.name, start_time=start_ns, attributes=attributes)
+        otel_span.end(end_time=start_ns + int(span.duration_ms * 1e6))
+
+
+# --- Tracer ---
+
+_current_turn: contextvars.ContextVar[Optional[Turn]] = contextvars.ContextVar("current_turn", default=None)
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Tracer:
+    """
+    Records spans for the active turn. A turn is bound with `begin_turn()`
+    through a ContextVar, so it follows the workflow into every step task
+    started from that context; outside a turn spans are not recorded.
+    """
+
+    def __init__(self, sink: Optional[SpanSink] = None) -> None:
+        self.sink = sink or NullSpanSink()
+
+    def begin_turn(self, **attributes: Any) -> contextvars.Token:
+        turn = Turn(trace_id=uuid.uuid4().hex, started=time.perf_counter(), attributes=attributes)
+        return _current_turn.set(turn)
+
+    def end_turn(self, token: contextvars.Token) -> None:
+        _current_turn.reset(token)
+        self.sink.flush()
+
+    @contextmanager
+    def span(self, name: str, kind: str = "internal", **attributes: Any) -> Iterator[Optional[Span]]:
+        turn = _current_turn.get()
+        if turn is None:
+            yield None
+            return
+
+        parent = _current_span.get()
+        span = Span(
+            name=name,
+            kind=kind,
+            trace_id=turn.trace_id,
+            span_id=uuid.uuid4().hex[:16],
+            parent_id=parent.span_id if parent else None,
+            start_time=time.time(),
+            attributes=attributes,
+        )
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        try:
+            yield span
+        except BaseException as e:
+            span.status = f"error: {type(e).__name__}"
+            raise
+        finally:
+            span.duration_ms = (time.perf_counter() - started) * 1000
+            _current_span.reset(token)
+            turn.spans.append(span)
+            try:
+                self.sink.export(span)
+            except Exception as e:
+                logger.warning(f"Failed to export span '{name}': {e}")
+
+
+def _build_sink(kind: str) -> SpanSink:
+    if kind == "jsonl":
+        return JsonlSpanSink(TRACE_PATH)
+    if kind == "otel":
+        return OTelSpanSink()
+    return NullSpanSink()
+
+
+_tracer: Optional[Tracer] = None
+
+
+def get_tracer() -> Tracer:
+    global _tracer
+    if _tracer is None:
+        _tracer = Tracer(_build_sink(TRACE_SINK))
+    return _tracer
+
+
+def set_tracer(tracer: Tracer) -> None:
+    global _tracer
+    _tracer = tracer
+
+
+def span(name: str, kind: str = "internal", **attributes: Any):
+    return get_tracer().span(name, kind, **attributes)
+
+
+def current_turn() -> Optional[Turn]:
+    return _current_turn.get()
+
+
+def attach_breakdown(handler: Any, turn: Optional[Turn]) -> None:
+    """
+    Adds the turn's timing/token summary to the workflow's result dict as
+    "trace" (and its "degraded" flag) once the run has finished, so the
+    final step's own span is included. Registered before anyone awaits the
+    handler, so the result is complete by the time they see it.
+    """
+    if turn is None:
+        return
+
+    def _finish(future: Any) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        # The handler resolves to the StopEvent's result dict (later releases: to the StopEvent)
+        result = future.result()
+        result = getattr(result, "result", result)
+        if isinstance(result, dict):
+            summary = turn.summary()
+            result["trace"] = summary
+            result["degraded"] = summary["degraded"]
+
+    # WorkflowHandler is an asyncio.Future; releases after 2.11 resolve it through a result task instead
+    future = handler if hasattr(handler, "add_done_callback") else handler._result_task
+    future.add_done_callback(_finish)
+
+
+def traced(name: Optional[str] = None, kind: str = "internal") -> Callable:
+    """Wraps a sync or async function in a span. Place it *under* `@step`."""
+
+    def decorator(fn: Callable) -> Callable:
+        span_name = name or fn.__name__
+
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                with span(span_name, kind):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(span_name, kind):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    return decorator
+
+
+def record_usage(current: Optional[Span], response: Any) -> None:
+    """Copies token counts from a llama_index ChatResponse (or raw OpenAI response) onto the span."""
+    if current is None or response is None:
+        return
+    usage = dict(getattr(response, "additional_kwargs", None) or {})
+    if "prompt_tokens" not in usage:
+        raw_usage = getattr(getattr(response, "raw", None), "usage", None)
+        if isinstance(raw_usage, dict):
+            usage = raw_usage
+        elif raw_usage is not None:
+            usage = {"prompt_tokens": getattr(raw_usage, "prompt_tokens", None), "completion_tokens": getattr(raw_usage, "completion_tokens", None)}
+    if usage.get("prompt_tokens") is not None:
+        current.prompt_tokens = (current.prompt_tokens or 0) + int(usage["prompt_tokens"])
+    if usage.get("completion_tokens") is not None:
+        current.completion_tokens = (current.completion_tokens or 0) + int(usage["completion_tokens"])